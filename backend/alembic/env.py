@@ -13,7 +13,7 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + '/..')
 
 # Import models and database
 from database import Base
-from models import User, VaultItem, VaultRecord, AccessRequest, PrivilegeSession, AuditLog
+from models import User, VaultItem, VaultRecord, VaultSummary, VaultImportCheckpoint, AccessRequest, PrivilegeSession, AuditLog, AuditCheckpoint, AuditRollup, KeyRotationProgress, UsedTotpCode
 from config import get_settings
 
 settings = get_settings()
@@ -24,6 +24,8 @@ config = context.config
 
 # Set sqlalchemy.url from settings
 config.set_main_option('sqlalchemy.url', settings.DATABASE_URL)
+# Active master key (id, key) for migrations that wrap data keys; they do not import security.py
+config.attributes.setdefault('encryption_key', (settings.ENCRYPTION_KEY_ID, settings.ENCRYPTION_KEY))
 
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
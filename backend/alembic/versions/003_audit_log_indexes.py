@@ -0,0 +1,34 @@
+"""Add composite indexes for keyset-paginated audit log queries
+
+Revision ID: 003_audit_log_indexes
+Revises: 002_add_write_access
+Create Date: 2026-10-16 09:00:00.000000
+
+"""
+from alembic import op
+
+revision = '003_audit_log_indexes'
+down_revision = '002_add_write_access'
+branch_labels = None
+depends_on = None
+
+
+# (index name, columns) - every index ends in (timestamp, id) so a filtered
+# query can seek straight to the cursor position and read rows in order
+AUDIT_LOG_INDEXES = [
+    ('ix_audit_logs_timestamp_id', ['timestamp', 'id']),
+    ('ix_audit_logs_action_timestamp_id', ['action', 'timestamp', 'id']),
+    ('ix_audit_logs_actor_timestamp_id', ['actor_id', 'timestamp', 'id']),
+    ('ix_audit_logs_vault_item_timestamp_id', ['vault_item_id', 'timestamp', 'id']),
+    ('ix_audit_logs_target_user_timestamp_id', ['target_user_id', 'timestamp', 'id']),
+]
+
+
+def upgrade() -> None:
+    for name, columns in AUDIT_LOG_INDEXES:
+        op.create_index(name, 'audit_logs', columns)
+
+
+def downgrade() -> None:
+    for name, _ in reversed(AUDIT_LOG_INDEXES):
+        op.drop_index(name, table_name='audit_logs')
@@ -0,0 +1,103 @@
+"""Add hash chain columns to audit_logs and the audit_checkpoints table
+
+Revision ID: 004_audit_hash_chain
+Revises: 003_audit_log_indexes
+Create Date: 2026-10-16 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import hashlib
+import json
+
+revision = '004_audit_hash_chain'
+down_revision = '003_audit_log_indexes'
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH_SIZE = 1000
+
+# Frozen copy of audit_chain's row hash at this revision, so later changes to the
+# application module cannot change what this migration writes
+GENESIS_HASH = "0" * 64
+
+
+def compute_row_hash(seq, prev_hash, log_id, actor_id, action, vault_item_id, target_user_id, timestamp, log_metadata):
+    if isinstance(log_metadata, str):
+        log_metadata = json.loads(log_metadata)
+    payload = json.dumps(
+        {
+            "seq": seq,
+            "prev_hash": prev_hash,
+            "id": str(log_id),
+            "actor_id": str(actor_id),
+            "action": action,
+            "vault_item_id": str(vault_item_id) if vault_item_id else None,
+            "target_user_id": str(target_user_id) if target_user_id else None,
+            "timestamp": timestamp.isoformat(),
+            "metadata": log_metadata
+        },
+        sort_keys=True,
+        separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def upgrade() -> None:
+    op.add_column('audit_logs', sa.Column('seq', sa.BigInteger(), nullable=True))
+    op.add_column('audit_logs', sa.Column('prev_hash', sa.String(64), nullable=True))
+    op.add_column('audit_logs', sa.Column('row_hash', sa.String(64), nullable=True))
+    
+    # Chain existing rows in (timestamp, id) order
+    conn = op.get_bind()
+    seq, prev_hash = 0, GENESIS_HASH
+    last_key = None
+    while True:
+        params = {"limit": BACKFILL_BATCH_SIZE}
+        where = ""
+        if last_key:
+            where = "WHERE (timestamp, id) > (:ts, :id)"
+            params.update(ts=last_key[0], id=last_key[1])
+        rows = conn.execute(sa.text(
+            f"SELECT id, actor_id, action, vault_item_id, target_user_id, timestamp, log_metadata "
+            f"FROM audit_logs {where} ORDER BY timestamp, id LIMIT :limit"
+        ), params).fetchall()
+        if not rows:
+            break
+        updates = []
+        for row in rows:
+            seq += 1
+            row_hash = compute_row_hash(
+                seq, prev_hash, row.id, row.actor_id, row.action,
+                row.vault_item_id, row.target_user_id, row.timestamp, row.log_metadata
+            )
+            updates.append({"id": row.id, "seq": seq, "prev_hash": prev_hash, "row_hash": row_hash})
+            prev_hash = row_hash
+        conn.execute(sa.text(
+            "UPDATE audit_logs SET seq = :seq, prev_hash = :prev_hash, row_hash = :row_hash WHERE id = :id"
+        ), updates)
+        last_key = (rows[-1].timestamp, rows[-1].id)
+    
+    op.alter_column('audit_logs', 'seq', nullable=False)
+    op.alter_column('audit_logs', 'prev_hash', nullable=False)
+    op.alter_column('audit_logs', 'row_hash', nullable=False)
+    op.create_unique_constraint('uq_audit_logs_seq', 'audit_logs', ['seq'])
+    
+    op.create_table(
+        'audit_checkpoints',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('seq', sa.BigInteger(), nullable=False),
+        sa.Column('row_hash', sa.String(64), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('signature', sa.String(64), nullable=False)
+    )
+    op.create_index('ix_audit_checkpoints_seq', 'audit_checkpoints', ['seq'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_audit_checkpoints_seq', table_name='audit_checkpoints')
+    op.drop_table('audit_checkpoints')
+    op.drop_constraint('uq_audit_logs_seq', 'audit_logs', type_='unique')
+    op.drop_column('audit_logs', 'row_hash')
+    op.drop_column('audit_logs', 'prev_hash')
+    op.drop_column('audit_logs', 'seq')
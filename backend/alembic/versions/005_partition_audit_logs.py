@@ -0,0 +1,110 @@
+"""Convert audit_logs to monthly range partitions on timestamp
+
+Revision ID: 005_partition_audit_logs
+Revises: 004_audit_hash_chain
+Create Date: 2026-10-16 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from datetime import date, datetime
+
+revision = '005_partition_audit_logs'
+down_revision = '004_audit_hash_chain'
+branch_labels = None
+depends_on = None
+
+# Months ahead of the current one that get a partition up front; the API creates later ones
+PARTITION_MONTHS_AHEAD = 3
+
+
+# Frozen copies of the audit_partitions helpers at this revision
+def month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(value: date, months: int) -> date:
+    index = value.year * 12 + (value.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def create_audit_partition(conn, month: date) -> None:
+    conn.execute(sa.text(
+        f"CREATE TABLE IF NOT EXISTS audit_logs_y{month.year:04d}m{month.month:02d} PARTITION OF audit_logs "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    ))
+
+
+AUDIT_LOG_INDEXES = [
+    ('ix_audit_logs_timestamp_id', ['timestamp', 'id']),
+    ('ix_audit_logs_action_timestamp_id', ['action', 'timestamp', 'id']),
+    ('ix_audit_logs_actor_timestamp_id', ['actor_id', 'timestamp', 'id']),
+    ('ix_audit_logs_vault_item_timestamp_id', ['vault_item_id', 'timestamp', 'id']),
+    ('ix_audit_logs_target_user_timestamp_id', ['target_user_id', 'timestamp', 'id']),
+    ('ix_audit_logs_seq', ['seq']),
+]
+
+
+def _create_audit_logs(partitioned: bool) -> None:
+    # Partitioned tables need the partition key in every unique constraint,
+    # so the primary key becomes (id, timestamp) and seq loses its unique constraint
+    # (seq uniqueness is guaranteed by the audit chain lock and checked by the verifier)
+    op.create_table(
+        'audit_logs',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('actor_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('action', sa.String(), nullable=False),
+        sa.Column('vault_item_id', postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column('target_user_id', postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column('timestamp', sa.DateTime(), nullable=False),
+        sa.Column('log_metadata', sa.Text(), nullable=True),
+        sa.Column('seq', sa.BigInteger(), nullable=False),
+        sa.Column('prev_hash', sa.String(64), nullable=False),
+        sa.Column('row_hash', sa.String(64), nullable=False),
+        sa.PrimaryKeyConstraint('id', 'timestamp') if partitioned else sa.PrimaryKeyConstraint('id'),
+        sa.ForeignKeyConstraint(['actor_id'], ['users.id']),
+        sa.ForeignKeyConstraint(['vault_item_id'], ['vault_items.id']),
+        sa.ForeignKeyConstraint(['target_user_id'], ['users.id']),
+        **({'postgresql_partition_by': 'RANGE (timestamp)'} if partitioned else {})
+    )
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    op.rename_table('audit_logs', 'audit_logs_unpartitioned')
+    op.execute('ALTER TABLE audit_logs_unpartitioned RENAME CONSTRAINT audit_logs_pkey TO audit_logs_unpartitioned_pkey')
+    
+    _create_audit_logs(partitioned=True)
+    
+    # One partition per month from the oldest row through the months ahead
+    oldest = conn.execute(sa.text('SELECT min(timestamp) FROM audit_logs_unpartitioned')).scalar()
+    current = month_start(datetime.utcnow().date())
+    month = month_start(oldest.date()) if oldest else current
+    last = add_months(current, PARTITION_MONTHS_AHEAD)
+    while month <= last:
+        create_audit_partition(conn, month)
+        month = add_months(month, 1)
+    
+    op.execute('INSERT INTO audit_logs SELECT id, actor_id, action, vault_item_id, target_user_id, timestamp, '
+               'log_metadata, seq, prev_hash, row_hash FROM audit_logs_unpartitioned')
+    op.drop_table('audit_logs_unpartitioned')
+    
+    for name, columns in AUDIT_LOG_INDEXES:
+        op.create_index(name, 'audit_logs', columns)
+
+
+def downgrade() -> None:
+    op.rename_table('audit_logs', 'audit_logs_partitioned')
+    for name, _ in AUDIT_LOG_INDEXES:
+        op.drop_index(name, table_name='audit_logs_partitioned')
+    op.execute('ALTER TABLE audit_logs_partitioned RENAME CONSTRAINT audit_logs_pkey TO audit_logs_partitioned_pkey')
+    
+    _create_audit_logs(partitioned=False)
+    op.execute('INSERT INTO audit_logs SELECT id, actor_id, action, vault_item_id, target_user_id, timestamp, '
+               'log_metadata, seq, prev_hash, row_hash FROM audit_logs_partitioned')
+    op.drop_table('audit_logs_partitioned')
+    
+    for name, columns in AUDIT_LOG_INDEXES[:-1]:
+        op.create_index(name, 'audit_logs', columns)
+    op.create_unique_constraint('uq_audit_logs_seq', 'audit_logs', ['seq'])
@@ -0,0 +1,41 @@
+"""Add audit_rollups table for dashboard analytics
+
+Revision ID: 006_audit_rollups
+Revises: 005_partition_audit_logs
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = '006_audit_rollups'
+down_revision = '005_partition_audit_logs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'audit_rollups',
+        sa.Column('granularity', sa.String(), nullable=False),
+        sa.Column('bucket_start', sa.DateTime(), nullable=False),
+        sa.Column('action', sa.String(), nullable=False),
+        sa.Column('actor_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('vault_item_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('count', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('granularity', 'bucket_start', 'action', 'actor_id', 'vault_item_id')
+    )
+    
+    # Backfill from existing audit rows
+    for granularity in ('hour', 'day'):
+        op.execute(
+            "INSERT INTO audit_rollups (granularity, bucket_start, action, actor_id, vault_item_id, count) "
+            f"SELECT '{granularity}', date_trunc('{granularity}', timestamp), action, actor_id, "
+            "COALESCE(vault_item_id, '00000000-0000-0000-0000-000000000000'), count(*) "
+            "FROM audit_logs GROUP BY 2, 3, 4, 5"
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('audit_rollups')
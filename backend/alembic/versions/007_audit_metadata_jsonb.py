@@ -0,0 +1,42 @@
+"""Convert audit_logs.log_metadata to JSONB with a GIN index
+
+Revision ID: 007_audit_metadata_jsonb
+Revises: 006_audit_rollups
+Create Date: 2026-10-16 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = '007_audit_metadata_jsonb'
+down_revision = '006_audit_rollups'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.alter_column(
+        'audit_logs',
+        'log_metadata',
+        type_=postgresql.JSONB(),
+        postgresql_using='log_metadata::jsonb'
+    )
+    # jsonb_path_ops supports @> containment, which is all the audit filters use
+    op.create_index(
+        'ix_audit_logs_log_metadata',
+        'audit_logs',
+        ['log_metadata'],
+        postgresql_using='gin',
+        postgresql_ops={'log_metadata': 'jsonb_path_ops'}
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_audit_logs_log_metadata', table_name='audit_logs')
+    op.alter_column(
+        'audit_logs',
+        'log_metadata',
+        type_=sa.Text(),
+        postgresql_using='log_metadata::text'
+    )
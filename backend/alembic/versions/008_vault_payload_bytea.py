@@ -0,0 +1,62 @@
+"""Store vault record ciphertext as bytea instead of base64 text
+
+Revision ID: 008_vault_payload_bytea
+Revises: 007_audit_metadata_jsonb
+Create Date: 2026-10-16 14:00:00.000000
+
+Rows are converted in small committed batches into a side column, so no
+long-lived lock is held on vault_records. Only the final catch-up pass and
+the column swap run under a brief exclusive lock.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '008_vault_payload_bytea'
+down_revision = '007_audit_metadata_jsonb'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+# Fernet tokens are padded url-safe base64; Postgres decodes the standard alphabet
+TEXT_TO_BYTEA = "decode(translate({column}, '-_', '+/'), 'base64')"
+# encode(..., 'base64') wraps lines every 76 characters
+BYTEA_TO_TEXT = "translate(replace(encode({column}, 'base64'), E'\\n', ''), '+/', '-_')"
+
+
+def _convert_in_batches(source: str, target: str, expression: str) -> None:
+    # Paged by primary key so each batch seeks past the rows already converted;
+    # rows inserted behind the cursor are picked up by the catch-up pass in _swap
+    with op.get_context().autocommit_block():
+        conn = op.get_bind()
+        last_id = None
+        while True:
+            after = "WHERE id > :last_id" if last_id is not None else ""
+            ids = conn.execute(sa.text(
+                f"WITH batch AS (SELECT id FROM vault_records {after} ORDER BY id LIMIT :limit) "
+                f"UPDATE vault_records SET {target} = {expression.format(column=source)} "
+                f"FROM batch WHERE vault_records.id = batch.id RETURNING vault_records.id"
+            ), {"limit": BATCH_SIZE, "last_id": last_id}).scalars().all()
+            if not ids:
+                break
+            last_id = max(ids)
+
+
+def _swap(source: str, target: str, expression: str, target_type) -> None:
+    op.execute("LOCK TABLE vault_records IN EXCLUSIVE MODE")
+    # Rows written since the batched pass
+    op.execute(f"UPDATE vault_records SET {target} = {expression.format(column=source)} WHERE {target} IS NULL")
+    op.drop_column('vault_records', source)
+    op.alter_column('vault_records', target, new_column_name='encrypted_payload', existing_type=target_type, nullable=False)
+
+
+def upgrade() -> None:
+    op.add_column('vault_records', sa.Column('encrypted_payload_bin', sa.LargeBinary(), nullable=True))
+    _convert_in_batches('encrypted_payload', 'encrypted_payload_bin', TEXT_TO_BYTEA)
+    _swap('encrypted_payload', 'encrypted_payload_bin', TEXT_TO_BYTEA, sa.LargeBinary())
+
+
+def downgrade() -> None:
+    op.add_column('vault_records', sa.Column('encrypted_payload_text', sa.Text(), nullable=True))
+    _convert_in_batches('encrypted_payload', 'encrypted_payload_text', BYTEA_TO_TEXT)
+    _swap('encrypted_payload', 'encrypted_payload_text', BYTEA_TO_TEXT, sa.Text())
@@ -0,0 +1,59 @@
+"""Add per-vault wrapped AES-256-GCM data keys
+
+Revision ID: 009_vault_data_keys
+Revises: 008_vault_payload_bytea
+Create Date: 2026-10-16 15:00:00.000000
+
+Existing records stay in the legacy Fernet format and remain readable;
+new writes use the vault item's data key. Keys are wrapped in the key ring format
+(version 0x02 | master key id | nonce | wrapped key + tag) under the active master
+key, which env.py passes in as config.attributes["encryption_key"].
+"""
+from alembic import context, op
+import sqlalchemy as sa
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+import base64
+import os
+import uuid
+
+revision = '009_vault_data_keys'
+down_revision = '008_vault_payload_bytea'
+branch_labels = None
+depends_on = None
+
+
+WRAPPED_KEY_VERSION = 0x02
+GCM_NONCE_SIZE = 12
+
+
+# Frozen copy of security's data key wrapping at this revision
+def generate_wrapped_data_key(vault_item_id: uuid.UUID, key_id: int, master_key: str) -> bytes:
+    key_encryption_key = HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=b"entitled-vault-data-key-wrapping"
+    ).derive(base64.urlsafe_b64decode(master_key.encode()))
+    nonce = os.urandom(GCM_NONCE_SIZE)
+    data_key = AESGCM.generate_key(bit_length=256)
+    wrapped = AESGCM(key_encryption_key).encrypt(nonce, data_key, vault_item_id.bytes)
+    return bytes([WRAPPED_KEY_VERSION, key_id]) + nonce + wrapped
+
+
+def upgrade() -> None:
+    op.add_column('vault_items', sa.Column('wrapped_data_key', sa.LargeBinary(), nullable=True))
+    
+    key_id, master_key = context.config.attributes["encryption_key"]
+    conn = op.get_bind()
+    for (vault_item_id,) in conn.execute(sa.text("SELECT id FROM vault_items")).fetchall():
+        conn.execute(
+            sa.text("UPDATE vault_items SET wrapped_data_key = :key WHERE id = :id"),
+            {"key": generate_wrapped_data_key(uuid.UUID(str(vault_item_id)), key_id, master_key), "id": vault_item_id}
+        )
+
+
+def downgrade() -> None:
+    # Records already written in the GCM format become unreadable without their data keys
+    op.drop_column('vault_items', 'wrapped_data_key')
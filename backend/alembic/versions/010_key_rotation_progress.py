@@ -0,0 +1,34 @@
+"""Add key_rotation_progress table for the re-encryption job
+
+Revision ID: 010_key_rotation_progress
+Revises: 009_vault_data_keys
+Create Date: 2026-10-16 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = '010_key_rotation_progress'
+down_revision = '009_vault_data_keys'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'key_rotation_progress',
+        sa.Column('target', sa.String(), nullable=False),
+        sa.Column('key_id', sa.Integer(), nullable=False),
+        sa.Column('last_id', postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column('rows_scanned', sa.BigInteger(), nullable=False),
+        sa.Column('rows_rewritten', sa.BigInteger(), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column('completed_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('target')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('key_rotation_progress')
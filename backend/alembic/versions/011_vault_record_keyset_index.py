@@ -0,0 +1,29 @@
+"""Index vault_records for keyset-paginated retrieval per vault item
+
+Revision ID: 011_vault_record_keyset_index
+Revises: 010_key_rotation_progress
+Create Date: 2026-10-16 17:00:00.000000
+
+"""
+from alembic import op
+
+revision = '011_vault_record_keyset_index'
+down_revision = '010_key_rotation_progress'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The keyset cursor is (created_at, id), so created_at must never be NULL
+    op.execute("UPDATE vault_records SET created_at = now() WHERE created_at IS NULL")
+    op.alter_column('vault_records', 'created_at', nullable=False)
+    op.create_index(
+        'ix_vault_records_vault_item_created_id',
+        'vault_records',
+        ['vault_item_id', 'created_at', 'id']
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_vault_records_vault_item_created_id', table_name='vault_records')
+    op.alter_column('vault_records', 'created_at', nullable=True)
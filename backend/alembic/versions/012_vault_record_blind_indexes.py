@@ -0,0 +1,34 @@
+"""Add blind index columns for searching encrypted vault record fields
+
+Revision ID: 012_vault_record_blind_indexes
+Revises: 011_vault_record_keyset_index
+Create Date: 2026-10-16 18:00:00.000000
+
+Existing records are indexed by `python blind_index.py backfill`.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '012_vault_record_blind_indexes'
+down_revision = '011_vault_record_keyset_index'
+branch_labels = None
+depends_on = None
+
+
+BLIND_INDEX_COLUMNS = ['instrument_type_index', 'investment_name_index']
+
+
+def upgrade() -> None:
+    for column in BLIND_INDEX_COLUMNS:
+        op.add_column('vault_records', sa.Column(column, sa.String(length=64), nullable=True))
+        op.create_index(
+            f'ix_vault_records_{column}',
+            'vault_records',
+            ['vault_item_id', column, 'created_at', 'id']
+        )
+
+
+def downgrade() -> None:
+    for column in reversed(BLIND_INDEX_COLUMNS):
+        op.drop_index(f'ix_vault_records_{column}', table_name='vault_records')
+        op.drop_column('vault_records', column)
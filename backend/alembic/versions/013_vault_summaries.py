@@ -0,0 +1,31 @@
+"""Add vault_summaries table for encrypted per-vault aggregates
+
+Revision ID: 013_vault_summaries
+Revises: 012_vault_record_blind_indexes
+Create Date: 2026-10-16 19:00:00.000000
+
+Summaries are built on first use, or for every vault by `python vault_summary.py check --repair`.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = '013_vault_summaries'
+down_revision = '012_vault_record_blind_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'vault_summaries',
+        sa.Column('vault_item_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('encrypted_summary', sa.LargeBinary(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['vault_item_id'], ['vault_items.id']),
+        sa.PrimaryKeyConstraint('vault_item_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('vault_summaries')
@@ -0,0 +1,35 @@
+"""Add vault_import_checkpoints table for resumable bulk imports
+
+Revision ID: 014_vault_import_checkpoints
+Revises: 013_vault_summaries
+Create Date: 2026-10-16 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = '014_vault_import_checkpoints'
+down_revision = '013_vault_summaries'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'vault_import_checkpoints',
+        sa.Column('import_id', sa.String(length=64), nullable=False),
+        sa.Column('vault_item_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('source', sa.String(), nullable=False),
+        sa.Column('rows_imported', sa.BigInteger(), nullable=False),
+        sa.Column('chunks_imported', sa.Integer(), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column('completed_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['vault_item_id'], ['vault_items.id']),
+        sa.PrimaryKeyConstraint('import_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('vault_import_checkpoints')
@@ -0,0 +1,35 @@
+"""Notify listeners when a user's role, password, TOTP secret or username changes
+
+Revision ID: 015_user_change_notify
+Revises: 014_vault_import_checkpoints
+Create Date: 2026-10-16 21:00:00.000000
+
+Each API process LISTENs on user_changed to invalidate its user identity cache (see user_cache.py).
+"""
+from alembic import op
+
+revision = '015_user_change_notify'
+down_revision = '014_vault_import_checkpoints'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE OR REPLACE FUNCTION notify_user_changed() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('user_changed', OLD.id::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER users_notify_changed
+        AFTER UPDATE OF role, password_hash, totp_secret, username OR DELETE ON users
+        FOR EACH ROW EXECUTE FUNCTION notify_user_changed()
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS users_notify_changed ON users")
+    op.execute("DROP FUNCTION IF EXISTS notify_user_changed()")
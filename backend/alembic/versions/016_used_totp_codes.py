@@ -0,0 +1,31 @@
+"""Add used_totp_codes table for TOTP replay protection
+
+Revision ID: 016_used_totp_codes
+Revises: 015_user_change_notify
+Create Date: 2026-10-16 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = '016_used_totp_codes'
+down_revision = '015_user_change_notify'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'used_totp_codes',
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('time_step', sa.BigInteger(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('user_id', 'time_step')
+    )
+    op.create_index('ix_used_totp_codes_expires_at', 'used_totp_codes', ['expires_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_used_totp_codes_expires_at', table_name='used_totp_codes')
+    op.drop_table('used_totp_codes')
@@ -0,0 +1,34 @@
+"""Add a DEFAULT partition to audit_logs and make (seq, timestamp) unique
+
+Revision ID: 017_audit_logs_default_partition
+Revises: 016_used_totp_codes
+Create Date: 2026-10-17 09:00:00.000000
+
+The DEFAULT partition takes entries for months without a partition, such as a
+journal replayed after its month was archived. Partitioned tables need the
+partition key in every unique constraint, so seq is unique together with
+timestamp; the audit chain lock serializes seq assignment across partitions.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '017_audit_logs_default_partition'
+down_revision = '016_used_totp_codes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute('CREATE TABLE audit_logs_default PARTITION OF audit_logs DEFAULT')
+    op.create_unique_constraint('uq_audit_logs_seq_timestamp', 'audit_logs', ['seq', 'timestamp'])
+    # The unique constraint's index leads with seq
+    op.drop_index('ix_audit_logs_seq', table_name='audit_logs')
+
+
+def downgrade() -> None:
+    rows = op.get_bind().execute(sa.text('SELECT count(*) FROM audit_logs_default')).scalar()
+    if rows:
+        raise RuntimeError(f"audit_logs_default holds {rows} rows; move them out before downgrading")
+    op.create_index('ix_audit_logs_seq', 'audit_logs', ['seq'])
+    op.drop_constraint('uq_audit_logs_seq_timestamp', 'audit_logs', type_='unique')
+    op.execute('DROP TABLE audit_logs_default')
@@ -1,7 +1,15 @@
-from sqlalchemy.orm import Session
-from models import AuditLog, User
-from typing import Optional
+from sqlalchemy import or_, tuple_
+from sqlalchemy.orm import Session, Query, aliased
+from models import AuditLog, User, VaultItem
+from audit_writer import audit_writer
+from typing import Optional, Tuple, Iterator, List
+from datetime import datetime, timezone
+from itertools import chain, islice
+import base64
+import csv
+import io
 import json
+import uuid
 from uuid import UUID
 
 
@@ -13,13 +21,231 @@ def create_audit_log(
     target_user_id: Optional[UUID] = None,
     metadata: Optional[dict] = None
 ):
-    """Create an audit log entry"""
+    """Create an audit log entry and hand it to the configured audit writer"""
     audit_log = AuditLog(
+        id=uuid.uuid4(),
         actor_id=actor.id,
         action=action,
         vault_item_id=vault_item_id,
         target_user_id=target_user_id,
-        log_metadata=json.dumps(metadata) if metadata else None
+        timestamp=datetime.utcnow(),
+        log_metadata=metadata or None
     )
-    db.add(audit_log)
+    audit_writer.write(db, audit_log)
     return audit_log
+
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """
+    Audit timestamps are stored as naive UTC. Query values such as ...Z or +02:00 parse as
+    timezone-aware datetimes, which cannot be compared with them; convert those to naive UTC.
+    """
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+# Keyset pagination cursors: opaque token over (timestamp, id) of the last row served
+def encode_audit_cursor(timestamp: datetime, log_id: UUID) -> str:
+    """Encode the (timestamp, id) position of an audit log row as an opaque cursor"""
+    raw = f"{timestamp.isoformat()}|{log_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_audit_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    """Decode a cursor produced by encode_audit_cursor. Raises ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        timestamp_str, log_id_str = raw.split("|", 1)
+        return naive_utc(datetime.fromisoformat(timestamp_str)), UUID(log_id_str)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def filter_audit_logs(
+    query: Query,
+    action: Optional[str] = None,
+    actor_id: Optional[UUID] = None,
+    vault_item_id: Optional[UUID] = None,
+    target_user_id: Optional[UUID] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    session_id: Optional[UUID] = None,
+    request_id: Optional[UUID] = None,
+    record_id: Optional[UUID] = None
+) -> Query:
+    """Apply the auditor-facing filters to an AuditLog query"""
+    if action:
+        query = query.filter(AuditLog.action == action)
+    if actor_id:
+        query = query.filter(AuditLog.actor_id == actor_id)
+    if vault_item_id:
+        query = query.filter(AuditLog.vault_item_id == vault_item_id)
+    if target_user_id:
+        query = query.filter(AuditLog.target_user_id == target_user_id)
+    if since:
+        query = query.filter(AuditLog.timestamp >= since)
+    if until:
+        query = query.filter(AuditLog.timestamp < until)
+    # Metadata lookups use JSONB containment so they are served by the GIN index
+    metadata_filter = metadata_filters(session_id=session_id, request_id=request_id)
+    if metadata_filter:
+        query = query.filter(AuditLog.log_metadata.contains(metadata_filter))
+    if record_id:
+        # Bulk writes list their records under record_ids
+        query = query.filter(or_(
+            AuditLog.log_metadata.contains({"record_id": str(record_id)}),
+            AuditLog.log_metadata.contains({"record_ids": [str(record_id)]})
+        ))
+    return query
+
+
+def metadata_filters(**ids: Optional[UUID]) -> dict:
+    """Metadata keys to match, as stored by create_audit_log (string UUIDs)"""
+    return {key: str(value) for key, value in ids.items() if value is not None}
+
+
+def paginate_audit_logs(query: Query, cursor: Optional[str], limit: int) -> Query:
+    """
+    Order newest-first on (timestamp, id) and seek past the cursor.
+    Uses a row-value comparison so Postgres can walk the composite index
+    instead of counting off an OFFSET.
+    """
+    if cursor:
+        cursor_timestamp, cursor_id = decode_audit_cursor(cursor)
+        query = query.filter(
+            tuple_(AuditLog.timestamp, AuditLog.id) < tuple_(cursor_timestamp, cursor_id)
+        )
+    return query.order_by(AuditLog.timestamp.desc(), AuditLog.id.desc()).limit(limit)
+
+
+# Streaming export
+AUDIT_EXPORT_FORMATS = ("ndjson", "csv")
+
+AUDIT_EXPORT_COLUMNS = [
+    "id", "timestamp", "action",
+    "actor_id", "actor_username",
+    "vault_item_id", "vault_item_title",
+    "target_user_id", "target_username",
+    "metadata"
+]
+
+
+def audit_export_query(db: Session) -> Query:
+    """
+    Flat projection of audit logs joined to usernames and vault titles.
+    Returns plain rows rather than ORM objects so nothing accumulates in the session.
+    """
+    actor = aliased(User)
+    target_user = aliased(User)
+    return db.query(
+        AuditLog.id,
+        AuditLog.timestamp,
+        AuditLog.action,
+        AuditLog.actor_id,
+        actor.username.label("actor_username"),
+        AuditLog.vault_item_id,
+        VaultItem.title.label("vault_item_title"),
+        AuditLog.target_user_id,
+        target_user.username.label("target_username"),
+        AuditLog.log_metadata.label("metadata")
+    ).join(
+        actor, AuditLog.actor_id == actor.id
+    ).outerjoin(
+        VaultItem, AuditLog.vault_item_id == VaultItem.id
+    ).outerjoin(
+        target_user, AuditLog.target_user_id == target_user.id
+    )
+
+
+def _export_value(value):
+    if isinstance(value, dict):
+        return json.dumps(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    return value
+
+
+def _archived_export_rows(db: Session, entries: Iterator[dict], chunk_size: int) -> Iterator[dict]:
+    """Archived entries in export shape, resolving names one chunk at a time"""
+    while True:
+        chunk = list(islice(entries, chunk_size))
+        if not chunk:
+            return
+        for entry in resolve_archived_audit_entries(db, chunk):
+            yield {column: entry[column] for column in AUDIT_EXPORT_COLUMNS}
+
+
+def stream_audit_export(
+    query: Query,
+    fmt: str,
+    chunk_size: int,
+    archived: Optional[Iterator[dict]] = None
+) -> Iterator[str]:
+    """
+    Yield the rows of an audit export query as NDJSON lines or CSV rows.
+    The query runs on a server-side cursor fetching chunk_size rows at a time,
+    and each row is serialized as soon as it is read.
+    `archived` (from iter_archived_audit_logs, oldest first) is exported ahead of the
+    live rows, since archived months are older than anything still in the table.
+    """
+    live = (
+        {column: _export_value(getattr(row, column)) for column in AUDIT_EXPORT_COLUMNS}
+        for row in query.order_by(AuditLog.timestamp, AuditLog.id).yield_per(chunk_size)
+    )
+    rows = chain(_archived_export_rows(query.session, archived, chunk_size), live) if archived else live
+    
+    if fmt == "ndjson":
+        for row in rows:
+            yield json.dumps(row) + "\n"
+        return
+    
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    
+    def flush() -> str:
+        line = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return line
+    
+    writer.writerow(AUDIT_EXPORT_COLUMNS)
+    yield flush()
+    for row in rows:
+        writer.writerow([row[column] for column in AUDIT_EXPORT_COLUMNS])
+        yield flush()
+
+
+def resolve_archived_audit_entries(db: Session, entries: List[dict]) -> List[dict]:
+    """
+    Shape archived entries like AuditLogResponse, resolving usernames and vault titles
+    with one query per table for the whole page.
+    """
+    user_ids = {UUID(e[key]) for e in entries for key in ("actor_id", "target_user_id") if e[key]}
+    vault_item_ids = {UUID(e["vault_item_id"]) for e in entries if e["vault_item_id"]}
+    usernames = {
+        str(user_id): username
+        for user_id, username in db.query(User.id, User.username).filter(User.id.in_(user_ids))
+    } if user_ids else {}
+    titles = {
+        str(item_id): title
+        for item_id, title in db.query(VaultItem.id, VaultItem.title).filter(VaultItem.id.in_(vault_item_ids))
+    } if vault_item_ids else {}
+    
+    return [
+        {
+            "id": entry["id"],
+            "actor_id": entry["actor_id"],
+            "actor_username": usernames.get(entry["actor_id"], ""),
+            "action": entry["action"],
+            "vault_item_id": entry["vault_item_id"],
+            "vault_item_title": titles.get(entry["vault_item_id"]),
+            "target_user_id": entry["target_user_id"],
+            "target_username": usernames.get(entry["target_user_id"]),
+            "timestamp": entry["timestamp"],
+            "metadata": json.dumps(entry["log_metadata"]) if entry["log_metadata"] is not None else None
+        }
+        for entry in entries
+    ]
@@ -0,0 +1,429 @@
+"""
+Cold archive of closed audit_logs months.
+
+Archived months are stored in a simple columnar format (.alc), one file per month:
+
+    MAGIC | column blocks ... | footer JSON | footer length (<Q) | MAGIC
+
+Rows are sorted by (timestamp, id). Fixed-width columns are native-endian
+arrays. action, actor_id, vault_item_id and target_user_id are dictionary
+encoded: the column holds integer codes and the footer holds the distinct
+values (NULL_CODE marks a missing value). log_metadata is stored as an
+offsets array plus a UTF-8 JSON blob.
+
+Readers mmap the file and cast column blocks to memoryviews. Time ranges are
+found by bisecting the timestamp column and filters compare integer codes, so
+only matching rows are ever decoded and files are never loaded whole.
+"""
+from config import get_settings
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Collection, Dict, Iterator, List, Optional, Tuple
+from uuid import UUID
+import array
+import bisect
+import heapq
+import json
+import mmap
+import os
+import re
+import shutil
+import struct
+import sys
+import tempfile
+
+settings = get_settings()
+
+MAGIC = b"AUDCOL01"
+NULL_CODE = 0xFFFFFFFF
+EPOCH = datetime(1970, 1, 1)
+
+# Column name -> array typecode
+FIXED_COLUMNS = {
+    "timestamp": "q",       # microseconds since epoch
+    "seq": "q",
+    "action": "I",          # dictionary code
+    "actor_id": "I",        # dictionary code
+    "vault_item_id": "I",   # dictionary code or NULL_CODE
+    "target_user_id": "I",  # dictionary code or NULL_CODE
+}
+# Column name -> width in bytes
+BYTES_COLUMNS = {"id": 16, "prev_hash": 32, "row_hash": 32}
+DICTIONARY_COLUMNS = ("action", "actor_id", "vault_item_id", "target_user_id")
+
+ARCHIVE_FILE_RE = re.compile(r"^audit_logs_(\d{4})_(\d{2})\.alc$")
+
+FLUSH_EVERY = 4096
+
+
+def to_micros(timestamp: datetime) -> int:
+    return (timestamp - EPOCH) // timedelta(microseconds=1)
+
+
+def from_micros(micros: int) -> datetime:
+    return EPOCH + timedelta(microseconds=micros)
+
+
+def archive_file_path(month: date) -> str:
+    return os.path.join(settings.AUDIT_ARCHIVE_DIR, f"audit_logs_{month.year:04d}_{month.month:02d}.alc")
+
+
+class ColumnarArchiveWriter:
+    """
+    Streams rows (in (timestamp, id) order) into per-column spill files,
+    then assembles them into one archive file. Only the dictionaries are kept in memory.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.rows = 0
+        self._spill_dir = tempfile.mkdtemp(prefix="audit_archive_", dir=os.path.dirname(path) or ".")
+        self._spill = {
+            name: open(os.path.join(self._spill_dir, name), "wb")
+            for name in list(FIXED_COLUMNS) + list(BYTES_COLUMNS) + ["metadata_offsets", "metadata_blob"]
+        }
+        self._fixed = {name: array.array(typecode) for name, typecode in FIXED_COLUMNS.items()}
+        self._bytes = {name: bytearray() for name in BYTES_COLUMNS}
+        self._offsets = array.array("Q", [0])
+        self._blob = bytearray()
+        self._blob_size = 0
+        self._dictionaries: Dict[str, Dict[str, int]] = {name: {} for name in DICTIONARY_COLUMNS}
+
+    def _code(self, column: str, value) -> int:
+        if value is None:
+            return NULL_CODE
+        dictionary = self._dictionaries[column]
+        key = str(value)
+        if key not in dictionary:
+            dictionary[key] = len(dictionary)
+        return dictionary[key]
+
+    def append(self, row) -> None:
+        self._fixed["timestamp"].append(to_micros(row.timestamp))
+        self._fixed["seq"].append(row.seq)
+        for column in DICTIONARY_COLUMNS:
+            self._fixed[column].append(self._code(column, getattr(row, column)))
+        self._bytes["id"] += UUID(str(row.id)).bytes
+        self._bytes["prev_hash"] += bytes.fromhex(row.prev_hash)
+        self._bytes["row_hash"] += bytes.fromhex(row.row_hash)
+        if row.log_metadata is not None:
+            encoded = json.dumps(row.log_metadata, separators=(",", ":")).encode()
+            self._blob += encoded
+            self._blob_size += len(encoded)
+        self._offsets.append(self._blob_size)
+        self.rows += 1
+        if self.rows % FLUSH_EVERY == 0:
+            self._flush()
+
+    def _flush(self) -> None:
+        for name, values in self._fixed.items():
+            values.tofile(self._spill[name])
+            del values[:]
+        for name, values in self._bytes.items():
+            self._spill[name].write(values)
+            values.clear()
+        # The first offset of each flushed run was written by the previous flush
+        self._offsets.tofile(self._spill["metadata_offsets"])
+        self._offsets = array.array("Q")
+        self._spill["metadata_blob"].write(self._blob)
+        self._blob.clear()
+
+    def close(self) -> None:
+        """Assemble the spill files into the archive, fsync it and move it into place"""
+        self._flush()
+        for f in self._spill.values():
+            f.close()
+
+        columns = {}
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as out:
+            out.write(MAGIC)
+            for name in list(FIXED_COLUMNS) + list(BYTES_COLUMNS) + ["metadata_offsets", "metadata_blob"]:
+                padding = -out.tell() % 8
+                out.write(b"\0" * padding)
+                offset = out.tell()
+                with open(os.path.join(self._spill_dir, name), "rb") as f:
+                    shutil.copyfileobj(f, out)
+                columns[name] = {"offset": offset, "length": out.tell() - offset}
+            footer = json.dumps({
+                "rows": self.rows,
+                "byteorder": sys.byteorder,
+                "columns": columns,
+                "dictionaries": {
+                    name: list(dictionary) for name, dictionary in self._dictionaries.items()
+                }
+            }).encode()
+            out.write(footer)
+            out.write(struct.pack("<Q", len(footer)))
+            out.write(MAGIC)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_path, self.path)
+        shutil.rmtree(self._spill_dir, ignore_errors=True)
+
+    def abort(self) -> None:
+        for f in self._spill.values():
+            f.close()
+        shutil.rmtree(self._spill_dir, ignore_errors=True)
+        if os.path.exists(self.path + ".tmp"):
+            os.remove(self.path + ".tmp")
+
+
+class ColumnarArchive:
+    """Memory-mapped, read-only view over one archive file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._base = view = memoryview(self._mmap)
+        if view[:8] != MAGIC or view[-8:] != MAGIC:
+            raise ValueError(f"{path} is not an audit archive")
+        (footer_length,) = struct.unpack("<Q", view[-16:-8])
+        footer = json.loads(bytes(view[-16 - footer_length:-16]))
+        if footer["byteorder"] != sys.byteorder:
+            raise ValueError(f"{path} was written on a {footer['byteorder']}-endian host")
+
+        self.rows = footer["rows"]
+        self.dictionaries: Dict[str, List[str]] = footer["dictionaries"]
+        self._codes = {name: {value: code for code, value in enumerate(values)} for name, values in self.dictionaries.items()}
+        self._views = {}
+        for name, location in footer["columns"].items():
+            block = view[location["offset"]:location["offset"] + location["length"]]
+            if name in FIXED_COLUMNS:
+                block = block.cast(FIXED_COLUMNS[name])
+            elif name == "metadata_offsets":
+                block = block.cast("Q")
+            self._views[name] = block
+
+    def close(self) -> None:
+        # Every exported view must be released before the mapping can be closed
+        for view in self._views.values():
+            view.release()
+        self._views.clear()
+        self._base.release()
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def rows_by_seq(self) -> Iterator[dict]:
+        """Decoded rows in hash-chain (seq) order rather than (timestamp, id) order"""
+        seqs = self._views["seq"]
+        for i in sorted(range(self.rows), key=seqs.__getitem__):
+            yield self.row(i)
+
+    def max_seq(self) -> Optional[int]:
+        return max(self._views["seq"]) if self.rows else None
+
+    def row_hash_for_seq(self, seq: int) -> Optional[str]:
+        """row_hash of the row with this seq, if it is in this file"""
+        seqs = array.array("q")
+        with self._views["seq"].cast("B") as raw:
+            seqs.frombytes(raw)
+        try:
+            i = seqs.index(seq)
+        except ValueError:
+            return None
+        return bytes(self._views["row_hash"][i * 32:(i + 1) * 32]).hex()
+
+    def code_for(self, column: str, value) -> Optional[int]:
+        """Dictionary code for a filter value, or None if the value never occurs in this file"""
+        return self._codes[column].get(str(value))
+
+    def _key(self, i: int) -> Tuple[int, bytes]:
+        return self._views["timestamp"][i], bytes(self._views["id"][i * 16:(i + 1) * 16])
+
+    def _decode(self, column: str, i: int) -> Optional[str]:
+        code = self._views[column][i]
+        return None if code == NULL_CODE else self.dictionaries[column][code]
+
+    def row(self, i: int) -> dict:
+        """Decode row i into the same shape as live audit entries"""
+        start, end = self._views["metadata_offsets"][i], self._views["metadata_offsets"][i + 1]
+        return {
+            "id": str(UUID(bytes=bytes(self._views["id"][i * 16:(i + 1) * 16]))),
+            "actor_id": self._decode("actor_id", i),
+            "action": self._decode("action", i),
+            "vault_item_id": self._decode("vault_item_id", i),
+            "target_user_id": self._decode("target_user_id", i),
+            "timestamp": from_micros(self._views["timestamp"][i]).isoformat(),
+            "log_metadata": json.loads(bytes(self._views["metadata_blob"][start:end])) if end > start else None,
+            "seq": self._views["seq"][i],
+            "prev_hash": bytes(self._views["prev_hash"][i * 32:(i + 1) * 32]).hex(),
+            "row_hash": bytes(self._views["row_hash"][i * 32:(i + 1) * 32]).hex()
+        }
+
+    def _code_filters(self, filters: dict) -> Optional[Dict[str, int]]:
+        """Translate value filters to code filters; None means nothing in this file can match"""
+        codes = {}
+        for column in DICTIONARY_COLUMNS:
+            value = filters.get(column)
+            if value is None:
+                continue
+            code = self.code_for(column, value)
+            if code is None:
+                return None
+            codes[column] = code
+        return codes
+
+    def _row_range(self, since: Optional[datetime], until: Optional[datetime]) -> Tuple[int, int]:
+        timestamps = self._views["timestamp"]
+        lo = bisect.bisect_left(timestamps, to_micros(since)) if since else 0
+        hi = bisect.bisect_left(timestamps, to_micros(until)) if until else self.rows
+        return lo, hi
+
+    def _matches(self, i: int, codes: Dict[str, int]) -> bool:
+        for column, code in codes.items():
+            if self._views[column][i] != code:
+                return False
+        return True
+
+    def scan(
+        self,
+        filters: dict,
+        metadata_filter: dict,
+        descending: bool = False,
+        before: Optional[Tuple[datetime, UUID]] = None
+    ) -> Iterator[dict]:
+        """
+        Yield decoded rows matching the filters, in (timestamp, id) order
+        (or reverse order, optionally strictly before a keyset cursor).
+        """
+        codes = self._code_filters(filters)
+        if codes is None:
+            return
+        lo, hi = self._row_range(filters.get("since"), filters.get("until"))
+        before_key = None
+        if before:
+            before_key = (to_micros(before[0]), before[1].bytes)
+            hi = min(hi, bisect.bisect_right(self._views["timestamp"], before_key[0]))
+
+        indexes = range(hi - 1, lo - 1, -1) if descending else range(lo, hi)
+        for i in indexes:
+            if before_key and self._key(i) >= before_key:
+                continue
+            if not self._matches(i, codes):
+                continue
+            row = self.row(i)
+            if metadata_filter and not metadata_matches(row["log_metadata"], metadata_filter):
+                continue
+            yield row
+
+    def count(self, filters: dict, group_by: List[str]) -> Counter:
+        """Count matching rows per combination of dictionary-encoded columns without decoding rows"""
+        counts = Counter()
+        codes = self._code_filters(filters)
+        if codes is None:
+            return counts
+        lo, hi = self._row_range(filters.get("since"), filters.get("until"))
+        group_views = [self._views[column] for column in group_by]
+        for i in range(lo, hi):
+            if self._matches(i, codes):
+                counts[tuple(view[i] for view in group_views)] += 1
+        return Counter({
+            tuple(
+                None if code == NULL_CODE else self.dictionaries[column][code]
+                for column, code in zip(group_by, key)
+            ): count
+            for key, count in counts.items()
+        })
+
+
+def metadata_matches(metadata: Optional[dict], metadata_filter: dict) -> bool:
+    """Match metadata keys like filter_audit_logs: record_id also matches bulk entries listing it in record_ids"""
+    metadata = metadata or {}
+    for key, value in metadata_filter.items():
+        if metadata.get(key) == value:
+            continue
+        if key == "record_id" and value in (metadata.get("record_ids") or []):
+            continue
+        return False
+    return True
+
+
+def archived_files(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    descending: bool = False,
+    exclude_months: Collection[date] = ()
+) -> List[str]:
+    """Archive files whose month overlaps [since, until), oldest first (or newest first)"""
+    if not os.path.isdir(settings.AUDIT_ARCHIVE_DIR):
+        return []
+    files = []
+    for filename in os.listdir(settings.AUDIT_ARCHIVE_DIR):
+        match = ARCHIVE_FILE_RE.match(filename)
+        if not match:
+            continue
+        month = date(int(match.group(1)), int(match.group(2)), 1)
+        if month in exclude_months:
+            continue
+        next_month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+        if since and next_month <= since.date():
+            continue
+        if until and datetime(month.year, month.month, 1) >= until:
+            continue
+        files.append((month, os.path.join(settings.AUDIT_ARCHIVE_DIR, filename)))
+    return [path for _, path in sorted(files, reverse=descending)]
+
+
+def iter_archived_audit_logs(
+    filters: dict,
+    metadata_filter: Optional[dict] = None,
+    descending: bool = False,
+    before: Optional[Tuple[datetime, UUID]] = None,
+    exclude_months: Collection[date] = ()
+) -> Iterator[dict]:
+    """
+    Read-only scan over archived months. `filters` uses the live view's keys
+    (action, actor_id, vault_item_id, target_user_id, since, until).
+    exclude_months skips months that are still in the live table, e.g. while being archived.
+    """
+    metadata_filter = metadata_filter or {}
+    until = filters.get("until")
+    if before and (until is None or before[0] < until):
+        until = before[0] + timedelta(microseconds=1)
+    for path in archived_files(filters.get("since"), until, descending=descending, exclude_months=exclude_months):
+        with ColumnarArchive(path) as archive:
+            yield from archive.scan(filters, metadata_filter, descending=descending, before=before)
+
+
+def _iter_archive_by_seq(path: str) -> Iterator[dict]:
+    with ColumnarArchive(path) as archive:
+        yield from archive.rows_by_seq()
+
+
+def archived_row_hash(seq: int, exclude_months: Collection[date] = ()) -> Optional[str]:
+    """row_hash of the archived row with this seq, searching the newest months first"""
+    for path in archived_files(descending=True, exclude_months=exclude_months):
+        with ColumnarArchive(path) as archive:
+            row_hash = archive.row_hash_for_seq(seq)
+        if row_hash is not None:
+            return row_hash
+    return None
+
+
+def iter_archived_chain(exclude_months: Collection[date] = ()) -> Iterator[dict]:
+    """
+    Every archived row in seq order, across all months, for verifying the hash chain from
+    genesis. Months are merged rather than concatenated because an entry replayed late
+    can sit in an older month than rows with lower seqs.
+    """
+    return heapq.merge(
+        *(_iter_archive_by_seq(path) for path in archived_files(exclude_months=exclude_months)),
+        key=lambda entry: entry["seq"]
+    )
+
+
+def count_archived_audit_logs(filters: dict, group_by: List[str]) -> Counter:
+    """Aggregate counts over columnar archive files by dictionary-encoded columns"""
+    counts = Counter()
+    for path in archived_files(filters.get("since"), filters.get("until")):
+        with ColumnarArchive(path) as archive:
+            counts.update(archive.count(filters, group_by))
+    return counts
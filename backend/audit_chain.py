@@ -0,0 +1,269 @@
+"""
+Tamper-evident hash chain over audit_logs.
+
+Every audit row carries a monotonically increasing `seq`, the digest of the
+previous row (`prev_hash`) and its own digest (`row_hash`), computed over its
+content plus `prev_hash`. Appends are serialized with a transaction-scoped
+advisory lock so the chain order matches commit order.
+
+The verifier walks only rows added since the last signed checkpoint and
+records a new checkpoint as it goes, so routine verification costs time
+proportional to new rows rather than to the size of the table. Checkpoints are
+HMAC'd with AUDIT_CHECKPOINT_KEY, and a checkpointed row that has since been
+archived is looked up in the archive.
+
+CLI:
+    python audit_chain.py verify [--full]
+"""
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from models import AuditLog, AuditCheckpoint
+from config import get_settings
+from datetime import datetime
+from audit_archive import archived_row_hash, iter_archived_chain
+from audit_partitions import list_audit_partitions
+from types import SimpleNamespace
+from typing import Iterator, Optional, Tuple
+import hashlib
+import hmac
+import json
+
+settings = get_settings()
+
+GENESIS_HASH = "0" * 64
+
+# Arbitrary constant identifying the audit chain's pg_advisory_xact_lock
+AUDIT_CHAIN_LOCK_KEY = 7_413_250_001
+
+# Key under Session.info caching the chain head once this transaction holds the lock
+AUDIT_CHAIN_HEAD = "audit_chain_head"
+
+
+def _canonical_metadata(log_metadata):
+    """Metadata is hashed as parsed JSON so storage formatting does not affect the digest"""
+    if log_metadata is None:
+        return None
+    if isinstance(log_metadata, str):
+        return json.loads(log_metadata)
+    return log_metadata
+
+
+def compute_row_hash(
+    seq: int,
+    prev_hash: str,
+    log_id,
+    actor_id,
+    action: str,
+    vault_item_id,
+    target_user_id,
+    timestamp: datetime,
+    log_metadata
+) -> str:
+    """SHA-256 over a canonical JSON encoding of the row content and the previous digest"""
+    payload = json.dumps(
+        {
+            "seq": seq,
+            "prev_hash": prev_hash,
+            "id": str(log_id),
+            "actor_id": str(actor_id),
+            "action": action,
+            "vault_item_id": str(vault_item_id) if vault_item_id else None,
+            "target_user_id": str(target_user_id) if target_user_id else None,
+            "timestamp": timestamp.isoformat(),
+            "metadata": _canonical_metadata(log_metadata)
+        },
+        sort_keys=True,
+        separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _lock_chain_head(db: Session) -> Tuple[int, str]:
+    """Take the chain lock for this transaction and return the current (seq, row_hash) head"""
+    head = db.info.get(AUDIT_CHAIN_HEAD)
+    if head is not None:
+        return head
+
+    db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": AUDIT_CHAIN_LOCK_KEY})
+    head = (0, GENESIS_HASH)
+    # Archived rows are all covered by a checkpoint, so it stands in for them once they leave the table
+    for last in (
+        db.query(AuditLog.seq, AuditLog.row_hash).order_by(AuditLog.seq.desc()).first(),
+        db.query(AuditCheckpoint.seq, AuditCheckpoint.row_hash).order_by(AuditCheckpoint.seq.desc()).first()
+    ):
+        if last and last.seq > head[0]:
+            head = (last.seq, last.row_hash)
+    db.info[AUDIT_CHAIN_HEAD] = head
+    return head
+
+
+def lock_audit_chain(db: Session) -> None:
+    """Take the chain lock for this transaction, e.g. before checking which rows already exist"""
+    _lock_chain_head(db)
+
+
+def link_audit_row(db: Session, row: dict) -> dict:
+    """
+    Assign seq, prev_hash and row_hash to an audit row (column dict) in this transaction.
+    The chain lock is held until the transaction ends.
+    """
+    prev_seq, prev_hash = _lock_chain_head(db)
+    seq = prev_seq + 1
+    row["seq"] = seq
+    row["prev_hash"] = prev_hash
+    row["row_hash"] = compute_row_hash(
+        seq,
+        prev_hash,
+        row["id"],
+        row["actor_id"],
+        row["action"],
+        row["vault_item_id"],
+        row["target_user_id"],
+        row["timestamp"],
+        row["log_metadata"]
+    )
+    db.info[AUDIT_CHAIN_HEAD] = (seq, row["row_hash"])
+    return row
+
+
+def release_chain_head(db: Session) -> None:
+    """Forget the cached head when the transaction (and with it the lock) ends"""
+    db.info.pop(AUDIT_CHAIN_HEAD, None)
+
+
+# Signed checkpoints
+def sign_checkpoint(seq: int, row_hash: str, created_at: datetime) -> str:
+    message = f"audit-checkpoint|{seq}|{row_hash}|{created_at.isoformat()}"
+    return hmac.new(settings.AUDIT_CHECKPOINT_KEY.encode(), message.encode(), hashlib.sha256).hexdigest()
+
+
+def _record_checkpoint(db: Session, seq: int, row_hash: str) -> AuditCheckpoint:
+    created_at = datetime.utcnow()
+    checkpoint = AuditCheckpoint(
+        seq=seq,
+        row_hash=row_hash,
+        created_at=created_at,
+        signature=sign_checkpoint(seq, row_hash, created_at)
+    )
+    db.add(checkpoint)
+    return checkpoint
+
+
+def _archived_chain_rows(db: Session) -> Iterator[SimpleNamespace]:
+    """Archived rows in seq order, shaped like the live query's rows"""
+    for entry in iter_archived_chain(exclude_months=set(list_audit_partitions(db.connection()))):
+        yield SimpleNamespace(**{**entry, "timestamp": datetime.fromisoformat(entry["timestamp"])})
+
+
+def verify_audit_chain(db: Session, full: bool = False, batch_size: int = 1000) -> dict:
+    """
+    Verify the hash chain from the last valid checkpoint (or from genesis if full=True).
+    A full walk starts with the archived months (see audit_archive) and continues into
+    the live table from the last archived row, so archiving does not show up as a gap.
+    Writes a signed checkpoint every AUDIT_CHECKPOINT_INTERVAL verified rows and at the end;
+    checkpoints are committed once the walk finishes so the row cursor stays open meanwhile.
+    """
+    checkpoint: Optional[AuditCheckpoint] = None
+    if not full:
+        checkpoint = db.query(AuditCheckpoint).order_by(AuditCheckpoint.seq.desc()).first()
+
+    result = {
+        "ok": True,
+        "from_seq": 0,
+        "to_seq": 0,
+        "verified_rows": 0,
+        "first_bad_seq": None,
+        "error": None
+    }
+
+    if checkpoint:
+        expected = sign_checkpoint(checkpoint.seq, checkpoint.row_hash, checkpoint.created_at)
+        if not hmac.compare_digest(expected, checkpoint.signature):
+            result.update(ok=False, first_bad_seq=checkpoint.seq, error="Checkpoint signature invalid")
+            return result
+        anchor = db.query(AuditLog.row_hash).filter(AuditLog.seq == checkpoint.seq).scalar()
+        if anchor is None:
+            anchor = archived_row_hash(checkpoint.seq, exclude_months=set(list_audit_partitions(db.connection())))
+        if anchor != checkpoint.row_hash:
+            result.update(ok=False, first_bad_seq=checkpoint.seq, error="Checkpointed row was altered or removed")
+            return result
+        prev_seq, prev_hash = checkpoint.seq, checkpoint.row_hash
+    else:
+        prev_seq, prev_hash = 0, GENESIS_HASH
+
+    result["from_seq"] = result["to_seq"] = prev_seq
+
+    def live_rows(after_seq: int):
+        return db.query(
+            AuditLog.seq,
+            AuditLog.prev_hash,
+            AuditLog.row_hash,
+            AuditLog.id,
+            AuditLog.actor_id,
+            AuditLog.action,
+            AuditLog.vault_item_id,
+            AuditLog.target_user_id,
+            AuditLog.timestamp,
+            AuditLog.log_metadata
+        ).filter(
+            AuditLog.seq > after_seq
+        ).order_by(AuditLog.seq).yield_per(batch_size)
+
+    def rows():
+        if full:
+            yield from _archived_chain_rows(db)
+        # prev_seq is the last row verified so far, archived or not
+        yield from live_rows(prev_seq)
+
+    since_checkpoint = 0
+    for row in rows():
+        if row.seq != prev_seq + 1:
+            error = "Gap in audit chain (row deleted)"
+        elif row.prev_hash != prev_hash:
+            error = "Previous-hash link mismatch"
+        elif compute_row_hash(
+            row.seq, row.prev_hash, row.id, row.actor_id, row.action,
+            row.vault_item_id, row.target_user_id, row.timestamp, row.log_metadata
+        ) != row.row_hash:
+            error = "Row content does not match its digest"
+        else:
+            error = None
+
+        if error:
+            result.update(ok=False, first_bad_seq=prev_seq + 1, error=error)
+            break
+
+        prev_seq, prev_hash = row.seq, row.row_hash
+        result["to_seq"] = prev_seq
+        result["verified_rows"] += 1
+        since_checkpoint += 1
+        if since_checkpoint >= settings.AUDIT_CHECKPOINT_INTERVAL:
+            _record_checkpoint(db, prev_seq, prev_hash)
+            since_checkpoint = 0
+
+    if since_checkpoint:
+        _record_checkpoint(db, prev_seq, prev_hash)
+    db.commit()
+
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Audit log hash chain tools")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    verify_parser = subcommands.add_parser("verify", help="Verify rows added since the last checkpoint")
+    verify_parser.add_argument("--full", action="store_true", help="Ignore checkpoints and verify from genesis")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        outcome = verify_audit_chain(db, full=args.full)
+    finally:
+        db.close()
+
+    print(json.dumps(outcome, indent=2))
+    sys.exit(0 if outcome["ok"] else 1)
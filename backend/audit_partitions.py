@@ -0,0 +1,283 @@
+"""
+Monthly range partitions for audit_logs and archival of closed months.
+
+Partitions are named audit_logs_yYYYYmMM and cover [month start, next month start).
+The retention job writes partitions older than AUDIT_RETENTION_MONTHS to a
+columnar archive file in AUDIT_ARCHIVE_DIR (see audit_archive.py), then detaches
+and drops them, so the live table (and its index maintenance and vacuum) stays
+bounded. Archived months stay queryable read-only through audit_archive.
+
+Upcoming partitions are created at startup and re-checked periodically by every
+API process (AuditPartitionMaintainer). Entries for a month without a partition,
+such as a journal replayed after its month was archived, land in the DEFAULT
+partition audit_logs_default and stay live there, read alongside the archive.
+A DEFAULT partition rules out DETACH ... CONCURRENTLY, so the detach takes a brief
+ACCESS EXCLUSIVE lock (under DETACH_LOCK_TIMEOUT); the archive is written before it.
+
+CLI:
+    python audit_partitions.py ensure
+    python audit_partitions.py archive
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from models import AuditCheckpoint
+from audit_archive import ColumnarArchive, ColumnarArchiveWriter, archive_file_path
+from database import engine
+from config import get_settings
+from datetime import date, datetime
+from typing import List, Optional
+import logging
+import os
+import re
+import threading
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Arbitrary constant identifying the partition maintenance pg_advisory_xact_lock
+AUDIT_PARTITION_LOCK_KEY = 7_413_250_002
+
+# Longest wait for the lock DETACH PARTITION takes on audit_logs; the run fails and can be repeated
+DETACH_LOCK_TIMEOUT = "5s"
+
+PARTITION_NAME_RE = re.compile(r"^audit_logs_y(\d{4})m(\d{2})$")
+
+ARCHIVE_COLUMNS = [
+    "id", "actor_id", "action", "vault_item_id", "target_user_id", "timestamp",
+    "log_metadata", "seq", "prev_hash", "row_hash"
+]
+
+
+def month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(value: date, months: int) -> date:
+    index = value.year * 12 + (value.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"audit_logs_y{month.year:04d}m{month.month:02d}"
+
+
+def create_audit_partition(conn: Connection, month: date) -> None:
+    """Create the partition for the month starting at `month` if it does not exist"""
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF audit_logs "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    ))
+
+
+def ensure_audit_partitions(conn: Connection, months_ahead: Optional[int] = None) -> None:
+    """Make sure partitions exist from the current month through `months_ahead` months from now"""
+    if months_ahead is None:
+        months_ahead = settings.AUDIT_PARTITION_MONTHS_AHEAD
+    # Every worker runs this; concurrent CREATE TABLE IF NOT EXISTS can still collide
+    conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": AUDIT_PARTITION_LOCK_KEY})
+    current = month_start(datetime.utcnow().date())
+    for offset in range(months_ahead + 1):
+        create_audit_partition(conn, add_months(current, offset))
+
+
+class AuditPartitionMaintainer:
+    """
+    Re-runs ensure_audit_partitions every AUDIT_PARTITION_CHECK_INTERVAL_SECONDS, so a
+    long-running process never outlives the partitions created at its startup
+    (audit inserts past the last partition would fail).
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="audit-partitions", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self.interval):
+            try:
+                with engine.begin() as conn:
+                    ensure_audit_partitions(conn)
+            except Exception:
+                logger.exception("Creating upcoming audit_logs partitions failed; retrying in %s seconds", self.interval)
+
+
+_maintainer: Optional[AuditPartitionMaintainer] = None
+
+
+def start_audit_partition_maintenance() -> None:
+    global _maintainer
+    _maintainer = AuditPartitionMaintainer(settings.AUDIT_PARTITION_CHECK_INTERVAL_SECONDS)
+    _maintainer.start()
+
+
+def stop_audit_partition_maintenance() -> None:
+    if _maintainer:
+        _maintainer.stop()
+
+
+def list_audit_partitions(conn: Connection) -> List[date]:
+    """Months that currently have an attached partition, oldest first"""
+    names = conn.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON pg_inherits.inhparent = parent.oid "
+        "JOIN pg_class child ON pg_inherits.inhrelid = child.oid "
+        "WHERE parent.relname = 'audit_logs'"
+    )).scalars()
+    months = []
+    for name in names:
+        match = PARTITION_NAME_RE.match(name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+def list_detached_audit_partitions(conn: Connection) -> List[date]:
+    """Months whose partition was detached but not yet dropped, e.g. by an interrupted archive run"""
+    names = conn.execute(text(
+        "SELECT relname FROM pg_class WHERE relkind = 'r' AND NOT relispartition AND relname LIKE 'audit_logs_y%'"
+    )).scalars()
+    months = []
+    for name in names:
+        match = PARTITION_NAME_RE.match(name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+def _write_archive(db: Session, name: str, path: str) -> int:
+    """Stream a partition's rows into a columnar archive file; returns the row count"""
+    writer = ColumnarArchiveWriter(path)
+    try:
+        rows = db.execute(
+            text(f"SELECT {', '.join(ARCHIVE_COLUMNS)} FROM {name} ORDER BY timestamp, id"),
+            execution_options={"stream_results": True, "yield_per": settings.AUDIT_EXPORT_CHUNK_SIZE}
+        )
+        for row in rows:
+            writer.append(row)
+        writer.close()
+    except Exception:
+        writer.abort()
+        raise
+    finally:
+        db.rollback()
+    return writer.rows
+
+
+def _archive_matches(db: Session, name: str, path: str) -> bool:
+    """The archive file holds as many rows as the table, up to the same seq"""
+    count, max_seq = db.execute(text(f"SELECT count(*), max(seq) FROM {name}")).one()
+    db.rollback()
+    with ColumnarArchive(path) as archive:
+        return archive.rows == count and archive.max_seq() == max_seq
+
+
+def _detach_audit_partition(db: Session, name: str) -> None:
+    """
+    Detach a partition if it is still attached. Detaching moves no data, so audit_logs
+    is only locked for as long as it takes to queue for and update the catalog.
+    """
+    attached = db.execute(
+        text("SELECT 1 FROM pg_inherits WHERE inhrelid = to_regclass(:name)"), {"name": name}
+    ).scalar()
+    if attached:
+        db.execute(text(f"SET LOCAL lock_timeout = '{DETACH_LOCK_TIMEOUT}'"))
+        db.execute(text(f"ALTER TABLE audit_logs DETACH PARTITION {name}"))
+    db.commit()
+
+
+def archive_audit_partition(db: Session, month: date) -> int:
+    """
+    Archive one month and drop its partition, without holding a lock on audit_logs
+    while the archive is written:
+    1. stream the attached partition into the archive file (fsync'd, then renamed into place);
+    2. detach the partition;
+    3. check the archive against the detached table. Entries replayed into the month
+       after step 1 are picked up by writing the archive again, from the now frozen table;
+    4. drop the table.
+    If any step fails the rows stay in the database, attached or detached; a re-run
+    (see list_detached_audit_partitions) completes the job.
+    """
+    name = partition_name(month)
+    path = archive_file_path(month)
+    os.makedirs(settings.AUDIT_ARCHIVE_DIR, exist_ok=True)
+
+    if not (os.path.exists(path) and _archive_matches(db, name, path)):
+        _write_archive(db, name, path)
+    _detach_audit_partition(db, name)
+    if not _archive_matches(db, name, path):
+        _write_archive(db, name, path)
+        if not _archive_matches(db, name, path):
+            raise RuntimeError(f"Archive {path} does not match {name}; partition left detached")
+
+    with ColumnarArchive(path) as archive:
+        rows = archive.rows
+    db.execute(text(f"DROP TABLE {name}"))
+    db.commit()
+
+    logger.info("Archived %d audit rows from %s to %s", rows, name, path)
+    return rows
+
+
+def archive_old_audit_partitions(db: Session, retain_months: Optional[int] = None) -> List[str]:
+    """
+    Archive every partition older than the retention window.
+    Only months whose rows are all covered by a signed hash-chain checkpoint are archived,
+    so nothing leaves the live table before it has been verified.
+    """
+    if retain_months is None:
+        retain_months = settings.AUDIT_RETENTION_MONTHS
+    cutoff = add_months(month_start(datetime.utcnow().date()), -retain_months)
+
+    checkpoint = db.query(AuditCheckpoint).order_by(AuditCheckpoint.seq.desc()).first()
+    verified_seq = checkpoint.seq if checkpoint else 0
+
+    archived = []
+    # Finish months an interrupted run already detached; they are no longer in the live table
+    for month in list_detached_audit_partitions(db.connection()):
+        archive_audit_partition(db, month)
+        archived.append(archive_file_path(month))
+
+    for month in list_audit_partitions(db.connection()):
+        if month >= cutoff:
+            break
+        max_seq = db.execute(text(f"SELECT max(seq) FROM {partition_name(month)}")).scalar()
+        if max_seq is not None and max_seq > verified_seq:
+            logger.warning("Skipping %s: rows not yet covered by a verified checkpoint", partition_name(month))
+            break
+        archive_audit_partition(db, month)
+        archived.append(archive_file_path(month))
+    return archived
+
+
+if __name__ == "__main__":
+    import argparse
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="audit_logs partition maintenance")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    subcommands.add_parser("ensure", help="Create partitions for upcoming months")
+    subcommands.add_parser("archive", help="Archive partitions older than the retention window")
+    args = parser.parse_args()
+
+    if args.command == "ensure":
+        with engine.begin() as conn:
+            ensure_audit_partitions(conn)
+    else:
+        with engine.begin() as conn:
+            ensure_audit_partitions(conn)
+        db = SessionLocal()
+        try:
+            for path in archive_old_audit_partitions(db):
+                print(f"Archived {path}")
+        finally:
+            db.close()
@@ -0,0 +1,144 @@
+"""
+Incrementally maintained audit rollups.
+
+audit_rollups holds hourly and daily counts keyed by (action, actor, vault item).
+The audit writers upsert into it in the same transaction that inserts the audit
+rows, so dashboard analytics can be answered from a handful of rollup rows
+instead of scanning audit_logs.
+
+CLI:
+    python audit_rollups.py rebuild
+"""
+from sqlalchemy import text, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from models import AuditRollup
+from audit_chain import AUDIT_CHAIN_LOCK_KEY
+from collections import Counter
+from datetime import datetime
+from typing import Iterable, List, Optional
+from uuid import UUID
+
+ROLLUP_GRANULARITIES = ("hour", "day")
+
+# vault_item_id is part of the rollup key, so "no vault item" is stored as the nil UUID
+NO_VAULT_ITEM = UUID(int=0)
+
+ROLLUP_DIMENSIONS = ("action", "actor_id", "vault_item_id")
+
+
+def truncate_timestamp(timestamp: datetime, granularity: str) -> datetime:
+    if granularity == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def increment_audit_rollups(db: Session, rows: Iterable[dict]) -> None:
+    """Add audit rows (column dicts) to the hourly and daily rollups with a single upsert"""
+    counts = Counter()
+    for row in rows:
+        for granularity in ROLLUP_GRANULARITIES:
+            counts[(
+                granularity,
+                truncate_timestamp(row["timestamp"], granularity),
+                row["action"],
+                row["actor_id"],
+                row["vault_item_id"] or NO_VAULT_ITEM
+            )] += 1
+    if not counts:
+        return
+
+    # Sorted keys give concurrent writers a consistent lock order
+    values = [
+        {
+            "granularity": granularity,
+            "bucket_start": bucket_start,
+            "action": action,
+            "actor_id": actor_id,
+            "vault_item_id": vault_item_id,
+            "count": count
+        }
+        for (granularity, bucket_start, action, actor_id, vault_item_id), count in sorted(counts.items(), key=lambda item: str(item[0]))
+    ]
+    stmt = pg_insert(AuditRollup.__table__).values(values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["granularity", "bucket_start", "action", "actor_id", "vault_item_id"],
+        set_={"count": AuditRollup.__table__.c.count + stmt.excluded.count}
+    )
+    db.execute(stmt)
+
+
+def query_audit_rollups(
+    db: Session,
+    granularity: str,
+    group_by: List[str],
+    action: Optional[str] = None,
+    actor_id: Optional[UUID] = None,
+    vault_item_id: Optional[UUID] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None
+) -> List[dict]:
+    """Sum rollup counts per bucket and the requested dimensions"""
+    group_columns = [AuditRollup.bucket_start] + [getattr(AuditRollup, dimension) for dimension in group_by]
+    query = db.query(*group_columns, func.sum(AuditRollup.count).label("count")).filter(
+        AuditRollup.granularity == granularity
+    )
+    if action:
+        query = query.filter(AuditRollup.action == action)
+    if actor_id:
+        query = query.filter(AuditRollup.actor_id == actor_id)
+    if vault_item_id:
+        query = query.filter(AuditRollup.vault_item_id == vault_item_id)
+    if since:
+        query = query.filter(AuditRollup.bucket_start >= truncate_timestamp(since, granularity))
+    if until:
+        query = query.filter(AuditRollup.bucket_start < until)
+    rows = query.group_by(*group_columns).order_by(AuditRollup.bucket_start).all()
+
+    result = []
+    for row in rows:
+        bucket = {"bucket_start": row.bucket_start, "count": int(row.count)}
+        for dimension in group_by:
+            value = getattr(row, dimension)
+            bucket[dimension] = None if value == NO_VAULT_ITEM else value
+        result.append(bucket)
+    return result
+
+
+def rebuild_audit_rollups(db: Session) -> None:
+    """
+    Recompute rollups from audit_logs. Buckets older than the oldest live month are
+    kept, since their rows may already have been archived out of the live table.
+    Holds the audit chain lock so no audit rows are written mid-rebuild.
+    """
+    db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": AUDIT_CHAIN_LOCK_KEY})
+    oldest = db.execute(text("SELECT date_trunc('month', min(timestamp)) FROM audit_logs")).scalar()
+    if oldest is None:
+        db.commit()
+        return
+    db.execute(text("DELETE FROM audit_rollups WHERE bucket_start >= :oldest"), {"oldest": oldest})
+    for granularity in ROLLUP_GRANULARITIES:
+        db.execute(text(
+            "INSERT INTO audit_rollups (granularity, bucket_start, action, actor_id, vault_item_id, count) "
+            "SELECT :granularity, date_trunc(:granularity, timestamp), action, actor_id, "
+            "COALESCE(vault_item_id, :no_vault_item), count(*) "
+            "FROM audit_logs GROUP BY 2, 3, 4, 5"
+        ), {"granularity": granularity, "no_vault_item": NO_VAULT_ITEM})
+    db.commit()
+
+
+if __name__ == "__main__":
+    import argparse
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Audit rollup maintenance")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    subcommands.add_parser("rebuild", help="Recompute rollups from audit_logs")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        rebuild_audit_rollups(db)
+        print("Audit rollups rebuilt")
+    finally:
+        db.close()
@@ -0,0 +1,170 @@
+"""
+Live fan-out of committed audit entries to Server-Sent Events subscribers.
+
+Backends (AUDIT_STREAM_BACKEND):
+- local: entries are handed to the in-process broadcaster once their
+  transaction commits. Suitable for a single-node deployment.
+- postgres: the audit write path issues pg_notify in the inserting
+  transaction, so Postgres delivers it on commit. Each process runs one
+  LISTEN connection that feeds its broadcaster, shared by every subscriber.
+
+Each subscriber has a bounded queue. A subscriber that falls a full queue
+behind is dropped with a "lagged" event, so it can resume from its last
+event id through /api/audit/logs instead of holding memory for a slow reader.
+"""
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from database import SessionLocal, engine
+from config import get_settings
+from typing import List, Optional, Set
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+AUDIT_NOTIFY_CHANNEL = "audit_log"
+
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+MAX_NOTIFY_PAYLOAD = 7900
+
+# Key under Session.info holding entries to broadcast once the transaction commits
+PENDING_STREAM_ENTRIES = "pending_stream_entries"
+
+# Queued in place of the backlog when a subscriber overflows
+LAGGED = object()
+
+
+class AuditSubscription:
+    def __init__(self, queue_size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+
+class AuditBroadcaster:
+    """Fans entries out to subscriber queues on the event loop"""
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self._subscribers: Set[AuditSubscription] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def bind(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+
+    def subscribe(self) -> AuditSubscription:
+        subscription = AuditSubscription(self.queue_size)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: AuditSubscription) -> None:
+        self._subscribers.discard(subscription)
+
+    def publish(self, entries: List[dict]) -> None:
+        """Thread-safe: may be called from request threads or the listener thread"""
+        if self._loop is None or not entries:
+            return
+        self._loop.call_soon_threadsafe(self._dispatch, entries)
+
+    def _dispatch(self, entries: List[dict]) -> None:
+        for subscription in list(self._subscribers):
+            try:
+                for entry in entries:
+                    subscription.queue.put_nowait(entry)
+            except asyncio.QueueFull:
+                # Drop the backlog and tell the client to catch up from its last event id
+                while not subscription.queue.empty():
+                    subscription.queue.get_nowait()
+                subscription.queue.put_nowait(LAGGED)
+                self._subscribers.discard(subscription)
+
+
+class PostgresAuditListener:
+    """One LISTEN connection per process feeding the broadcaster"""
+
+    def __init__(self, broadcaster: AuditBroadcaster):
+        self.broadcaster = broadcaster
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="audit-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                self._listen()
+            except Exception:
+                logger.exception("Audit LISTEN connection failed; reconnecting")
+                time.sleep(1)
+
+    def _listen(self) -> None:
+        raw = engine.raw_connection()
+        try:
+            conn = raw.driver_connection
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {AUDIT_NOTIFY_CHANNEL}")
+            while not self._stopping.is_set():
+                if select.select([conn], [], [], 1.0) == ([], [], []):
+                    continue
+                conn.poll()
+                entries = []
+                while conn.notifies:
+                    entries.append(json.loads(conn.notifies.pop(0).payload))
+                self.broadcaster.publish(entries)
+        finally:
+            raw.invalidate()
+
+
+broadcaster = AuditBroadcaster(settings.AUDIT_STREAM_QUEUE_SIZE)
+_listener: Optional[PostgresAuditListener] = None
+
+
+def publish_audit_entries(db: Session, entries: List[dict]) -> None:
+    """
+    Called by the audit writers inside the transaction that inserts the entries,
+    so subscribers only ever see committed rows.
+    """
+    if not entries:
+        return
+    if settings.AUDIT_STREAM_BACKEND == "postgres":
+        for entry in entries:
+            payload = json.dumps(entry)
+            if len(payload) > MAX_NOTIFY_PAYLOAD:
+                payload = json.dumps({**entry, "log_metadata": None, "metadata_truncated": True})
+            db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": AUDIT_NOTIFY_CHANNEL, "payload": payload})
+    else:
+        db.info.setdefault(PENDING_STREAM_ENTRIES, []).extend(entries)
+
+
+def start_audit_stream(loop: asyncio.AbstractEventLoop) -> None:
+    global _listener
+    broadcaster.bind(loop)
+    if settings.AUDIT_STREAM_BACKEND == "postgres":
+        _listener = PostgresAuditListener(broadcaster)
+        _listener.start()
+
+
+def stop_audit_stream() -> None:
+    if _listener:
+        _listener.stop()
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _broadcast_committed_entries(session: Session) -> None:
+    broadcaster.publish(session.info.pop(PENDING_STREAM_ENTRIES, None))
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_rolled_back_entries(session: Session) -> None:
+    session.info.pop(PENDING_STREAM_ENTRIES, None)
@@ -0,0 +1,412 @@
+"""
+Pluggable audit writers.
+
+- TransactionalAuditWriter: adds the entry to the caller's session, so it is
+  committed (or rolled back) together with the action it describes.
+- BufferedAuditWriter: just before the caller's transaction commits, appends the
+  entry to a per-process fsync'd write-ahead file, tagged with the transaction id,
+  and hands it to a background worker that bulk-inserts batches into audit_logs.
+  Entries whose transaction did not commit are dropped at insert time, so a
+  committed action always has its entry on disk and a rolled-back one never gets
+  inserted. Journal segments are only deleted after their batch is committed;
+  failed ones are retried with backoff, and segments left by processes that are
+  gone are claimed and replayed.
+"""
+from sqlalchemy import event, insert, text
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import AuditLog
+from audit_chain import lock_audit_chain, link_audit_row, release_chain_head
+from audit_rollups import increment_audit_rollups
+from audit_stream import publish_audit_entries
+from config import get_settings
+from abc import ABC, abstractmethod
+from datetime import datetime
+from collections import deque
+from typing import Deque, List, Optional
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Key under Session.info where entries wait for their transaction to commit
+PENDING_AUDIT_ENTRIES = "pending_audit_entries"
+
+
+
+class AuditEntriesInProgress(Exception):
+    """A journaled entry's transaction has not committed or rolled back yet"""
+
+
+def audit_log_to_entry(audit_log: AuditLog) -> dict:
+    """Serialize an AuditLog into a JSON-safe journal entry"""
+    return {
+        "id": str(audit_log.id),
+        "actor_id": str(audit_log.actor_id),
+        "action": audit_log.action,
+        "vault_item_id": str(audit_log.vault_item_id) if audit_log.vault_item_id else None,
+        "target_user_id": str(audit_log.target_user_id) if audit_log.target_user_id else None,
+        "timestamp": audit_log.timestamp.isoformat(),
+        "log_metadata": audit_log.log_metadata
+    }
+
+
+def entry_to_row(entry: dict) -> dict:
+    """Convert a journal entry back into column values for a bulk insert"""
+    return {
+        "id": uuid.UUID(entry["id"]),
+        "actor_id": uuid.UUID(entry["actor_id"]),
+        "action": entry["action"],
+        "vault_item_id": uuid.UUID(entry["vault_item_id"]) if entry["vault_item_id"] else None,
+        "target_user_id": uuid.UUID(entry["target_user_id"]) if entry["target_user_id"] else None,
+        "timestamp": datetime.fromisoformat(entry["timestamp"]),
+        "log_metadata": entry["log_metadata"]
+    }
+
+
+def _read_journal(path: str) -> List[dict]:
+    """Entries in a journal file; a torn final line was never acknowledged and is skipped"""
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                logger.warning("Skipping torn audit journal line in %s", path)
+    return entries
+
+
+def committed_audit_entries(db: Session, entries: List[dict]) -> List[dict]:
+    """
+    The entries whose transaction committed, without their xid tags. Entries of aborted
+    transactions are dropped; an xid too old for Postgres to report on counts as committed.
+    Raises AuditEntriesInProgress while any of the transactions is still running.
+    """
+    xids = list({entry["xid"] for entry in entries if entry.get("xid") is not None})
+    statuses = dict(db.execute(
+        text("SELECT xid, txid_status(xid) FROM unnest(CAST(:xids AS bigint[])) AS xid"),
+        {"xids": xids}
+    ).all()) if xids else {}
+    if "in progress" in statuses.values():
+        raise AuditEntriesInProgress
+    return [
+        {key: value for key, value in entry.items() if key != "xid"}
+        for entry in entries
+        if statuses.get(entry.get("xid")) != "aborted"
+    ]
+
+
+def bulk_insert_audit_entries(db: Session, entries: List[dict]) -> None:
+    """
+    Chain and insert journal entries in one statement.
+    Ids already in the table are dropped before chaining, so replays are idempotent.
+    The check runs under the chain lock, which every audit insert takes, so no other
+    writer can add one of these ids before the insert; a conflict would mean a bug and fails.
+    """
+    if not entries:
+        return
+    lock_audit_chain(db)
+    existing = {
+        str(row.id) for row in db.query(AuditLog.id).filter(AuditLog.id.in_([uuid.UUID(e["id"]) for e in entries]))
+    }
+    entries = [entry for entry in entries if entry["id"] not in existing]
+    if not entries:
+        return
+    rows = [link_audit_row(db, entry_to_row(entry)) for entry in entries]
+    db.execute(insert(AuditLog.__table__), rows)
+    increment_audit_rollups(db, rows)
+    publish_audit_entries(db, entries)
+
+
+class AuditWriter(ABC):
+    """Base audit writer: decides how a new AuditLog reaches the database"""
+
+    @abstractmethod
+    def write(self, db: Session, audit_log: AuditLog) -> None:
+        """Take a new AuditLog from db's transaction"""
+
+    def before_commit(self, db: Session) -> None:
+        pass
+
+    def after_commit(self, db: Session) -> None:
+        pass
+
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+
+class TransactionalAuditWriter(AuditWriter):
+    """Write the entry in the caller's transaction (original behaviour)"""
+
+    def write(self, db: Session, audit_log: AuditLog) -> None:
+        row = link_audit_row(db, {
+            "id": audit_log.id,
+            "actor_id": audit_log.actor_id,
+            "action": audit_log.action,
+            "vault_item_id": audit_log.vault_item_id,
+            "target_user_id": audit_log.target_user_id,
+            "timestamp": audit_log.timestamp,
+            "log_metadata": audit_log.log_metadata
+        })
+        audit_log.seq = row["seq"]
+        audit_log.prev_hash = row["prev_hash"]
+        audit_log.row_hash = row["row_hash"]
+        db.add(audit_log)
+        increment_audit_rollups(db, [row])
+        publish_audit_entries(db, [audit_log_to_entry(audit_log)])
+
+
+class BufferedAuditWriter(AuditWriter):
+    """
+    Journal entries to a write-ahead file and bulk-insert them from a background thread.
+
+    Each process journals to its own files under AUDIT_WAL_PATH:
+        <AUDIT_WAL_PATH>.<owner>              active journal, appended to before commit
+        <AUDIT_WAL_PATH>.<owner>.<n>.flushing rotated segments, deleted once inserted
+        <AUDIT_WAL_PATH>.<owner>.lock         flock'd for the life of the process
+    A segment whose insert fails stays queued and is retried with exponential backoff;
+    the segments after it are still inserted. Files of an owner whose lock can be taken belong to a process
+    that is gone; they are claimed by renaming them into this process's queue.
+    """
+
+    def __init__(self, wal_path: str, batch_size: int, flush_interval: float, max_backoff: float = 60.0):
+        self.wal_path = wal_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.journal_path = f"{wal_path}.{self.owner}"
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._buffered = 0
+        self._wal_file = None
+        self._owner_lock = None
+        self._segment_seq = 0
+        # Rotated segments not yet inserted, oldest first
+        self._pending: Deque[str] = deque()
+        self._thread: Optional[threading.Thread] = None
+
+    def write(self, db: Session, audit_log: AuditLog) -> None:
+        # Held on the session until it commits
+        db.info.setdefault(PENDING_AUDIT_ENTRIES, []).append(audit_log_to_entry(audit_log))
+
+    def before_commit(self, db: Session) -> None:
+        """Durably journal the session's entries, tagged with its transaction id, and queue them"""
+        entries = db.info.get(PENDING_AUDIT_ENTRIES)
+        if not entries or self._wal_file is None:
+            return
+        xid = db.execute(text("SELECT txid_current()")).scalar()
+        db.info.pop(PENDING_AUDIT_ENTRIES)
+        with self._lock:
+            for entry in entries:
+                self._wal_file.write(json.dumps({**entry, "xid": xid}) + "\n")
+            self._wal_file.flush()
+            os.fsync(self._wal_file.fileno())
+            self._buffered += len(entries)
+            if self._buffered >= self.batch_size:
+                self._wake.set()
+
+    def after_commit(self, db: Session) -> None:
+        # Not started (e.g. a one-off script): nothing was journaled, insert synchronously
+        entries = db.info.pop(PENDING_AUDIT_ENTRIES, None)
+        if entries:
+            self._insert(entries)
+
+    def start(self) -> None:
+        # Locked before it appears under its final name, so no other process can see it unlocked
+        lock_path = f"{self.journal_path}.lock"
+        self._owner_lock = open(lock_path + ".tmp", "w")
+        fcntl.flock(self._owner_lock, fcntl.LOCK_EX)
+        os.rename(lock_path + ".tmp", lock_path)
+        self._wal_file = open(self.journal_path, "a", encoding="utf-8")
+        self.recover()
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join()
+        try:
+            self.flush()
+        except Exception:
+            # Left on disk under this owner; claimed by the next process to start
+            logger.exception("Audit batch insert failed at shutdown; %d segments left for recovery", len(self._pending))
+        if self._wal_file:
+            self._wal_file.close()
+            self._wal_file = None
+        if self._owner_lock is None:
+            return
+        if not self._pending and os.path.getsize(self.journal_path) == 0:
+            os.remove(self.journal_path)
+            os.remove(f"{self.journal_path}.lock")
+        self._owner_lock.close()
+        self._owner_lock = None
+
+    def _next_segment(self) -> str:
+        self._segment_seq += 1
+        return f"{self.journal_path}.{self._segment_seq:012d}.flushing"
+
+    def _claim(self, path: str) -> None:
+        """Move another owner's journal file into this process's queue; losing a race to another claimer is fine"""
+        segment = self._next_segment()
+        try:
+            os.rename(path, segment)
+        except FileNotFoundError:
+            return
+        self._pending.append(segment)
+        logger.info("Claimed audit journal %s as %s", path, segment)
+
+    def recover(self) -> None:
+        """
+        Queue journal files left behind by processes that are gone (crash or unclean shutdown).
+        Runs on the writer thread (or before it starts), like everything else touching the queue.
+        """
+        for lock_path in glob.glob(f"{self.wal_path}.*.lock"):
+            owner_journal = lock_path[:-len(".lock")]
+            if owner_journal == self.journal_path:
+                continue
+            try:
+                owner_lock = open(lock_path)
+            except FileNotFoundError:
+                continue
+            try:
+                try:
+                    fcntl.flock(owner_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # Owner is alive
+                for path in sorted(glob.glob(f"{owner_journal}.*.flushing")):
+                    self._claim(path)
+                if os.path.exists(owner_journal):
+                    self._claim(owner_journal)
+                if os.path.exists(lock_path):
+                    os.remove(lock_path)
+            finally:
+                owner_lock.close()
+
+    def _rotate(self) -> None:
+        """Close off the active journal as a segment at the back of the queue"""
+        with self._lock:
+            if not self._buffered:
+                return
+            segment = self._next_segment()
+            self._wal_file.close()
+            os.replace(self.journal_path, segment)
+            self._wal_file = open(self.journal_path, "a", encoding="utf-8")
+            self._buffered = 0
+            self._pending.append(segment)
+
+    def _drain(self) -> None:
+        """
+        Insert queued segments oldest first. A segment that fails stays queued without
+        holding back the ones after it; the first failure is raised once all were tried.
+        """
+        error = None
+        in_progress = False
+        for segment in list(self._pending):
+            try:
+                entries = _read_journal(segment)
+                self._insert(entries)
+            except AuditEntriesInProgress:
+                in_progress = True
+                continue
+            except Exception as e:
+                logger.error("Inserting audit journal segment %s failed; it stays queued", segment, exc_info=True)
+                error = error or e
+                continue
+            os.remove(segment)
+            self._pending.remove(segment)
+            logger.debug("Inserted %d audit entries from %s", len(entries), segment)
+        if error:
+            raise error
+        if in_progress:
+            raise AuditEntriesInProgress
+
+    def flush(self) -> None:
+        """Rotate the journal and insert every queued segment"""
+        self._rotate()
+        self._drain()
+
+    def _insert(self, entries: List[dict]) -> None:
+        db = SessionLocal()
+        try:
+            entries = committed_audit_entries(db, entries)
+            for i in range(0, len(entries), self.batch_size):
+                bulk_insert_audit_entries(db, entries[i:i + self.batch_size])
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _run(self) -> None:
+        failures = 0
+        retry_at = 0.0
+        while not self._stopping.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.recover()
+                # Rotating moves buffered entries to disk even while inserts are backing off
+                self._rotate()
+                if time.monotonic() < retry_at:
+                    continue
+                self._drain()
+                failures = 0
+            except AuditEntriesInProgress:
+                # A transaction is between journaling and its commit; picked up on the next pass
+                continue
+            except Exception:
+                failures += 1
+                delay = min(self.flush_interval * 2 ** failures, self.max_backoff)
+                retry_at = time.monotonic() + delay
+                logger.exception(
+                    "Audit batch insert failed (%d segments queued); retrying in %.1f seconds",
+                    len(self._pending), delay
+                )
+
+
+def _create_audit_writer() -> AuditWriter:
+    if settings.AUDIT_WRITER_MODE == "transaction":
+        return TransactionalAuditWriter()
+    if settings.AUDIT_WRITER_MODE == "buffered":
+        return BufferedAuditWriter(
+            settings.AUDIT_WAL_PATH,
+            settings.AUDIT_BATCH_SIZE,
+            settings.AUDIT_FLUSH_INTERVAL_SECONDS,
+            settings.AUDIT_FLUSH_MAX_BACKOFF_SECONDS
+        )
+    raise ValueError(f"Unknown AUDIT_WRITER_MODE: {settings.AUDIT_WRITER_MODE}")
+
+
+audit_writer = _create_audit_writer()
+
+
+@event.listens_for(SessionLocal, "before_commit")
+def _journal_audit_entries(session: Session) -> None:
+    audit_writer.before_commit(session)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _insert_committed_audit_entries(session: Session) -> None:
+    release_chain_head(session)
+    audit_writer.after_commit(session)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_rolled_back_audit_entries(session: Session) -> None:
+    release_chain_head(session)
+    session.info.pop(PENDING_AUDIT_ENTRIES, None)
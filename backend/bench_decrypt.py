@@ -0,0 +1,60 @@
+"""
+Benchmark serial vs batched vault record decryption.
+
+Usage:
+    python bench_decrypt.py [--sizes 10 1000 100000] [--repeat 3]
+
+Requires the same environment as the API (ENCRYPTION_KEY etc.).
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from security import encrypt_record, decrypt_record, decrypt_record_batch, generate_wrapped_data_key
+from config import get_settings
+import argparse
+import json
+import time
+import uuid
+
+
+SAMPLE_RECORD = {
+    "investment_name": "Long/Short Equity Fund Alpha",
+    "invested_amount": 50000000.00,
+    "investment_date": "2024-01-15",
+    "instrument_type": "Limited Partnership Interest",
+    "remarks": "2/20 fee structure, monthly redemptions"
+}
+
+
+def best_of(repeat: int, fn) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    
+    settings = get_settings()
+    print(f"threshold={settings.DECRYPT_PARALLEL_THRESHOLD} workers={settings.DECRYPT_MAX_WORKERS}")
+    print(f"{'records':>10} {'serial (ms)':>12} {'batch (ms)':>12} {'speedup':>8}")
+    
+    vault_item_id = uuid.uuid4()
+    wrapped_key = generate_wrapped_data_key(vault_item_id)
+    
+    for size in args.sizes:
+        payloads = [encrypt_record(json.dumps(SAMPLE_RECORD).encode(), vault_item_id, wrapped_key) for _ in range(size)]
+        serial = best_of(args.repeat, lambda: [json.loads(decrypt_record(p, vault_item_id, wrapped_key)) for p in payloads])
+        batch = best_of(args.repeat, lambda: [json.loads(d) for d in decrypt_record_batch(payloads, vault_item_id, wrapped_key)])
+        print(f"{size:>10} {serial * 1000:>12.1f} {batch * 1000:>12.1f} {serial / batch:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark login latency under concurrent load against a running API.
+
+Fires --requests logins from --concurrency threads while a probe thread keeps
+calling GET / and reports p50/p99 for both, plus how many logins were shed
+with 503. The probe shows whether a login burst starves other endpoints.
+
+Usage:
+    python bench_login.py --username alice --password ... [--url http://localhost:8000]
+        [--concurrency 50] [--requests 500]
+"""
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+
+def percentile(timings: list, p: float) -> float:
+    if not timings:
+        return float("nan")
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def timed_request(request: urllib.request.Request) -> tuple:
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request) as response:
+            response.read()
+            code = response.status
+    except urllib.error.HTTPError as e:
+        code = e.code
+    return code, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    body = json.dumps({"username": args.username, "password": args.password}).encode()
+
+    def login(_):
+        return timed_request(urllib.request.Request(
+            f"{args.url}/api/auth/login", data=body, headers={"Content-Type": "application/json"}
+        ))
+
+    probe_timings = []
+    done = threading.Event()
+
+    def probe():
+        while not done.is_set():
+            probe_timings.append(timed_request(urllib.request.Request(f"{args.url}/"))[1])
+            time.sleep(0.01)
+
+    probe_thread = threading.Thread(target=probe)
+    probe_thread.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(login, range(args.requests)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    probe_thread.join()
+
+    codes = {}
+    for code, _ in results:
+        codes[code] = codes.get(code, 0) + 1
+    ok = [timing for code, timing in results if code == 200]
+    print(f"{args.requests} logins, concurrency {args.concurrency}, {elapsed:.1f}s ({args.requests / elapsed:.1f}/s)")
+    print(f"status codes: {dict(sorted(codes.items()))}")
+    print(f"{'':>8} {'p50 (ms)':>10} {'p99 (ms)':>10}")
+    print(f"{'login':>8} {percentile(ok, 50) * 1000:>10.1f} {percentile(ok, 99) * 1000:>10.1f}")
+    print(f"{'GET /':>8} {percentile(probe_timings, 50) * 1000:>10.1f} {percentile(probe_timings, 99) * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Blind indexes over encrypted vault record fields.
+
+For each field in BLIND_INDEXED_FIELDS a record stores `<field>_index`, the keyed
+HMAC of the field value (see security.blind_index). A lookup computes the index of
+the searched value and matches it in SQL, so only the matching records are fetched
+and decrypted. Indexes are written with every record; records created before the
+indexes existed are filled in by the backfill job and do not match until then.
+
+CLI:
+    python blind_index.py backfill [--batch-size N] [--delay SECONDS]
+"""
+from sqlalchemy import false, or_
+from sqlalchemy.orm import Session, Query
+from models import VaultItem, VaultRecord
+from security import blind_index, decrypt_record, generate_wrapped_data_key
+from typing import Optional
+from uuid import UUID
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+BLIND_INDEXED_FIELDS = ("instrument_type", "investment_name")
+
+
+def index_column(field: str):
+    return getattr(VaultRecord, f"{field}_index")
+
+
+def record_blind_indexes(record: dict, vault_item_id: UUID, wrapped_key: bytes) -> dict:
+    """Column values for a record's blind indexes, to be stored alongside its ciphertext"""
+    return {
+        f"{field}_index": blind_index(field, record[field], vault_item_id, wrapped_key)
+        for field in BLIND_INDEXED_FIELDS
+    }
+
+
+def filter_by_blind_indexes(query: Query, vault_item: VaultItem, **values: Optional[str]) -> Query:
+    """Restrict a vault item's record query to exact (case-insensitive) matches on indexed fields"""
+    for field, value in values.items():
+        if value is None:
+            continue
+        if vault_item.wrapped_data_key is None:
+            # No data key yet means no record has been indexed
+            return query.filter(false())
+        query = query.filter(
+            index_column(field) == blind_index(field, value, vault_item.id, vault_item.wrapped_data_key)
+        )
+    return query
+
+
+def backfill_blind_indexes(db: Session, batch_size: int = 500, delay: float = 0.2) -> int:
+    """
+    Compute missing blind indexes in keyset-ordered batches, committing after each batch.
+    Safe to interrupt and re-run: only records with a missing index are selected.
+    """
+    last_id: Optional[UUID] = None
+    indexed = 0
+    while True:
+        query = db.query(VaultRecord).filter(
+            or_(*(index_column(field).is_(None) for field in BLIND_INDEXED_FIELDS))
+        )
+        if last_id is not None:
+            query = query.filter(VaultRecord.id > last_id)
+        batch = query.order_by(VaultRecord.id).limit(batch_size).with_for_update(of=VaultRecord).all()
+        if not batch:
+            return indexed
+
+        for record in batch:
+            vault_item = record.vault_item
+            if vault_item.wrapped_data_key is None:
+                db.refresh(vault_item, with_for_update=True)
+                if vault_item.wrapped_data_key is None:
+                    vault_item.wrapped_data_key = generate_wrapped_data_key(vault_item.id)
+            data = json.loads(decrypt_record(record.encrypted_payload, vault_item.id, vault_item.wrapped_data_key))
+            for column, value in record_blind_indexes(data, vault_item.id, vault_item.wrapped_data_key).items():
+                setattr(record, column, value)
+        indexed += len(batch)
+        last_id = batch[-1].id
+        db.commit()
+        logger.info("Blind index backfill: %d records indexed", indexed)
+        time.sleep(delay)
+
+
+if __name__ == "__main__":
+    import argparse
+    from database import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Vault record blind index maintenance")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    backfill_parser = subcommands.add_parser("backfill", help="Index records written before blind indexes existed")
+    backfill_parser.add_argument("--batch-size", type=int, default=500, help="Records per batch")
+    backfill_parser.add_argument("--delay", type=float, default=0.2, help="Seconds to sleep between batches")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        count = backfill_blind_indexes(db, batch_size=args.batch_size, delay=args.delay)
+    finally:
+        db.close()
+
+    print(f"Indexed {count} records")
@@ -1,17 +1,99 @@
 import os
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Optional
 
 
 class Settings(BaseSettings):
     SECRET_KEY: str
     ENCRYPTION_KEY: str
+    # Signs hash-chain checkpoints (audit_chain.py); independent of the JWT key so either can rotate alone
+    AUDIT_CHECKPOINT_KEY: str
     DATABASE_URL: str
     
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
     PRIVILEGE_SESSION_DURATION_MINUTES: int = 3
     
+    # Argon2 parameters for new password hashes; unset keeps passlib's defaults.
+    # Stored hashes made with other parameters are rehashed on the user's next login.
+    ARGON2_TIME_COST: Optional[int] = None
+    ARGON2_MEMORY_COST_KIB: Optional[int] = None
+    ARGON2_PARALLELISM: Optional[int] = None
+    # Dedicated Argon2 pool: logins beyond workers + queued slots get 503 with Retry-After
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_QUEUED: int = 16
+    PASSWORD_HASH_RETRY_AFTER_SECONDS: int = 1
+    
+    # Rate limits per RATE_LIMIT_WINDOW_SECONDS (see rate_limit.py); 0 disables a limit.
+    # RATE_LIMIT_BACKEND "memory" keeps at most RATE_LIMIT_MAX_KEYS counters per process.
+    RATE_LIMIT_BACKEND: str = "memory"
+    RATE_LIMIT_MAX_KEYS: int = 100000
+    RATE_LIMIT_WINDOW_SECONDS: int = 60
+    LOGIN_RATE_LIMIT_PER_IP: int = 30
+    LOGIN_RATE_LIMIT_PER_USERNAME: int = 10
+    VAULT_ACCESS_RATE_LIMIT_PER_IP: int = 30
+    VAULT_ACCESS_RATE_LIMIT_PER_USER: int = 10
+    
+    # Authenticated user identity cache (see user_cache.py)
+    USER_CACHE_TTL_SECONDS: float = 60.0
+    USER_CACHE_MAX_ENTRIES: int = 10000
+    
+    # TOTP verification (see totp_verifier.py): decrypted verifiers cached per user, and
+    # accepted codes recorded per (user, time step) in TOTP_REPLAY_BACKEND,
+    # "memory" (single process) or "postgres" (shared by every worker)
+    TOTP_VERIFIER_CACHE_TTL_SECONDS: float = 300.0
+    TOTP_VERIFIER_CACHE_MAX_ENTRIES: int = 10000
+    TOTP_REPLAY_BACKEND: str = "memory"
+    # Rendered MFA enrolment QR codes kept in memory (see qr_codes.py)
+    QR_CODE_CACHE_MAX_ENTRIES: int = 1000
+    
+    # Key ring: ENCRYPTION_KEY is the active key with id ENCRYPTION_KEY_ID (0-255);
+    # RETIRED_ENCRYPTION_KEYS ("id:key,id:key") remain readable during a rotation
+    ENCRYPTION_KEY_ID: int = 1
+    RETIRED_ENCRYPTION_KEYS: str = ""
+    # Re-encryption job (key_rotation.py): rows per batch and pause between batches
+    KEY_ROTATION_BATCH_SIZE: int = 500
+    KEY_ROTATION_BATCH_DELAY_SECONDS: float = 0.2
+    
+    # Vault record encryption/decryption: batches at or above the threshold use the worker pool
+    DECRYPT_PARALLEL_THRESHOLD: int = 256
+    DECRYPT_MAX_WORKERS: int = 4
+    # Unwrapped per-vault data keys kept in memory (LRU)
+    DATA_KEY_CACHE_SIZE: int = 1024
+    # Records fetched and decrypted per chunk when streaming a vault item's records
+    VAULT_RECORD_CHUNK_SIZE: int = 500
+    # Largest number of records accepted by one bulk write
+    VAULT_BULK_WRITE_MAX_RECORDS: int = 5000
+    # Decrypted records cached per user and vault item (see record_cache.py)
+    VAULT_RECORD_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    
+    # Rows fetched per round trip from the server-side cursor when exporting audit logs
+    AUDIT_EXPORT_CHUNK_SIZE: int = 1000
+    
+    # Audit writer: "transaction" writes entries in the caller's transaction,
+    # "buffered" journals them to per-process files named after AUDIT_WAL_PATH and bulk-inserts in the background
+    AUDIT_WRITER_MODE: str = "transaction"
+    AUDIT_WAL_PATH: str = "audit_wal.ndjson"
+    AUDIT_BATCH_SIZE: int = 500
+    AUDIT_FLUSH_INTERVAL_SECONDS: float = 1.0
+    # Longest wait between retries of a failed batch insert
+    AUDIT_FLUSH_MAX_BACKOFF_SECONDS: float = 60.0
+    
+    # Rows verified between signed hash-chain checkpoints
+    AUDIT_CHECKPOINT_INTERVAL: int = 10000
+    
+    # Monthly audit_logs partitions: created this many months ahead, archived after the retention window
+    AUDIT_PARTITION_MONTHS_AHEAD: int = 3
+    AUDIT_PARTITION_CHECK_INTERVAL_SECONDS: float = 3600.0
+    AUDIT_RETENTION_MONTHS: int = 12
+    AUDIT_ARCHIVE_DIR: str = "audit_archive"
+    
+    # Live audit tail: "local" (in-process, single node) or "postgres" (LISTEN/NOTIFY)
+    AUDIT_STREAM_BACKEND: str = "local"
+    AUDIT_STREAM_QUEUE_SIZE: int = 1000
+    AUDIT_STREAM_KEEPALIVE_SECONDS: int = 15
+    
     class Config:
         env_file = ".env"
 
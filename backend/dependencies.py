@@ -4,17 +4,14 @@ from sqlalchemy.orm import Session
 from database import get_db
 from security import decode_access_token
 from models import User, RoleEnum
+from user_cache import load_user_identity
 from typing import Optional
 import uuid
 
 security = HTTPBearer()
 
 
-def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
-    """Get current authenticated user from JWT token"""
+def _token_user_id(credentials: HTTPAuthorizationCredentials) -> uuid.UUID:
     token = credentials.credentials
     payload = decode_access_token(token)
     
@@ -31,7 +28,34 @@ def get_current_user(
             detail="Invalid token payload"
         )
     
-    user = db.query(User).filter(User.id == uuid.UUID(user_id)).first()
+    return uuid.UUID(user_id)
+
+
+def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+) -> User:
+    """
+    Get current authenticated user from JWT token.
+    Served from the user identity cache when possible, so the returned User is detached
+    and carries only id, username, role and created_at.
+    """
+    user = load_user_identity(db, _token_user_id(credentials))
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found"
+        )
+    
+    return user
+
+
+def get_current_user_record(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+) -> User:
+    """Get current authenticated user's full row (including secrets) from the database"""
+    user = db.query(User).filter(User.id == _token_user_id(credentials)).first()
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -42,7 +66,7 @@ def get_current_user(
 
 
 def require_role(allowed_roles: list[RoleEnum]):
-    """Dependency factory for role-based access control"""
+    """Dependency factory for role-based access control (no database hit on a user cache hit)"""
     def role_checker(current_user: User = Depends(get_current_user)) -> User:
         if current_user.role not in allowed_roles:
             raise HTTPException(
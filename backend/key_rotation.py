@@ -0,0 +1,195 @@
+"""
+Online master key rotation.
+
+Rotating ENCRYPTION_KEY:
+1. Move the current key into RETIRED_ENCRYPTION_KEYS as "<old id>:<old key>", set
+   ENCRYPTION_KEY to the new key and bump ENCRYPTION_KEY_ID, then restart the service.
+   New writes use the new key; everything already stored stays readable because
+   ciphertexts name the key that produced them.
+2. Run the re-encryption job. It walks each target in primary-key (keyset) order in
+   small batches, rewrites only values not yet under the active key, commits after
+   every batch and sleeps between batches, so the service keeps serving reads and
+   writes throughout. Progress is recorded in key_rotation_progress; an interrupted
+   run resumes from its last committed batch.
+3. Once status reports every target complete, drop the retired key.
+
+Targets:
+- vault_items: data keys are re-wrapped under the new key. Records encrypted with
+  a data key do not change, since the data key itself is unchanged.
+- vault_records: legacy Fernet payloads are moved into their vault's GCM envelope.
+- users: TOTP secrets are re-encrypted under the new key.
+
+CLI:
+    python key_rotation.py run [--batch-size N] [--delay SECONDS]
+    python key_rotation.py status
+"""
+from sqlalchemy.orm import Session
+from models import User, VaultItem, VaultRecord, KeyRotationProgress
+from security import (
+    FERNET_VERSION, active_key, data_key_id, wrapped_key_id, rewrap_data_key,
+    generate_wrapped_data_key, decrypt_bytes, encrypt_record, encrypt_data, decrypt_data
+)
+from config import get_settings
+from datetime import datetime
+from typing import List, Optional
+import logging
+import time
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+def _ensure_data_key(db: Session, vault_item: VaultItem) -> bytes:
+    if vault_item.wrapped_data_key is None:
+        db.refresh(vault_item, with_for_update=True)
+        if vault_item.wrapped_data_key is None:
+            vault_item.wrapped_data_key = generate_wrapped_data_key(vault_item.id)
+    return vault_item.wrapped_data_key
+
+
+def _rotate_vault_item(db: Session, vault_item: VaultItem) -> bool:
+    if vault_item.wrapped_data_key is None:
+        vault_item.wrapped_data_key = generate_wrapped_data_key(vault_item.id)
+        return True
+    if wrapped_key_id(vault_item.wrapped_data_key) == active_key.key_id:
+        return False
+    vault_item.wrapped_data_key = rewrap_data_key(vault_item.id, vault_item.wrapped_data_key)
+    return True
+
+
+def _rotate_vault_record(db: Session, record: VaultRecord) -> bool:
+    if record.encrypted_payload[0] != FERNET_VERSION:
+        return False
+    wrapped_key = _ensure_data_key(db, record.vault_item)
+    record.encrypted_payload = encrypt_record(decrypt_bytes(record.encrypted_payload), record.vault_item_id, wrapped_key)
+    return True
+
+
+def _rotate_user(db: Session, user: User) -> bool:
+    if data_key_id(user.totp_secret) == active_key.key_id:
+        return False
+    user.totp_secret = encrypt_data(decrypt_data(user.totp_secret))
+    return True
+
+
+# Processed in this order so vault items have current data keys before their records are converted
+ROTATION_TARGETS = {
+    "vault_items": (VaultItem, _rotate_vault_item),
+    "vault_records": (VaultRecord, _rotate_vault_record),
+    "users": (User, _rotate_user)
+}
+
+
+def _lock_progress(db: Session, target: str) -> KeyRotationProgress:
+    """
+    Lock the target's progress row for this batch, starting a new pass if the active key changed.
+    The lock also keeps two concurrent runs from processing the same batch.
+    """
+    progress = db.get(KeyRotationProgress, target, with_for_update=True)
+    if progress is None:
+        progress = KeyRotationProgress(target=target)
+        db.add(progress)
+    if progress.key_id != active_key.key_id:
+        now = datetime.utcnow()
+        progress.key_id = active_key.key_id
+        progress.last_id = None
+        progress.rows_scanned = 0
+        progress.rows_rewritten = 0
+        progress.started_at = now
+        progress.updated_at = now
+        progress.completed_at = None
+    return progress
+
+
+def _progress_dict(progress: KeyRotationProgress) -> dict:
+    return {
+        "target": progress.target,
+        "key_id": progress.key_id,
+        "rows_scanned": progress.rows_scanned,
+        "rows_rewritten": progress.rows_rewritten,
+        "started_at": progress.started_at,
+        "updated_at": progress.updated_at,
+        "completed_at": progress.completed_at
+    }
+
+
+def rotate_target(db: Session, target: str, batch_size: int, delay: float) -> dict:
+    """Re-encrypt one target batch by batch until it is fully under the active key"""
+    model, rotate_row = ROTATION_TARGETS[target]
+    while True:
+        progress = _lock_progress(db, target)
+        if progress.completed_at is None:
+            query = db.query(model)
+            if progress.last_id is not None:
+                query = query.filter(model.id > progress.last_id)
+            batch = query.order_by(model.id).limit(batch_size).with_for_update(of=model).all()
+
+            rewritten = 0
+            for row in batch:
+                if rotate_row(db, row):
+                    rewritten += 1
+            progress.rows_scanned += len(batch)
+            progress.rows_rewritten += rewritten
+            progress.updated_at = datetime.utcnow()
+            if len(batch) < batch_size:
+                progress.completed_at = progress.updated_at
+            else:
+                progress.last_id = batch[-1].id
+
+        result = _progress_dict(progress)
+        db.commit()
+        if result["completed_at"] is not None:
+            return result
+        logger.info("Key rotation %s: %d scanned, %d rewritten", target, result["rows_scanned"], result["rows_rewritten"])
+        time.sleep(delay)
+
+
+def run_key_rotation(db: Session, batch_size: Optional[int] = None, delay: Optional[float] = None) -> List[dict]:
+    """Bring every target under the active key, resuming any pass already in progress"""
+    if batch_size is None:
+        batch_size = settings.KEY_ROTATION_BATCH_SIZE
+    if delay is None:
+        delay = settings.KEY_ROTATION_BATCH_DELAY_SECONDS
+    return [rotate_target(db, target, batch_size, delay) for target in ROTATION_TARGETS]
+
+
+def key_rotation_status(db: Session) -> List[dict]:
+    """Progress per target; a target is current only if its pass ran for the active key id"""
+    rows = {progress.target: progress for progress in db.query(KeyRotationProgress).all()}
+    status = []
+    for target in ROTATION_TARGETS:
+        progress = rows.get(target)
+        if progress is None or progress.key_id != active_key.key_id:
+            status.append({"target": target, "key_id": active_key.key_id, "completed_at": None})
+        else:
+            status.append(_progress_dict(progress))
+    return status
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import sys
+    from database import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Master key rotation")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    run_parser = subcommands.add_parser("run", help="Re-encrypt stored data under the active key (resumable)")
+    run_parser.add_argument("--batch-size", type=int, default=None, help="Rows per batch")
+    run_parser.add_argument("--delay", type=float, default=None, help="Seconds to sleep between batches")
+    subcommands.add_parser("status", help="Show re-encryption progress")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.command == "run":
+            outcome = run_key_rotation(db, batch_size=args.batch_size, delay=args.delay)
+        else:
+            outcome = key_rotation_status(db)
+    finally:
+        db.close()
+
+    print(json.dumps(outcome, indent=2, default=str))
+    sys.exit(0 if all(target["completed_at"] is not None for target in outcome) else 1)
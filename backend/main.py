@@ -1,27 +1,55 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, status, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from database import get_db
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import insert
+from sqlalchemy.orm import Session, joinedload
+from database import get_db, SessionLocal, engine
 from models import User, VaultItem, VaultRecord, AccessRequest, PrivilegeSession, AuditLog, RoleEnum, RequestStatusEnum, AccessTypeEnum
 from schemas import *
 from security import (
-    hash_password, verify_password, create_access_token,
-    decrypt_data, decrypt_totp_secret, verify_totp, generate_totp_uri
+    hash_password, verify_password, password_needs_rehash, submit_password_task, PasswordHashingBusy, create_access_token,
+    encrypt_record, encrypt_record_batch, decrypt_totp_secret, generate_totp_uri
+)
+from dependencies import get_current_user, get_current_user_record, require_employee, require_admin, require_auditor
+from audit_writer import audit_writer
+from user_cache import start_user_cache, stop_user_cache
+from totp_verifier import verify_user_totp
+from rate_limit import RateLimitMiddleware
+from qr_codes import qr_code_cache, QR_CODE_FORMATS, QR_CODE_MEDIA_TYPES
+from audit_chain import verify_audit_chain
+from audit_partitions import ensure_audit_partitions, list_audit_partitions, start_audit_partition_maintenance, stop_audit_partition_maintenance
+from audit_archive import iter_archived_audit_logs, count_archived_audit_logs, DICTIONARY_COLUMNS as ARCHIVE_DICTIONARY_COLUMNS
+from audit_rollups import query_audit_rollups, ROLLUP_GRANULARITIES, ROLLUP_DIMENSIONS
+from audit_stream import broadcaster, start_audit_stream, stop_audit_stream, LAGGED
+from record_cache import record_cache
+from blind_index import record_blind_indexes, filter_by_blind_indexes
+from vault_summary import record_vault_summary, read_vault_summary
+from vault import (
+    get_vault_data_key, record_document, decrypt_vault_records, vault_records_query, paginate_vault_records,
+    encode_record_cursor, stream_vault_records
+)
+from audit import (
+    create_audit_log, filter_audit_logs, paginate_audit_logs, encode_audit_cursor, decode_audit_cursor,
+    naive_utc, metadata_filters, resolve_archived_audit_entries, audit_export_query, stream_audit_export, AUDIT_EXPORT_FORMATS
 )
-from dependencies import get_current_user, require_employee, require_admin, require_auditor
-from audit import create_audit_log
 from datetime import datetime, timedelta
 from config import get_settings
+import asyncio
 import json
-import qrcode
-import io
 import base64
-from typing import List
+from itertools import islice
+from typing import List, Optional
+import uuid
+from uuid import UUID
 
 app = FastAPI(title="ENTITLED - Secure Financial Vault")
 
 settings = get_settings()
 
+# Added before CORS so that 429 responses still carry the CORS headers
+app.add_middleware(RateLimitMiddleware)
+
 # CORS configuration
 app.add_middleware(
     CORSMiddleware,
@@ -36,6 +64,42 @@ app.add_middleware(
 )
 
 
+@app.on_event("startup")
+def start_audit_writer():
+    # Upcoming monthly partitions must exist before any audit row can be inserted
+    with engine.begin() as conn:
+        ensure_audit_partitions(conn)
+    # ... and keep existing as the months go by
+    start_audit_partition_maintenance()
+    # Replays any journaled audit entries left by a previous run before serving
+    audit_writer.start()
+
+
+@app.on_event("shutdown")
+def stop_audit_writer():
+    audit_writer.stop()
+    stop_audit_partition_maintenance()
+
+
+@app.on_event("startup")
+def start_user_identity_cache():
+    start_user_cache()
+
+
+@app.on_event("shutdown")
+def stop_user_identity_cache():
+    stop_user_cache()
+
+
+@app.on_event("startup")
+async def start_audit_tail():
+    start_audit_stream(asyncio.get_running_loop())
+
+
+@app.on_event("shutdown")
+def stop_audit_tail():
+    stop_audit_stream()
+
 
 @app.get("/")
 def root():
@@ -45,16 +109,46 @@ def root():
 # ==================== AUTH ENDPOINTS ====================
 
 @app.post("/api/auth/login", response_model=TokenResponse)
-def login(request: LoginRequest, db: Session = Depends(get_db)):
-    """Authenticate user and return JWT token"""
-    user = db.query(User).filter(User.username == request.username).first()
+async def login(request: LoginRequest, db: Session = Depends(get_db)):
+    """
+    Authenticate user and return JWT token.
+    Argon2 runs on its own bounded pool (see security.submit_password_task); the
+    database work runs in the regular threadpool, which is not held while hashing.
+    """
+    user = await run_in_threadpool(lambda: db.query(User).filter(User.username == request.username).first())
     
-    if not user or not verify_password(request.password, user.password_hash):
+    try:
+        verified = user is not None and await asyncio.wrap_future(
+            submit_password_task(verify_password, request.password, user.password_hash)
+        )
+    except PasswordHashingBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many logins in progress, please retry",
+            headers={"Retry-After": str(settings.PASSWORD_HASH_RETRY_AFTER_SECONDS)}
+        )
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid username or password"
         )
     
+    # Bring the stored hash up to the configured Argon2 parameters. If the pool is full
+    # the login still succeeds and the rehash waits for the next one.
+    new_password_hash = None
+    if password_needs_rehash(user.password_hash):
+        try:
+            new_password_hash = await asyncio.wrap_future(submit_password_task(hash_password, request.password))
+        except PasswordHashingBusy:
+            pass
+    
+    return await run_in_threadpool(complete_login, db, user, new_password_hash)
+
+
+def complete_login(db: Session, user: User, new_password_hash: Optional[str]) -> TokenResponse:
+    if new_password_hash is not None:
+        user.password_hash = new_password_hash
+    
     # Create JWT token
     access_token = create_access_token(
         data={"user_id": str(user.id), "role": user.role.value}
@@ -81,28 +175,40 @@ def get_me(current_user: User = Depends(get_current_user)):
 
 
 @app.get("/api/auth/qr-code", response_model=QRCodeResponse)
-def get_qr_code(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    """Get QR code for MFA setup (Microsoft Authenticator compatible)"""
+def get_qr_code(
+    response: Response,
+    format: str = "json",
+    current_user: User = Depends(get_current_user_record),
+    db: Session = Depends(get_db)
+):
+    """
+    Get QR code for MFA setup (Microsoft Authenticator compatible).
+    format=json returns the PNG as base64 with the secret; png and svg return the image itself.
+    """
+    if format not in QR_CODE_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid format. Must be one of {list(QR_CODE_FORMATS)}"
+        )
+    
     # Decrypt TOTP secret
     totp_secret = decrypt_totp_secret(current_user.totp_secret)
     
     # Generate provisioning URI
     uri = generate_totp_uri(totp_secret, current_user.username)
     
-    # Generate QR code
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(uri)
-    qr.make(fit=True)
-    
-    img = qr.make_image(fill_color="black", back_color="white")
-    
-    # Convert to base64
-    buffer = io.BytesIO()
-    img.save(buffer, format="PNG")
-    img_str = base64.b64encode(buffer.getvalue()).decode()
+    # Rendered once per user and secret; every format carries the secret, so none may be cached
+    image = qr_code_cache.get(current_user.id, uri, "png" if format == "json" else format)
+    if format != "json":
+        return Response(
+            content=image,
+            media_type=QR_CODE_MEDIA_TYPES[format],
+            headers={"Cache-Control": "no-store"}
+        )
     
+    response.headers["Cache-Control"] = "no-store"
     return QRCodeResponse(
-        qr_code_base64=img_str,
+        qr_code_base64=base64.b64encode(image).decode(),
         secret=totp_secret
     )
 
@@ -128,7 +234,7 @@ def list_vault_items(
 @app.post("/api/vault/access", response_model=VaultItemWithRecords)
 def access_vault_item(
     request: PrivilegeSessionCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: User = Depends(get_current_user_record),
     db: Session = Depends(get_db)
 ):
     """
@@ -142,9 +248,8 @@ def access_vault_item(
             detail="Auditors cannot access vault data"
         )
     
-    # Verify TOTP
-    totp_secret = decrypt_totp_secret(current_user.totp_secret)
-    if not verify_totp(totp_secret, request.totp_token):
+    # Verify TOTP; each code is accepted once
+    if not verify_user_totp(current_user, request.totp_token):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid MFA token"
@@ -184,6 +289,7 @@ def access_vault_item(
     expires_at = now + timedelta(minutes=settings.PRIVILEGE_SESSION_DURATION_MINUTES)
     
     privilege_session = PrivilegeSession(
+        id=uuid.uuid4(),  # Assigned up front so the audit metadata can reference it
         user_id=current_user.id,
         vault_item_id=request.vault_item_id,
         access_type=session_access_type,  # NEW: Store access type in session
@@ -205,20 +311,11 @@ def access_vault_item(
     db.commit()
     
     # Retrieve and decrypt vault records
-    records = db.query(VaultRecord).filter(VaultRecord.vault_item_id == request.vault_item_id).all()
-    
-    decrypted_records = []
-    for record in records:
-        decrypted_json = decrypt_data(record.encrypted_payload)
-        data = json.loads(decrypted_json)
-        decrypted_records.append(VaultRecordDecrypted(
-            id=record.id,
-            **data
-        ))
+    records = vault_records_query(db, vault_item.id).all()
     
     return VaultItemWithRecords(
         vault_item=vault_item,
-        records=decrypted_records,
+        records=decrypt_vault_records(vault_item, records, privilege_session),
         session_id=privilege_session.id
     )
 
@@ -291,19 +388,134 @@ def end_privilege_session(
     )
     
     db.commit()
+    record_cache.invalidate(session.user_id, session.vault_item_id)
     return {"message": "Privilege session ended"}
 
 
-# NEW: Write access endpoint for adding vault records
-@app.post("/api/vault/{vault_item_id}/records")
-def create_vault_record(
-    vault_item_id: str,
-    record_data: VaultRecordCreate,
+def get_active_privilege_session(db: Session, session_id: UUID, current_user: User) -> PrivilegeSession:
+    """Load one of the current user's privilege sessions, requiring it to be active and unexpired"""
+    session = db.query(PrivilegeSession).options(
+        joinedload(PrivilegeSession.vault_item)
+    ).filter(
+        PrivilegeSession.id == session_id,
+        PrivilegeSession.user_id == current_user.id
+    ).first()
+    
+    if not session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Privilege session not found"
+        )
+    
+    if not session.is_active or session.expires_at <= datetime.utcnow():
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Privilege session expired. Please verify MFA again."
+        )
+    
+    return session
+
+
+@app.get("/api/vault/sessions/{session_id}/records", response_model=List[VaultRecordDecrypted])
+def get_session_records(
+    session_id: UUID,
+    response: Response,
+    instrument_type: Optional[str] = None,
+    investment_name: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
-    Add a new record to an existing vault item (WRITE access).
+    Page through the records of the vault item a privilege session was opened for.
+    MFA was verified when the session was created, so no token is needed here.
+    Only the returned page is decrypted. Pass the X-Next-Cursor response header back
+    as `cursor` to fetch the next page; the header is absent on the last page.
+    instrument_type and investment_name match exactly (ignoring case) through blind
+    indexes, so only matching records are read and decrypted.
+    """
+    session = get_active_privilege_session(db, session_id, current_user)
+    query = filter_by_blind_indexes(
+        vault_records_query(db, session.vault_item_id),
+        session.vault_item,
+        instrument_type=instrument_type,
+        investment_name=investment_name
+    )
+    
+    try:
+        records = paginate_vault_records(query, cursor, limit).all()
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    if len(records) == limit:
+        response.headers["X-Next-Cursor"] = encode_record_cursor(records[-1].created_at, records[-1].id)
+    
+    return decrypt_vault_records(session.vault_item, records, session)
+
+
+@app.get("/api/vault/sessions/{session_id}/summary", response_model=VaultSummaryResponse)
+def get_session_summary(
+    session_id: UUID,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Record count and total invested, overall and per instrument type, for the session's
+    vault item. Served from the vault's encrypted summary row: one decryption, not one per record.
+    """
+    session = get_active_privilege_session(db, session_id, current_user)
+    summary = read_vault_summary(db, session.vault_item)
+    db.commit()
+    
+    return VaultSummaryResponse(
+        vault_item_id=session.vault_item_id,
+        record_count=summary["record_count"],
+        total_invested=float(summary["total_invested"]),
+        by_instrument_type=[
+            InstrumentTypeSummary(
+                instrument_type=instrument_type,
+                record_count=bucket["record_count"],
+                total_invested=float(bucket["total_invested"])
+            )
+            for instrument_type, bucket in sorted(summary["by_instrument_type"].items())
+        ]
+    )
+
+
+@app.get("/api/vault/sessions/{session_id}/records/stream")
+def stream_session_records(
+    session_id: UUID,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Stream every record of the session's vault item as NDJSON, decrypting one chunk at a time.
+    The stream ends early if the privilege session expires while it is being read.
+    """
+    session = get_active_privilege_session(db, session_id, current_user)
+    vault_item = session.vault_item
+    db.expunge(vault_item)
+    db.expunge(session)
+    
+    # The request-scoped session is closed before the body is streamed,
+    # so the stream owns a dedicated session for its lifetime
+    def generate():
+        stream_db = SessionLocal()
+        try:
+            yield from stream_vault_records(stream_db, vault_item, session, settings.VAULT_RECORD_CHUNK_SIZE)
+        finally:
+            stream_db.close()
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+def get_write_session(db: Session, vault_item_id: str, current_user: User):
+    """
+    Check that the current user may write to a vault item and return (vault_item, active_session).
     
     Security checks:
     - User must be employee OR admin
@@ -351,24 +563,26 @@ def create_vault_record(
                 detail="Your access request was approved for READ only. Request WRITE access to add records."
             )
     
-    # 5. Validate and prepare data
+    return vault_item, active_session
+
+
+# NEW: Write access endpoint for adding vault records
+@app.post("/api/vault/{vault_item_id}/records")
+def create_vault_record(
+    vault_item_id: str,
+    record_data: VaultRecordCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Add a new record to an existing vault item (WRITE access, see get_write_session)"""
+    vault_item, active_session = get_write_session(db, vault_item_id, current_user)
+    
+    # 5. Validate, serialize and encrypt with the vault item's AES-256-GCM data key
     try:
-        # Convert Pydantic model to dict
-        record_dict = {
-            "investment_name": record_data.investment_name,
-            "invested_amount": record_data.invested_amount,
-            "investment_date": record_data.investment_date,
-            "instrument_type": record_data.instrument_type,
-            "remarks": record_data.remarks
-        }
-        
-        # Convert to JSON string
-        json_payload = json.dumps(record_dict)
-        
-        # Encrypt the payload using existing AES-256-GCM encryption
-        from security import encrypt_data
-        encrypted_payload = encrypt_data(json_payload)
-        
+        document = record_document(record_data)
+        wrapped_key = get_vault_data_key(db, vault_item)
+        encrypted_payload = encrypt_record(json.dumps(document).encode(), vault_item.id, wrapped_key)
+        blind_indexes = record_blind_indexes(document, vault_item.id, wrapped_key)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -377,10 +591,13 @@ def create_vault_record(
     
     # 6. Create new vault record
     new_record = VaultRecord(
+        id=uuid.uuid4(),  # Assigned up front so the audit metadata can reference it
         vault_item_id=vault_item_id,
-        encrypted_payload=encrypted_payload
+        encrypted_payload=encrypted_payload,
+        **blind_indexes
     )
     db.add(new_record)
+    record_vault_summary(db, vault_item, [document])
     
     # 7. Create audit log for write operation
     create_audit_log(
@@ -397,6 +614,7 @@ def create_vault_record(
     )
     
     db.commit()
+    record_cache.invalidate_vault_item(vault_item.id)
     
     return {
         "message": "Record added successfully",
@@ -405,6 +623,80 @@ def create_vault_record(
     }
 
 
+@app.post("/api/vault/{vault_item_id}/records/bulk")
+def create_vault_records_bulk(
+    vault_item_id: str,
+    bulk_data: VaultRecordBulkCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Add many records to a vault item in one call (WRITE access, see get_write_session).
+    The session is checked once, the records are encrypted as a batch and inserted with
+    a single bulk statement, and one audit entry lists every new record id.
+    Either every record is added or none is.
+    """
+    if len(bulk_data.records) > settings.VAULT_BULK_WRITE_MAX_RECORDS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.VAULT_BULK_WRITE_MAX_RECORDS} records per bulk write"
+        )
+    
+    vault_item, active_session = get_write_session(db, vault_item_id, current_user)
+    
+    try:
+        documents = [record_document(record_data) for record_data in bulk_data.records]
+        wrapped_key = get_vault_data_key(db, vault_item)
+        encrypted_payloads = encrypt_record_batch(
+            [json.dumps(document).encode() for document in documents],
+            vault_item.id,
+            wrapped_key
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Data validation or encryption failed: {str(e)}"
+        )
+    
+    # Consecutive created_at values keep the submitted order in keyset pagination
+    now = datetime.utcnow()
+    rows = [
+        {
+            "id": uuid.uuid4(),
+            "vault_item_id": vault_item.id,
+            "encrypted_payload": encrypted_payload,
+            "created_at": now + timedelta(microseconds=i),
+            **record_blind_indexes(document, vault_item.id, wrapped_key)
+        }
+        for i, (document, encrypted_payload) in enumerate(zip(documents, encrypted_payloads))
+    ]
+    db.execute(insert(VaultRecord), rows)
+    record_vault_summary(db, vault_item, documents)
+    
+    record_ids = [str(row["id"]) for row in rows]
+    create_audit_log(
+        db,
+        current_user,
+        "WRITE_RECORDS_BULK",
+        vault_item_id=vault_item.id,
+        metadata={
+            "record_ids": record_ids,
+            "record_count": len(record_ids),
+            "session_id": str(active_session.id),
+            "instrument_types": sorted({record_data.instrument_type for record_data in bulk_data.records})  # Non-sensitive metadata
+        }
+    )
+    
+    db.commit()
+    record_cache.invalidate_vault_item(vault_item.id)
+    
+    return {
+        "message": f"{len(record_ids)} records added successfully",
+        "record_ids": record_ids,
+        "vault_item_id": str(vault_item_id)
+    }
+
+
 
 # ==================== ACCESS REQUEST ENDPOINTS ====================
 
@@ -433,6 +725,7 @@ def create_access_request(
     
     # Create request
     access_request = AccessRequest(
+        id=uuid.uuid4(),  # Assigned up front so the audit metadata can reference it
         employee_id=current_user.id,
         admin_id=request.admin_id,
         vault_item_id=request.vault_item_id,
@@ -463,7 +756,11 @@ def get_my_requests(
     db: Session = Depends(get_db)
 ):
     """Get all access requests created by the current employee"""
-    requests = db.query(AccessRequest).filter(
+    requests = db.query(AccessRequest).options(
+        joinedload(AccessRequest.employee),
+        joinedload(AccessRequest.admin),
+        joinedload(AccessRequest.vault_item)
+    ).filter(
         AccessRequest.employee_id == current_user.id
     ).all()
     
@@ -493,7 +790,11 @@ def get_pending_requests(
     db: Session = Depends(get_db)
 ):
     """Get all pending access requests assigned to the current admin"""
-    requests = db.query(AccessRequest).filter(
+    requests = db.query(AccessRequest).options(
+        joinedload(AccessRequest.employee),
+        joinedload(AccessRequest.admin),
+        joinedload(AccessRequest.vault_item)
+    ).filter(
         AccessRequest.admin_id == current_user.id,
         AccessRequest.status == RequestStatusEnum.PENDING
     ).all()
@@ -596,11 +897,57 @@ def list_admins(
 
 @app.get("/api/audit/logs", response_model=List[AuditLogResponse])
 def get_audit_logs(
+    response: Response,
+    action: Optional[str] = None,
+    actor_id: Optional[UUID] = None,
+    vault_item_id: Optional[UUID] = None,
+    target_user_id: Optional[UUID] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    session_id: Optional[UUID] = None,
+    request_id: Optional[UUID] = None,
+    record_id: Optional[UUID] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
     current_user: User = Depends(require_auditor),
     db: Session = Depends(get_db)
 ):
-    """Get all audit logs (auditor only)"""
-    logs = db.query(AuditLog).order_by(AuditLog.timestamp.desc()).all()
+    """
+    Get audit logs newest-first, one page at a time (auditor only).
+    Pass the X-Next-Cursor response header back as `cursor` to fetch the next page;
+    the header is absent on the last page.
+    """
+    since, until = naive_utc(since), naive_utc(until)
+    filters = {
+        "action": action,
+        "actor_id": actor_id,
+        "vault_item_id": vault_item_id,
+        "target_user_id": target_user_id,
+        "since": since,
+        "until": until
+    }
+    metadata_filter = metadata_filters(session_id=session_id, request_id=request_id, record_id=record_id)
+    
+    # Eager-load the many-to-one relationships so a page costs one query, not 1 + 3N
+    query = filter_audit_logs(
+        db.query(AuditLog).options(
+            joinedload(AuditLog.actor),
+            joinedload(AuditLog.vault_item),
+            joinedload(AuditLog.target_user)
+        ),
+        session_id=session_id,
+        request_id=request_id,
+        record_id=record_id,
+        **filters
+    )
+    try:
+        logs = paginate_audit_logs(query, cursor, limit).all()
+        before = decode_audit_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     
     result = []
     for log in logs:
@@ -614,13 +961,273 @@ def get_audit_logs(
             target_user_id=log.target_user_id,
             target_username=log.target_user.username if log.target_user else None,
             timestamp=log.timestamp,
-            metadata=log.log_metadata
+            metadata=json.dumps(log.log_metadata) if log.log_metadata is not None else None
 
         ))
     
+    # Archived months are older than every live row, so once the live rows run out
+    # the page continues newest-first into the archive from the same keyset position
+    if len(result) < limit:
+        if logs:
+            before = (logs[-1].timestamp, logs[-1].id)
+        archived = list(islice(
+            iter_archived_audit_logs(filters, metadata_filter, descending=True, before=before),
+            limit - len(result)
+        ))
+        result.extend(AuditLogResponse(**entry) for entry in resolve_archived_audit_entries(db, archived))
+    
+    if len(result) == limit:
+        response.headers["X-Next-Cursor"] = encode_audit_cursor(result[-1].timestamp, result[-1].id)
+    
     return result
 
 
+@app.get("/api/audit/export")
+def export_audit_logs(
+    format: str = "ndjson",
+    action: Optional[str] = None,
+    actor_id: Optional[UUID] = None,
+    vault_item_id: Optional[UUID] = None,
+    target_user_id: Optional[UUID] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    session_id: Optional[UUID] = None,
+    request_id: Optional[UUID] = None,
+    record_id: Optional[UUID] = None,
+    current_user: User = Depends(require_auditor),
+    db: Session = Depends(get_db)
+):
+    """
+    Stream the (optionally filtered) audit trail as NDJSON or CSV (auditor only),
+    archived months included. Rows are read through a server-side cursor and written as they arrive,
+    so memory use does not depend on the size of the export.
+    """
+    since, until = naive_utc(since), naive_utc(until)
+    if format not in AUDIT_EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid format. Must be one of {list(AUDIT_EXPORT_FORMATS)}"
+        )
+    
+    filters = {
+        "action": action,
+        "actor_id": actor_id,
+        "vault_item_id": vault_item_id,
+        "target_user_id": target_user_id,
+        "since": since,
+        "until": until,
+        "session_id": session_id,
+        "request_id": request_id,
+        "record_id": record_id
+    }
+    
+    # Audit log
+    create_audit_log(
+        db,
+        current_user,
+        "AUDIT_EXPORT",
+        metadata={"format": format, **{k: str(v) for k, v in filters.items() if v is not None}}
+    )
+    db.commit()
+    
+    # The request-scoped session is closed before the body is streamed,
+    # so the export owns a dedicated session for the lifetime of the stream
+    # Archived months come first; a month still in the live table (mid-archive) is read from there only
+    def generate():
+        export_db = SessionLocal()
+        try:
+            archived = iter_archived_audit_logs(
+                {key: filters[key] for key in ("action", "actor_id", "vault_item_id", "target_user_id", "since", "until")},
+                metadata_filters(session_id=session_id, request_id=request_id, record_id=record_id),
+                exclude_months=set(list_audit_partitions(export_db.connection()))
+            )
+            query = filter_audit_logs(audit_export_query(export_db), **filters)
+            yield from stream_audit_export(query, format, settings.AUDIT_EXPORT_CHUNK_SIZE, archived=archived)
+        finally:
+            export_db.close()
+    
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/csv"
+    filename = f"audit_logs_{datetime.utcnow():%Y%m%dT%H%M%S}.{format}"
+    return StreamingResponse(
+        generate(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@app.get("/api/audit/stream")
+async def stream_audit_logs(
+    request: Request,
+    current_user: User = Depends(require_auditor)
+):
+    """
+    Live tail of committed audit entries as Server-Sent Events (auditor only).
+    A client that falls too far behind receives a `lagged` event and should
+    reload from /api/audit/logs before reconnecting.
+    """
+    subscription = broadcaster.subscribe()
+    
+    async def generate():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    entry = await asyncio.wait_for(
+                        subscription.queue.get(),
+                        timeout=settings.AUDIT_STREAM_KEEPALIVE_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if entry is LAGGED:
+                    yield "event: lagged\ndata: {}\n\n"
+                    return
+                yield f"id: {entry['id']}\nevent: audit\ndata: {json.dumps(entry)}\n\n"
+        finally:
+            broadcaster.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/api/audit/archive")
+def get_archived_audit_logs(
+    action: Optional[str] = None,
+    actor_id: Optional[UUID] = None,
+    vault_item_id: Optional[UUID] = None,
+    target_user_id: Optional[UUID] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    session_id: Optional[UUID] = None,
+    request_id: Optional[UUID] = None,
+    record_id: Optional[UUID] = None,
+    current_user: User = Depends(require_auditor)
+):
+    """
+    Stream archived audit months as NDJSON, oldest first (auditor only).
+    Read-only: only archive files overlapping [since, until) are opened.
+    """
+    since, until = naive_utc(since), naive_utc(until)
+    filters = {
+        "action": action,
+        "actor_id": actor_id,
+        "vault_item_id": vault_item_id,
+        "target_user_id": target_user_id,
+        "since": since,
+        "until": until
+    }
+    metadata_filter = metadata_filters(session_id=session_id, request_id=request_id, record_id=record_id)
+    
+    def generate():
+        for entry in iter_archived_audit_logs(filters, metadata_filter):
+            yield json.dumps(entry) + "\n"
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+@app.get("/api/audit/archive/counts")
+def count_archived_logs(
+    group_by: List[str] = Query(["action"]),
+    action: Optional[str] = None,
+    actor_id: Optional[UUID] = None,
+    vault_item_id: Optional[UUID] = None,
+    target_user_id: Optional[UUID] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    current_user: User = Depends(require_auditor)
+):
+    """Count archived audit entries grouped by action, actor_id, vault_item_id and/or target_user_id (auditor only)"""
+    since, until = naive_utc(since), naive_utc(until)
+    invalid = [column for column in group_by if column not in ARCHIVE_DICTIONARY_COLUMNS]
+    if invalid:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid group_by {invalid}. Must be among {list(ARCHIVE_DICTIONARY_COLUMNS)}"
+        )
+    group_by = list(dict.fromkeys(group_by))
+    
+    counts = count_archived_audit_logs({
+        "action": action,
+        "actor_id": actor_id,
+        "vault_item_id": vault_item_id,
+        "target_user_id": target_user_id,
+        "since": since,
+        "until": until
+    }, group_by)
+    return [
+        {**dict(zip(group_by, key)), "count": count}
+        for key, count in counts.most_common()
+    ]
+
+
+@app.get("/api/audit/analytics", response_model=List[AuditRollupBucket])
+def get_audit_analytics(
+    granularity: str = "day",
+    group_by: List[str] = Query(["action"]),
+    action: Optional[str] = None,
+    actor_id: Optional[UUID] = None,
+    vault_item_id: Optional[UUID] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    current_user: User = Depends(require_auditor),
+    db: Session = Depends(get_db)
+):
+    """
+    Audit event counts per hour or day, grouped by any of action, actor_id and vault_item_id
+    (auditor only). Answered from the audit_rollups table, not by scanning audit_logs.
+    """
+    since, until = naive_utc(since), naive_utc(until)
+    if granularity not in ROLLUP_GRANULARITIES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid granularity. Must be one of {list(ROLLUP_GRANULARITIES)}"
+        )
+    invalid = [dimension for dimension in group_by if dimension not in ROLLUP_DIMENSIONS]
+    if invalid:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid group_by {invalid}. Must be among {list(ROLLUP_DIMENSIONS)}"
+        )
+    
+    buckets = query_audit_rollups(
+        db,
+        granularity,
+        list(dict.fromkeys(group_by)),
+        action=action,
+        actor_id=actor_id,
+        vault_item_id=vault_item_id,
+        since=since,
+        until=until
+    )
+    return [AuditRollupBucket(**bucket) for bucket in buckets]
+
+
+@app.post("/api/audit/verify", response_model=AuditChainVerifyResponse)
+def verify_audit_log_chain(
+    full: bool = False,
+    current_user: User = Depends(require_auditor),
+    db: Session = Depends(get_db)
+):
+    """
+    Verify the audit hash chain (auditor only).
+    Checks rows added since the last signed checkpoint, or the whole chain with full=true.
+    """
+    result = verify_audit_chain(db, full=full)
+    
+    # Audit log
+    create_audit_log(
+        db,
+        current_user,
+        "AUDIT_CHAIN_VERIFIED" if result["ok"] else "AUDIT_CHAIN_VERIFICATION_FAILED",
+        metadata={k: v for k, v in result.items() if v is not None}
+    )
+    db.commit()
+    
+    return AuditChainVerifyResponse(**result)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, String, DateTime, Enum, ForeignKey, Boolean, Text
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, DateTime, Enum, ForeignKey, Boolean, Text, Index, BigInteger, Integer, LargeBinary, UniqueConstraint
+from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
 from database import Base
 import uuid
@@ -57,6 +57,8 @@ class VaultItem(Base):
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     title = Column(String, nullable=False)
+    # Per-vault AES-256-GCM data key, wrapped by the master key (see security.py)
+    wrapped_data_key = Column(LargeBinary, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -71,11 +73,43 @@ class VaultRecord(Base):
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     vault_item_id = Column(UUID(as_uuid=True), ForeignKey("vault_items.id"), nullable=False)
-    encrypted_payload = Column(Text, nullable=False)  # AES-256 encrypted JSON
-    created_at = Column(DateTime, default=datetime.utcnow)
+    encrypted_payload = Column(LargeBinary, nullable=False)  # AES-256-GCM envelope (or legacy binary Fernet token) of the JSON record
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # Blind indexes: keyed HMAC of the normalized field value (see blind_index.py)
+    instrument_type_index = Column(String(64), nullable=True)
+    investment_name_index = Column(String(64), nullable=True)
     
     # Relationships
     vault_item = relationship("VaultItem", back_populates="records")
+    
+    __table_args__ = (
+        # Keyset pagination of a vault item's records on (created_at, id), optionally by indexed field
+        Index("ix_vault_records_vault_item_created_id", "vault_item_id", "created_at", "id"),
+        Index("ix_vault_records_instrument_type_index", "vault_item_id", "instrument_type_index", "created_at", "id"),
+        Index("ix_vault_records_investment_name_index", "vault_item_id", "investment_name_index", "created_at", "id"),
+    )
+
+
+class VaultSummary(Base):
+    __tablename__ = "vault_summaries"
+    
+    vault_item_id = Column(UUID(as_uuid=True), ForeignKey("vault_items.id"), primary_key=True)
+    encrypted_summary = Column(LargeBinary, nullable=False)  # Aggregates JSON, encrypted with the vault's data key (see vault_summary.py)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class VaultImportCheckpoint(Base):
+    __tablename__ = "vault_import_checkpoints"
+    
+    # sha256 over (vault item id, file contents), so re-running the same file resumes it
+    import_id = Column(String(64), primary_key=True)
+    vault_item_id = Column(UUID(as_uuid=True), ForeignKey("vault_items.id"), nullable=False)
+    source = Column(String, nullable=False)  # File name, for operators
+    rows_imported = Column(BigInteger, nullable=False, default=0)  # Data rows committed, in file order
+    chunks_imported = Column(Integer, nullable=False, default=0)
+    started_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    completed_at = Column(DateTime, nullable=True)
 
 
 class AccessRequest(Base):
@@ -150,10 +184,74 @@ class AuditLog(Base):
     action = Column(String, nullable=False)
     vault_item_id = Column(UUID(as_uuid=True), ForeignKey("vault_items.id"), nullable=True)
     target_user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=True)
-    timestamp = Column(DateTime, default=datetime.utcnow, nullable=False)
-    log_metadata = Column(Text, nullable=True)  # JSON string
+    # Partition key, so it is part of the primary key (see audit_partitions.py)
+    timestamp = Column(DateTime, default=datetime.utcnow, nullable=False, primary_key=True)
+    log_metadata = Column(JSONB, nullable=True)
+    # Hash chain: position, digest of the previous row, digest of this row (see audit_chain.py)
+    seq = Column(BigInteger, nullable=False)
+    prev_hash = Column(String(64), nullable=False)
+    row_hash = Column(String(64), nullable=False)
     
     # Relationships
     actor = relationship("User", foreign_keys=[actor_id], back_populates="audit_logs_as_actor")
     target_user = relationship("User", foreign_keys=[target_user_id], back_populates="audit_logs_as_target")
     vault_item = relationship("VaultItem", back_populates="audit_logs")
+
+    # Composite indexes backing keyset pagination on (timestamp, id) and the auditor filters
+    __table_args__ = (
+        Index("ix_audit_logs_timestamp_id", "timestamp", "id"),
+        Index("ix_audit_logs_action_timestamp_id", "action", "timestamp", "id"),
+        Index("ix_audit_logs_actor_timestamp_id", "actor_id", "timestamp", "id"),
+        Index("ix_audit_logs_vault_item_timestamp_id", "vault_item_id", "timestamp", "id"),
+        Index("ix_audit_logs_target_user_timestamp_id", "target_user_id", "timestamp", "id"),
+        # Unique per partition; the audit chain lock keeps seq unique across them (see audit_chain.py)
+        UniqueConstraint("seq", "timestamp", name="uq_audit_logs_seq_timestamp"),
+        # Serves containment lookups such as log_metadata @> '{"session_id": "..."}'
+        Index("ix_audit_logs_log_metadata", "log_metadata", postgresql_using="gin", postgresql_ops={"log_metadata": "jsonb_path_ops"}),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
+
+
+class AuditCheckpoint(Base):
+    __tablename__ = "audit_checkpoints"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    seq = Column(BigInteger, nullable=False, index=True)  # Last verified audit_logs.seq
+    row_hash = Column(String(64), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    signature = Column(String(64), nullable=False)  # HMAC-SHA256 over (seq, row_hash, created_at)
+
+
+class AuditRollup(Base):
+    __tablename__ = "audit_rollups"
+    
+    # Key: bucket granularity ("hour" or "day"), bucket start, and the counted dimensions
+    granularity = Column(String, primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    action = Column(String, primary_key=True)
+    actor_id = Column(UUID(as_uuid=True), primary_key=True)
+    vault_item_id = Column(UUID(as_uuid=True), primary_key=True)  # Nil UUID when the entry has no vault item
+    count = Column(BigInteger, nullable=False, default=0)
+
+
+class KeyRotationProgress(Base):
+    __tablename__ = "key_rotation_progress"
+    
+    # One row per re-encryption target; restarted when the active key id changes
+    target = Column(String, primary_key=True)
+    key_id = Column(Integer, nullable=False)  # Active key id this pass rotates to
+    last_id = Column(UUID(as_uuid=True), nullable=True)  # Keyset cursor: last primary key processed
+    rows_scanned = Column(BigInteger, nullable=False, default=0)
+    rows_rewritten = Column(BigInteger, nullable=False, default=0)
+    started_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    completed_at = Column(DateTime, nullable=True)
+
+
+class UsedTotpCode(Base):
+    __tablename__ = "used_totp_codes"
+    
+    # One row per accepted (user, TOTP time step), so a code is accepted once; purged after expires_at
+    user_id = Column(UUID(as_uuid=True), primary_key=True)
+    time_step = Column(BigInteger, primary_key=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
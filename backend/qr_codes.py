@@ -0,0 +1,77 @@
+"""
+MFA enrolment QR codes, rendered once per user and secret.
+
+Rendered images are cached per user, keyed by a fingerprint of the provisioning
+URI (HMAC-SHA256 under SECRET_KEY, so the cache holds no hash of the bare
+secret). A new secret or username changes the fingerprint and the image is
+rendered again. At most QR_CODE_CACHE_MAX_ENTRIES users are kept (LRU). The
+images encode the TOTP secret, so they are only served with Cache-Control: no-store.
+
+qrcode and PIL are imported on first render, not at process startup.
+"""
+from config import get_settings
+from collections import OrderedDict
+from typing import Dict, Tuple
+from uuid import UUID
+import hashlib
+import hmac
+import io
+import threading
+
+settings = get_settings()
+
+# Formats served by /api/auth/qr-code; json embeds the PNG as base64 alongside the secret
+QR_CODE_FORMATS = ("json", "png", "svg")
+QR_CODE_MEDIA_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+
+def uri_fingerprint(uri: str) -> str:
+    return hmac.new(settings.SECRET_KEY.encode(), uri.encode(), hashlib.sha256).hexdigest()
+
+
+def render_qr_code(uri: str, image_format: str) -> bytes:
+    """Render a provisioning URI as PNG or SVG"""
+    import qrcode
+    import qrcode.image.svg
+
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(uri)
+    qr.make(fit=True)
+
+    buffer = io.BytesIO()
+    if image_format == "svg":
+        qr.make_image(image_factory=qrcode.image.svg.SvgPathImage).save(buffer)
+    else:
+        qr.make_image(fill_color="black", back_color="white").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class QRCodeCache:
+    """Thread-safe LRU of rendered images per user, valid while the URI fingerprint matches"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[UUID, Tuple[str, Dict[str, bytes]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: UUID, uri: str, image_format: str) -> bytes:
+        fingerprint = uri_fingerprint(uri)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] == fingerprint and image_format in entry[1]:
+                self._entries.move_to_end(user_id)
+                return entry[1][image_format]
+        # Rendered outside the lock; two concurrent misses just render twice
+        image = render_qr_code(uri, image_format)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] != fingerprint:
+                entry = self._entries[user_id] = (fingerprint, {})
+            entry[1][image_format] = image
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return image
+
+
+qr_code_cache = QRCodeCache(settings.QR_CODE_CACHE_MAX_ENTRIES)
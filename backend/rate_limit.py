@@ -0,0 +1,191 @@
+"""
+Sliding-window rate limiting for the endpoints that pay for Argon2 or TOTP checks.
+
+Each rule limits one endpoint by client IP and by the account targeted: the
+username in the body for login, the token's user id for vault access. Every key
+allows at most its limit per RATE_LIMIT_WINDOW_SECONDS, estimated with a sliding
+window over the current and previous fixed windows. That keeps each key to
+three numbers, however many requests it makes. A request is counted against its
+keys only if every one of them admits it; otherwise it gets 429 with Retry-After
+and counts against none, so a flood from one IP does not use up the limit of the
+username it targets. Bodies are buffered up to MAX_BODY_BYTES to find the
+username; larger ones get 413 before any rule is checked.
+
+The client IP is the ASGI client address; behind a proxy, run uvicorn with
+--proxy-headers so it is the real client.
+
+Backends (RATE_LIMIT_BACKEND):
+- memory: counters in this process, at most RATE_LIMIT_MAX_KEYS keys (LRU).
+  Each worker enforces the limits on its own.
+Other backends, such as a store shared by every worker, subclass
+RateLimitBackend and register in RATE_LIMIT_BACKENDS.
+"""
+from fastapi import status
+from fastapi.responses import JSONResponse
+from security import decode_access_token
+from config import get_settings
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple, Type
+import json
+import math
+import threading
+import time
+
+settings = get_settings()
+
+
+# The limited endpoints take a few short fields; nothing legitimate comes close
+MAX_BODY_BYTES = 4096
+
+
+class RateLimitBackend(ABC):
+    """Counts hits per key; implementations must make hit atomic across its keys"""
+
+    @abstractmethod
+    def hit(self, keys: List[Tuple[str, int]], window: float) -> float:
+        """
+        Count one request against every (key, limit) if all of them admit it; returns 0
+        if counted, else seconds until every key would admit it
+        """
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        # key -> [index of the current fixed window, hits in it, hits in the previous one]
+        self._windows: "OrderedDict[str, List[int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, keys: List[Tuple[str, int]], window: float) -> float:
+        now = time.time()
+        index = int(now // window)
+        elapsed = (now % window) / window
+        with self._lock:
+            windows = []
+            for key, limit in keys:
+                counts = self._windows.get(key)
+                if counts is None:
+                    counts = [index, 0, 0]
+                elif counts[0] != index:
+                    counts = [index, 0, counts[1] if counts[0] == index - 1 else 0]
+                self._windows[key] = counts
+                self._windows.move_to_end(key)
+                windows.append((counts, limit))
+            while len(self._windows) > self.max_keys:
+                self._windows.popitem(last=False)
+
+            retry_after = max(
+                (self._retry_after(counts[1], counts[2], limit, elapsed) * window for counts, limit in windows),
+                default=0
+            )
+            if not retry_after:
+                for counts, limit in windows:
+                    counts[1] += 1
+            return retry_after
+
+    @staticmethod
+    def _retry_after(current: int, previous: int, limit: int, elapsed: float) -> float:
+        """Fraction of a window until the estimate drops below limit; 0 if it already is"""
+        if previous * (1 - elapsed) + current < limit:
+            return 0
+        # Time until the previous window's weight has decayed enough for one more request
+        if current >= limit:
+            return (1 - elapsed) + (1 - limit / current)
+        return 1 - (limit - current) / previous - elapsed
+
+
+RATE_LIMIT_BACKENDS: Dict[str, Type[RateLimitBackend]] = {
+    "memory": MemoryRateLimitBackend,
+}
+
+
+def _client_ip(scope: dict, body: bytes) -> Optional[str]:
+    client = scope.get("client")
+    return client[0] if client else None
+
+
+def _login_username(scope: dict, body: bytes) -> Optional[str]:
+    try:
+        username = json.loads(body).get("username")
+    except (ValueError, AttributeError):
+        return None
+    return username if isinstance(username, str) else None
+
+
+def _token_user_id(scope: dict, body: bytes) -> Optional[str]:
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer":
+                payload = decode_access_token(token)
+                return payload.get("user_id") if payload else None
+    return None
+
+
+# (method, path) -> [(key name, key function, limit)]; a limit of 0 disables that key
+RATE_LIMIT_RULES: Dict[Tuple[str, str], List[Tuple[str, Callable[[dict, bytes], Optional[str]], int]]] = {
+    ("POST", "/api/auth/login"): [
+        ("ip", _client_ip, settings.LOGIN_RATE_LIMIT_PER_IP),
+        ("username", _login_username, settings.LOGIN_RATE_LIMIT_PER_USERNAME),
+    ],
+    ("POST", "/api/vault/access"): [
+        ("ip", _client_ip, settings.VAULT_ACCESS_RATE_LIMIT_PER_IP),
+        ("user", _token_user_id, settings.VAULT_ACCESS_RATE_LIMIT_PER_USER),
+    ],
+}
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware applying RATE_LIMIT_RULES. Written against raw ASGI so the login
+    body can be read for the username and then replayed to the endpoint.
+    """
+
+    def __init__(self, app, backend: Optional[RateLimitBackend] = None):
+        self.app = app
+        self.backend = backend or RATE_LIMIT_BACKENDS[settings.RATE_LIMIT_BACKEND](settings.RATE_LIMIT_MAX_KEYS)
+
+    async def __call__(self, scope, receive, send):
+        rules = RATE_LIMIT_RULES.get((scope.get("method"), scope.get("path"))) if scope["type"] == "http" else None
+        if not rules:
+            await self.app(scope, receive, send)
+            return
+
+        messages = []
+        body = b""
+        while True:
+            message = await receive()
+            messages.append(message)
+            if message["type"] != "http.request":
+                break
+            body += message.get("body", b"")
+            if len(body) > MAX_BODY_BYTES:
+                response = JSONResponse(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    content={"detail": "Request body too large"}
+                )
+                await response(scope, receive, send)
+                return
+            if not message.get("more_body"):
+                break
+
+        keys = []
+        for name, key_function, limit in rules:
+            key = key_function(scope, body)
+            if limit and key is not None:
+                keys.append((f"{scope['path']}|{name}|{key}", limit))
+        retry_after = self.backend.hit(keys, settings.RATE_LIMIT_WINDOW_SECONDS) if keys else 0
+        if retry_after:
+            response = JSONResponse(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                content={"detail": "Too many attempts, please retry later"},
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+            )
+            await response(scope, receive, send)
+            return
+
+        async def replay():
+            return messages.pop(0) if messages else await receive()
+
+        await self.app(scope, replay, send)
@@ -0,0 +1,120 @@
+"""
+In-memory cache of decrypted vault records, per user and vault item.
+
+Entries are keyed by (user id, vault item id) and live no longer than the expires_at
+of the privilege session that created them; later sessions can read an entry but
+never extend it. Ending a privilege session evicts the user's entry for that vault item.
+
+Plaintext is held in bytearrays so it can be overwritten with zeros whenever an
+entry leaves the cache: on expiry, LRU eviction under VAULT_RECORD_CACHE_MAX_BYTES,
+end of session, or a write to the vault item. Parsed copies handed out to build
+responses are ordinary Python objects and are not covered by the zeroization.
+
+The cache is per process and is only consulted after a privilege session (and with
+it MFA and, for employees, the approved request) has been validated against the
+database, so an entry cannot be read without a live grant.
+"""
+from config import get_settings
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, Tuple
+from uuid import UUID
+import json
+import threading
+
+settings = get_settings()
+
+# Rough per-record bookkeeping cost added to the plaintext length when enforcing the cap
+RECORD_OVERHEAD_BYTES = 128
+
+
+class _CacheEntry:
+    def __init__(self, expires_at: datetime):
+        self.expires_at = expires_at
+        self.payloads: Dict[UUID, bytearray] = {}
+        self.size = 0
+
+    def zeroize(self) -> None:
+        for payload in self.payloads.values():
+            payload[:] = bytes(len(payload))
+        self.payloads.clear()
+        self.size = 0
+
+
+class VaultRecordCache:
+    """LRU over (user, vault item) entries with a total size cap; thread-safe"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[UUID, UUID], _CacheEntry]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get_many(self, user_id: UUID, vault_item_id: UUID, record_ids: Iterable[UUID]) -> Dict[UUID, dict]:
+        """Parsed payloads of the requested records cached for this user and vault item"""
+        key = (user_id, vault_item_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return {}
+            if datetime.utcnow() >= entry.expires_at:
+                self._evict(key)
+                return {}
+            self._entries.move_to_end(key)
+            return {
+                record_id: json.loads(entry.payloads[record_id])
+                for record_id in record_ids
+                if record_id in entry.payloads
+            }
+
+    def put_many(self, user_id: UUID, vault_item_id: UUID, expires_at: datetime, payloads: Dict[UUID, bytes]) -> None:
+        """Cache decrypted payloads for this user and vault item; a new entry lasts until expires_at"""
+        if not payloads or datetime.utcnow() >= expires_at:
+            return
+        key = (user_id, vault_item_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _CacheEntry(expires_at)
+            self._entries.move_to_end(key)
+            for record_id, payload in payloads.items():
+                if record_id in entry.payloads:
+                    continue
+                size = len(payload) + RECORD_OVERHEAD_BYTES
+                entry.payloads[record_id] = bytearray(payload)
+                entry.size += size
+                self._size += size
+            self._evict_expired()
+            while self._size > self.max_bytes and self._entries:
+                self._evict(next(iter(self._entries)))
+
+    def invalidate(self, user_id: UUID, vault_item_id: UUID) -> None:
+        """Drop one user's entry for a vault item, e.g. when their privilege session ends"""
+        key = (user_id, vault_item_id)
+        with self._lock:
+            if key in self._entries:
+                self._evict(key)
+
+    def invalidate_vault_item(self, vault_item_id: UUID) -> None:
+        """Drop every user's entry for a vault item, e.g. after a write"""
+        with self._lock:
+            for key in [key for key in self._entries if key[1] == vault_item_id]:
+                self._evict(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self._entries):
+                self._evict(key)
+
+    def _evict_expired(self) -> None:
+        now = datetime.utcnow()
+        for key in [key for key, entry in self._entries.items() if now >= entry.expires_at]:
+            self._evict(key)
+
+    def _evict(self, key: Tuple[UUID, UUID]) -> None:
+        entry = self._entries.pop(key)
+        self._size -= entry.size
+        entry.zeroize()
+
+
+record_cache = VaultRecordCache(settings.VAULT_RECORD_CACHE_MAX_BYTES)
@@ -65,6 +65,19 @@ class VaultItemWithRecords(BaseModel):
     session_id: UUID
 
 
+class InstrumentTypeSummary(BaseModel):
+    instrument_type: str
+    record_count: int
+    total_invested: float
+
+
+class VaultSummaryResponse(BaseModel):
+    vault_item_id: UUID
+    record_count: int
+    total_invested: float
+    by_instrument_type: List[InstrumentTypeSummary]
+
+
 # Access Request schemas
 class AccessRequestCreate(BaseModel):
     vault_item_id: UUID
@@ -135,6 +148,23 @@ class AuditLogResponse(BaseModel):
         from_attributes = True
 
 
+class AuditChainVerifyResponse(BaseModel):
+    ok: bool
+    from_seq: int
+    to_seq: int
+    verified_rows: int
+    first_bad_seq: Optional[int]
+    error: Optional[str]
+
+
+class AuditRollupBucket(BaseModel):
+    bucket_start: datetime
+    action: Optional[str] = None
+    actor_id: Optional[UUID] = None
+    vault_item_id: Optional[UUID] = None
+    count: int
+
+
 # MFA schemas
 class QRCodeResponse(BaseModel):
     qr_code_base64: str
@@ -160,3 +190,8 @@ class VaultRecordCreate(BaseModel):
                 "remarks": "Diversified tech investment"
             }
         }
+
+
+class VaultRecordBulkCreate(BaseModel):
+    """Schema for adding many vault records in one call (write access)"""
+    records: List[VaultRecordCreate] = Field(min_length=1)
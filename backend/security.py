@@ -2,40 +2,329 @@ from passlib.hash import argon2
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from config import get_settings
-from cryptography.fernet import Fernet
+from cryptography.exceptions import InvalidTag
+from cryptography.fernet import Fernet, MultiFernet, InvalidToken
+from cryptography.hazmat.primitives import hashes, padding
+from cryptography.hazmat.primitives import hmac as crypto_hmac
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache, partial
+from typing import Callable, Dict, List, Optional
+from uuid import UUID
 import base64
+import os
 import pyotp
+import struct
+import threading
+import time
 
 settings = get_settings()
 
-# Initialize Fernet cipher with the encryption key
-cipher_suite = Fernet(settings.ENCRYPTION_KEY.encode())
+FERNET_VERSION = 0x80
+GCM_VERSION = 0x01
+WRAPPED_KEY_VERSION = 0x02
+GCM_NONCE_SIZE = 12
+
+# Separates the key id from the Fernet token in the string API ("<key id>$<token>")
+KEY_ID_SEPARATOR = "$"
+
+
+class EncryptionKey:
+    """One master key of the key ring and the subkeys derived from it"""
+    
+    def __init__(self, key_id: int, key: str):
+        if not 0 <= key_id <= 255:
+            raise ValueError(f"Encryption key id {key_id} must fit in one byte")
+        self.key_id = key_id
+        self.fernet = Fernet(key.encode())
+        raw = base64.urlsafe_b64decode(key.encode())
+        # Fernet key halves, used by the raw-bytes API
+        self.signing_key, self.encryption_key = raw[:16], raw[16:]
+        # Wraps per-vault data keys. HKDF keeps the KEK separate from the Fernet keys.
+        self.key_encryption_key = HKDF(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=None,
+            info=b"entitled-vault-data-key-wrapping"
+        ).derive(raw)
+
+
+def _load_key_ring() -> Dict[int, EncryptionKey]:
+    """ENCRYPTION_KEY is the active key; RETIRED_ENCRYPTION_KEYS ("id:key,...") stay readable"""
+    ring = {settings.ENCRYPTION_KEY_ID: EncryptionKey(settings.ENCRYPTION_KEY_ID, settings.ENCRYPTION_KEY)}
+    for entry in settings.RETIRED_ENCRYPTION_KEYS.split(","):
+        if entry.strip():
+            key_id, key = entry.strip().split(":", 1)
+            ring.setdefault(int(key_id), EncryptionKey(int(key_id), key))
+    return ring
+
+
+# Key ring: new ciphertexts name the key that produced them, so retired keys keep
+# decrypting while key_rotation.py moves stored data over to the active key
+KEY_RING = _load_key_ring()
+active_key = KEY_RING[settings.ENCRYPTION_KEY_ID]
+
+# Ciphertexts written before the key ring carry no key id; they are tried against every key, active first
+_unlabelled_keys = [active_key] + [key for key in KEY_RING.values() if key is not active_key]
+_unlabelled_fernet = MultiFernet([key.fernet for key in _unlabelled_keys])
+
+
+# Password hashing with Argon2, using the configured parameters. min_desired_rounds makes
+# hashes with a lower time cost count as outdated; password_needs_rehash also compares
+# memory cost and parallelism.
+_argon2_parameters = {
+    name: value for name, value in (
+        ("time_cost", settings.ARGON2_TIME_COST),
+        ("min_desired_rounds", settings.ARGON2_TIME_COST),
+        ("memory_cost", settings.ARGON2_MEMORY_COST_KIB),
+        ("parallelism", settings.ARGON2_PARALLELISM)
+    ) if value is not None
+}
+_password_hasher = argon2.using(**_argon2_parameters)
 
 
-# Password hashing with Argon2
 def hash_password(password: str) -> str:
     """Hash password using Argon2 with automatic salting"""
-    return argon2.hash(password)
+    return _password_hasher.hash(password)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify password against Argon2 hash"""
-    return argon2.verify(plain_password, hashed_password)
+    return _password_hasher.verify(plain_password, hashed_password)
+
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """True when a stored hash was made with Argon2 parameters other than the configured ones"""
+    if _password_hasher.needs_update(hashed_password):
+        return True
+    # Compared on the parsed hash rather than left to the handler's needs_update
+    return argon2.from_string(hashed_password).parallelism != _password_hasher.parallelism
+
+
+class PasswordHashingBusy(Exception):
+    """Every Argon2 worker is busy and the queue is full"""
+
+
+# Dedicated pool for Argon2, so a burst of logins cannot take the threads that serve every
+# other endpoint. Argon2 runs in argon2-cffi without the GIL, so the workers hash in parallel.
+# At most PASSWORD_HASH_WORKERS + PASSWORD_HASH_MAX_QUEUED tasks are accepted at once.
+_password_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="password-hash"
+)
+_password_slots = threading.BoundedSemaphore(settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_MAX_QUEUED)
+
+
+def submit_password_task(fn: Callable, *args) -> Future:
+    """Run hash_password or verify_password on the Argon2 pool; raises PasswordHashingBusy when it is full"""
+    if not _password_slots.acquire(blocking=False):
+        raise PasswordHashingBusy()
+    try:
+        future = _password_executor.submit(fn, *args)
+    except BaseException:
+        _password_slots.release()
+        raise
+    future.add_done_callback(lambda _: _password_slots.release())
+    return future
 
 
 # AES-256 encryption for sensitive data
 def encrypt_data(data: str) -> str:
-    """Encrypt data using AES-256 (via Fernet)"""
-    encrypted_bytes = cipher_suite.encrypt(data.encode())
-    return encrypted_bytes.decode()
+    """Encrypt data using AES-256 (via Fernet) under the active key"""
+    encrypted_bytes = active_key.fernet.encrypt(data.encode())
+    return f"{active_key.key_id}{KEY_ID_SEPARATOR}{encrypted_bytes.decode()}"
+
+
+def data_key_id(encrypted_data: str) -> Optional[int]:
+    """Key id of a string token, or None for a token written before the key ring"""
+    key_id, separator, _ = encrypted_data.partition(KEY_ID_SEPARATOR)
+    return int(key_id) if separator else None
 
 
 def decrypt_data(encrypted_data: str) -> str:
-    """Decrypt data using AES-256 (via Fernet)"""
-    decrypted_bytes = cipher_suite.decrypt(encrypted_data.encode())
+    """Decrypt data using AES-256 (via Fernet) with the key named in the token"""
+    key_id, separator, token = encrypted_data.partition(KEY_ID_SEPARATOR)
+    if not separator:
+        return _unlabelled_fernet.decrypt(encrypted_data.encode()).decode()
+    key = KEY_RING.get(int(key_id))
+    if key is None:
+        raise InvalidToken
+    decrypted_bytes = key.fernet.decrypt(token.encode())
     return decrypted_bytes.decode()
 
 
+# Raw-bytes encryption for binary columns. Produces the Fernet token layout
+# (version | timestamp | IV | ciphertext | HMAC) without the base64 armor,
+# so urlsafe_b64encode(encrypt_bytes(x)) is a valid Fernet token and vice versa.
+# These tokens carry no key id; new vault records use the envelope format below.
+def encrypt_bytes(data: bytes) -> bytes:
+    """Encrypt bytes into a binary Fernet token under the active key"""
+    iv = os.urandom(16)
+    padder = padding.PKCS7(algorithms.AES.block_size).padder()
+    padded = padder.update(data) + padder.finalize()
+    encryptor = Cipher(algorithms.AES(active_key.encryption_key), modes.CBC(iv)).encryptor()
+    ciphertext = encryptor.update(padded) + encryptor.finalize()
+    
+    basic_parts = struct.pack(">BQ", FERNET_VERSION, int(time.time())) + iv + ciphertext
+    h = crypto_hmac.HMAC(active_key.signing_key, hashes.SHA256())
+    h.update(basic_parts)
+    return basic_parts + h.finalize()
+
+
+def _verify_fernet_bytes(token: bytes, key: EncryptionKey) -> bool:
+    h = crypto_hmac.HMAC(key.signing_key, hashes.SHA256())
+    h.update(token[:-32])
+    try:
+        h.verify(token[-32:])
+    except Exception:
+        return False
+    return True
+
+
+def decrypt_bytes(token: bytes) -> bytes:
+    """Verify and decrypt a binary Fernet token. Raises InvalidToken on tampering."""
+    if len(token) < 57 or token[0] != FERNET_VERSION:
+        raise InvalidToken
+    key = next((key for key in _unlabelled_keys if _verify_fernet_bytes(token, key)), None)
+    if key is None:
+        raise InvalidToken
+    
+    iv, ciphertext = token[9:25], token[25:-32]
+    decryptor = Cipher(algorithms.AES(key.encryption_key), modes.CBC(iv)).decryptor()
+    padded = decryptor.update(ciphertext) + decryptor.finalize()
+    unpadder = padding.PKCS7(algorithms.AES.block_size).unpadder()
+    try:
+        return unpadder.update(padded) + unpadder.finalize()
+    except ValueError:
+        raise InvalidToken
+
+
+# AES-256-GCM envelope encryption for vault records.
+# Record layout: version (0x01) | nonce (12) | ciphertext + tag; the vault item id
+# is bound as associated data so records cannot be moved between vaults.
+# Wrapped data key layout: version (0x02) | master key id | nonce (12) | wrapped key + tag.
+# Rotating the master key only re-wraps data keys; records are untouched.
+def _wrap_data_key(data_key: bytes, vault_item_id: UUID) -> bytes:
+    nonce = os.urandom(GCM_NONCE_SIZE)
+    wrapped = AESGCM(active_key.key_encryption_key).encrypt(nonce, data_key, vault_item_id.bytes)
+    return bytes([WRAPPED_KEY_VERSION, active_key.key_id]) + nonce + wrapped
+
+
+def _unwrap_raw_data_key(vault_item_id: UUID, wrapped_key: bytes) -> bytes:
+    key = KEY_RING.get(wrapped_key[1]) if wrapped_key[0] == WRAPPED_KEY_VERSION else None
+    if key is None:
+        raise InvalidToken
+    nonce, wrapped = wrapped_key[2:2 + GCM_NONCE_SIZE], wrapped_key[2 + GCM_NONCE_SIZE:]
+    try:
+        return AESGCM(key.key_encryption_key).decrypt(nonce, wrapped, vault_item_id.bytes)
+    except InvalidTag:
+        raise InvalidToken
+
+
+def generate_wrapped_data_key(vault_item_id: UUID) -> bytes:
+    """Create a new 256-bit data key for a vault item and return it wrapped by the active KEK"""
+    return _wrap_data_key(AESGCM.generate_key(bit_length=256), vault_item_id)
+
+
+def wrapped_key_id(wrapped_key: bytes) -> int:
+    """Master key id of a wrapped data key"""
+    return wrapped_key[1]
+
+
+def rewrap_data_key(vault_item_id: UUID, wrapped_key: bytes) -> bytes:
+    """Re-wrap a data key under the active KEK. The data key itself is unchanged."""
+    return _wrap_data_key(_unwrap_raw_data_key(vault_item_id, wrapped_key), vault_item_id)
+
+
+@lru_cache(maxsize=settings.DATA_KEY_CACHE_SIZE)
+def _unwrap_data_key(vault_item_id: UUID, wrapped_key: bytes) -> AESGCM:
+    """Unwrap a data key. Cached (bounded LRU) so hot vaults skip the unwrap on every read."""
+    return AESGCM(_unwrap_raw_data_key(vault_item_id, wrapped_key))
+
+
+def encrypt_record(data: bytes, vault_item_id: UUID, wrapped_key: bytes) -> bytes:
+    """Encrypt a vault record with the vault item's data key"""
+    nonce = os.urandom(GCM_NONCE_SIZE)
+    aead = _unwrap_data_key(vault_item_id, wrapped_key)
+    return bytes([GCM_VERSION]) + nonce + aead.encrypt(nonce, data, vault_item_id.bytes)
+
+
+def decrypt_record(token: bytes, vault_item_id: UUID, wrapped_key: bytes) -> bytes:
+    """Decrypt a vault record in either the GCM envelope format or the legacy Fernet format"""
+    if token[0] == FERNET_VERSION:
+        return decrypt_bytes(token)
+    if token[0] != GCM_VERSION or wrapped_key is None:
+        raise InvalidToken
+    nonce, ciphertext = token[1:1 + GCM_NONCE_SIZE], token[1 + GCM_NONCE_SIZE:]
+    return _unwrap_data_key(vault_item_id, wrapped_key).decrypt(nonce, ciphertext, vault_item_id.bytes)
+
+
+# Blind indexes: keyed HMAC-SHA256 of a normalized field value, so equality lookups on
+# encrypted fields need no decryption. Keys are derived per vault item and field from the
+# data key, so they survive master key rotation and equal values in different vaults differ.
+@lru_cache(maxsize=settings.DATA_KEY_CACHE_SIZE)
+def _blind_index_key(vault_item_id: UUID, wrapped_key: bytes, field: str) -> bytes:
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=b"entitled-vault-blind-index|" + field.encode()
+    ).derive(_unwrap_raw_data_key(vault_item_id, wrapped_key))
+
+
+def blind_index(field: str, value: str, vault_item_id: UUID, wrapped_key: bytes) -> str:
+    """Blind index of a field value; matching is exact after trimming and case folding"""
+    h = crypto_hmac.HMAC(_blind_index_key(vault_item_id, wrapped_key, field), hashes.SHA256())
+    h.update(value.strip().casefold().encode())
+    return h.finalize().hex()
+
+
+# Bounded pool for batch encryption and decryption. The AES work runs in OpenSSL without
+# the GIL, so large batches are processed in parallel across threads.
+_crypto_executor = ThreadPoolExecutor(
+    max_workers=settings.DECRYPT_MAX_WORKERS,
+    thread_name_prefix="record-crypto"
+)
+
+
+def _decrypt_chunk(chunk: List[bytes], vault_item_id: UUID, wrapped_key: bytes) -> List[bytes]:
+    return [decrypt_record(token, vault_item_id, wrapped_key) for token in chunk]
+
+
+def _encrypt_chunk(chunk: List[bytes], vault_item_id: UUID, wrapped_key: bytes) -> List[bytes]:
+    return [encrypt_record(data, vault_item_id, wrapped_key) for data in chunk]
+
+
+def _process_batch(process_chunk: Callable[[List[bytes]], List[bytes]], items: List[bytes]) -> List[bytes]:
+    """
+    Apply process_chunk to items, preserving order.
+    Batches below DECRYPT_PARALLEL_THRESHOLD are processed inline; larger ones are split
+    into one chunk per worker to keep per-task overhead low.
+    """
+    if len(items) < settings.DECRYPT_PARALLEL_THRESHOLD:
+        return process_chunk(items)
+    
+    workers = settings.DECRYPT_MAX_WORKERS
+    chunk_size = -(-len(items) // workers)
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    processed = []
+    for chunk_result in _crypto_executor.map(process_chunk, chunks):
+        processed.extend(chunk_result)
+    return processed
+
+
+def decrypt_record_batch(encrypted_items: List[bytes], vault_item_id: UUID, wrapped_key: bytes) -> List[bytes]:
+    """Decrypt a list of one vault item's records, preserving order"""
+    return _process_batch(partial(_decrypt_chunk, vault_item_id=vault_item_id, wrapped_key=wrapped_key), encrypted_items)
+
+
+def encrypt_record_batch(items: List[bytes], vault_item_id: UUID, wrapped_key: bytes) -> List[bytes]:
+    """Encrypt a list of records for one vault item, preserving order"""
+    return _process_batch(partial(_encrypt_chunk, vault_item_id=vault_item_id, wrapped_key=wrapped_key), items)
+
+
 # JWT token creation
 def create_access_token(data: dict, expires_delta: timedelta = None):
     """Create JWT access token"""
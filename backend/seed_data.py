@@ -9,7 +9,9 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from database import SessionLocal
 from models import User, VaultItem, VaultRecord, RoleEnum
-from security import hash_password, encrypt_data, generate_totp_secret, encrypt_totp_secret
+from security import hash_password, encrypt_record, generate_wrapped_data_key, generate_totp_secret, encrypt_totp_secret
+from blind_index import record_blind_indexes
+from vault_summary import record_vault_summary
 import uuid
 import json
 
@@ -284,9 +286,11 @@ def seed_database():
         
         for vault_data in vault_items_data:
             # Create vault item
+            vault_item_id = uuid.uuid4()
             vault_item = VaultItem(
-                id=uuid.uuid4(),
-                title=vault_data["title"]
+                id=vault_item_id,
+                title=vault_data["title"],
+                wrapped_data_key=generate_wrapped_data_key(vault_item_id)
             )
             db.add(vault_item)
             print(f"\n   📁 Vault: {vault_data['title']}")
@@ -295,15 +299,19 @@ def seed_database():
             for record_data in vault_data["records"]:
                 # Encrypt the record data as JSON
                 json_data = json.dumps(record_data)
-                encrypted_payload = encrypt_data(json_data)
+                encrypted_payload = encrypt_record(json_data.encode(), vault_item.id, vault_item.wrapped_data_key)
                 
                 record = VaultRecord(
                     id=uuid.uuid4(),
                     vault_item_id=vault_item.id,
-                    encrypted_payload=encrypted_payload
+                    encrypted_payload=encrypted_payload,
+                    **record_blind_indexes(record_data, vault_item.id, vault_item.wrapped_data_key)
                 )
                 db.add(record)
                 print(f"      ✓ Record: {record_data['investment_name']} (${record_data['invested_amount']:,.2f})")
+            
+            # Encrypted aggregates for the vault's summary endpoint
+            record_vault_summary(db, vault_item, vault_data["records"])
         
         db.commit()
         
@@ -0,0 +1,81 @@
+from audit_partitions import archive_audit_partition, create_audit_partition, list_audit_partitions
+from audit_chain import verify_audit_chain
+from audit_writer import audit_writer
+from database import engine
+from models import AuditLog, RoleEnum
+from datetime import date, datetime
+import json
+import uuid
+
+
+def write_audit_log(db, actor, action: str, timestamp: datetime) -> None:
+    audit_writer.write(db, AuditLog(id=uuid.uuid4(), actor_id=actor.id, action=action, timestamp=timestamp))
+    db.commit()
+
+
+def test_export_includes_archived_months(client, db, make_user, auth_headers, tmp_path, monkeypatch):
+    monkeypatch.setattr("audit_archive.settings.AUDIT_ARCHIVE_DIR", str(tmp_path))
+    auditor = make_user(RoleEnum.AUDITOR)
+    month = date(2001, 1, 1)
+    with engine.begin() as conn:
+        create_audit_partition(conn, month)
+    write_audit_log(db, auditor, "ARCHIVED_ACTION", datetime(2001, 1, 15))
+    write_audit_log(db, auditor, "LIVE_ACTION", datetime.utcnow())
+
+    assert archive_audit_partition(db, month) == 1
+    assert month not in list_audit_partitions(db.connection())
+    db.rollback()
+
+    response = client.get("/api/audit/export", params={"format": "ndjson"}, headers=auth_headers(auditor))
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["action"] for row in rows] == ["ARCHIVED_ACTION", "LIVE_ACTION", "AUDIT_EXPORT"]
+    assert rows[0]["actor_username"] == auditor.username
+
+    response = client.get(
+        "/api/audit/export",
+        params={"format": "csv", "until": "2001-02-01T00:00:00Z"},
+        headers=auth_headers(auditor)
+    )
+    lines = response.text.splitlines()
+    assert len(lines) == 2 and "ARCHIVED_ACTION" in lines[1]
+
+
+def test_full_chain_verification_continues_through_archived_months(db, make_user, tmp_path, monkeypatch):
+    monkeypatch.setattr("audit_archive.settings.AUDIT_ARCHIVE_DIR", str(tmp_path))
+    actor = make_user(RoleEnum.ADMIN)
+    month = date(2001, 1, 1)
+    with engine.begin() as conn:
+        create_audit_partition(conn, month)
+    write_audit_log(db, actor, "ARCHIVED_ACTION", datetime(2001, 1, 15))
+    write_audit_log(db, actor, "LIVE_ACTION", datetime.utcnow())
+    archive_audit_partition(db, month)
+
+    outcome = verify_audit_chain(db, full=True)
+    assert outcome["ok"], outcome["error"]
+    assert (outcome["from_seq"], outcome["to_seq"], outcome["verified_rows"]) == (0, 2, 2)
+
+
+def test_incremental_verification_anchors_on_an_archived_checkpoint(db, make_user, tmp_path, monkeypatch):
+    monkeypatch.setattr("audit_archive.settings.AUDIT_ARCHIVE_DIR", str(tmp_path))
+    actor = make_user(RoleEnum.ADMIN)
+    month = date(2001, 1, 1)
+    with engine.begin() as conn:
+        create_audit_partition(conn, month)
+    write_audit_log(db, actor, "ARCHIVED_ACTION", datetime(2001, 1, 15))
+    assert verify_audit_chain(db)["to_seq"] == 1
+    archive_audit_partition(db, month)
+    write_audit_log(db, actor, "LIVE_ACTION", datetime.utcnow())
+
+    outcome = verify_audit_chain(db)
+    assert outcome["ok"], outcome["error"]
+    assert (outcome["from_seq"], outcome["to_seq"], outcome["verified_rows"]) == (1, 2, 1)
+
+
+def test_checkpoints_do_not_depend_on_the_jwt_key(db, make_user, monkeypatch):
+    write_audit_log(db, make_user(RoleEnum.ADMIN), "ACTION", datetime.utcnow())
+    assert verify_audit_chain(db)["ok"]
+    monkeypatch.setattr("audit_chain.settings.SECRET_KEY", "rotated-jwt-key")
+    assert verify_audit_chain(db)["ok"]
+    monkeypatch.setattr("audit_chain.settings.AUDIT_CHECKPOINT_KEY", "other-checkpoint-key")
+    assert verify_audit_chain(db)["error"] == "Checkpoint signature invalid"
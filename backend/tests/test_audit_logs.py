@@ -0,0 +1,22 @@
+from audit import create_audit_log
+from models import RoleEnum
+
+
+def test_timezone_aware_filters_are_compared_as_utc(client, db, make_user, auth_headers, tmp_path, monkeypatch):
+    monkeypatch.setattr("audit_archive.settings.AUDIT_ARCHIVE_DIR", str(tmp_path))
+    auditor = make_user(RoleEnum.AUDITOR)
+    create_audit_log(db, auditor, "LOGIN")
+    db.commit()
+
+    # A short page also reads the (here empty) archive, which compares against `until`
+    response = client.get(
+        "/api/audit/logs",
+        params={"since": "2000-01-01T00:00:00Z", "until": "2999-01-01T00:00:00+02:00"},
+        headers=auth_headers(auditor)
+    )
+    assert response.status_code == 200
+    assert [entry["action"] for entry in response.json()] == ["LOGIN"]
+
+    response = client.get("/api/audit/logs", params={"until": "2000-01-01T00:00:00Z"}, headers=auth_headers(auditor))
+    assert response.status_code == 200
+    assert response.json() == []
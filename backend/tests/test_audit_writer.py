@@ -0,0 +1,87 @@
+from sqlalchemy import event, text
+from sqlalchemy.exc import IntegrityError
+from audit_writer import BufferedAuditWriter, _read_journal
+from database import engine
+from models import AuditLog, RoleEnum, User
+from datetime import datetime
+import pytest
+import uuid
+
+
+@pytest.fixture
+def buffered_writer(database, tmp_path, monkeypatch):
+    # A long flush interval keeps the background thread from draining on its own
+    writer = BufferedAuditWriter(str(tmp_path / "audit_wal.ndjson"), batch_size=100, flush_interval=3600)
+    writer.start()
+    monkeypatch.setattr("audit_writer.audit_writer", writer)
+    yield writer
+    writer.stop()
+
+
+def audit_log(actor: User) -> AuditLog:
+    return AuditLog(id=uuid.uuid4(), actor_id=actor.id, action="TEST_ACTION", timestamp=datetime.utcnow())
+
+
+def test_entries_are_journaled_before_the_transaction_commits(db, make_user, buffered_writer):
+    actor = make_user(RoleEnum.ADMIN)
+    entry = audit_log(actor)
+    buffered_writer.write(db, entry)
+    journaled = []
+
+    def on_commit(conn):
+        journaled.extend(_read_journal(buffered_writer.journal_path))
+
+    event.listen(engine, "commit", on_commit)
+    try:
+        db.commit()
+    finally:
+        event.remove(engine, "commit", on_commit)
+
+    assert [line["id"] for line in journaled] == [str(entry.id)]
+    assert journaled[0]["xid"]
+
+    buffered_writer.flush()
+    assert db.query(AuditLog).filter(AuditLog.id == entry.id).count() == 1
+
+
+def test_entries_of_a_failed_commit_are_not_inserted(db, make_user, buffered_writer):
+    actor = make_user(RoleEnum.ADMIN)
+    entry = audit_log(actor)
+    buffered_writer.write(db, entry)
+    db.add(User(id=uuid.uuid4(), username=actor.username, password_hash="x", role=RoleEnum.ADMIN, totp_secret="x"))
+    with pytest.raises(IntegrityError):
+        db.commit()
+    db.rollback()
+
+    assert [line["id"] for line in _read_journal(buffered_writer.journal_path)] == [str(entry.id)]
+    buffered_writer.flush()
+    assert db.query(AuditLog).filter(AuditLog.id == entry.id).count() == 0
+    assert not buffered_writer._pending
+
+
+def test_a_failing_segment_does_not_block_later_ones(db, make_user, buffered_writer):
+    actor = make_user(RoleEnum.ADMIN)
+    # Fails on insert: the actor does not exist
+    orphan = AuditLog(id=uuid.uuid4(), actor_id=uuid.uuid4(), action="TEST_ACTION", timestamp=datetime.utcnow())
+    buffered_writer.write(db, orphan)
+    db.commit()
+    buffered_writer._rotate()
+    entry = audit_log(actor)
+    buffered_writer.write(db, entry)
+    db.commit()
+
+    with pytest.raises(IntegrityError):
+        buffered_writer.flush()
+    assert db.query(AuditLog).filter(AuditLog.id == entry.id).count() == 1
+    assert len(buffered_writer._pending) == 1
+    assert [line["id"] for line in _read_journal(buffered_writer._pending[0])] == [str(orphan.id)]
+
+
+def test_entries_for_a_month_without_a_partition_go_to_the_default_partition(db, make_user, buffered_writer):
+    actor = make_user(RoleEnum.ADMIN)
+    entry = AuditLog(id=uuid.uuid4(), actor_id=actor.id, action="LATE_ACTION", timestamp=datetime(2001, 3, 1))
+    buffered_writer.write(db, entry)
+    db.commit()
+
+    buffered_writer.flush()
+    assert db.execute(text("SELECT id FROM audit_logs_default")).scalars().all() == [entry.id]
@@ -0,0 +1,19 @@
+from passlib.hash import argon2
+import pytest
+import security
+
+
+@pytest.mark.parametrize("changed", [
+    {"parallelism": 2},
+    {"memory_cost": 2048},
+    {"time_cost": 3, "min_desired_rounds": 3},
+])
+def test_hash_with_other_parameters_needs_rehash(monkeypatch, changed):
+    parameters = {"time_cost": 2, "min_desired_rounds": 2, "memory_cost": 1024, "parallelism": 1}
+    monkeypatch.setattr("security._password_hasher", argon2.using(**parameters))
+    hashed = security.hash_password("password")
+    assert not security.password_needs_rehash(hashed)
+
+    monkeypatch.setattr("security._password_hasher", argon2.using(**{**parameters, **changed}))
+    assert security.password_needs_rehash(hashed)
+    assert security.verify_password("password", hashed)
@@ -0,0 +1,9 @@
+from models import RoleEnum
+import pytest
+
+
+@pytest.mark.parametrize("format", ["json", "png", "svg"])
+def test_qr_code_is_never_cached(client, make_user, auth_headers, format):
+    response = client.get(f"/api/auth/qr-code?format={format}", headers=auth_headers(make_user(RoleEnum.EMPLOYEE)))
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == "no-store"
@@ -0,0 +1,106 @@
+"""
+The list endpoints eager-load their relationships, so the number of SQL statements
+a request issues must not grow with the number of rows it returns.
+"""
+from contextlib import contextmanager
+from sqlalchemy import event
+from audit_writer import audit_writer
+from database import engine
+from models import AccessRequest, AuditLog, RequestStatusEnum, RoleEnum, VaultItem
+from datetime import datetime
+import uuid
+
+
+@contextmanager
+def count_queries():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def queries_for(client, url: str, headers: dict, rows: int) -> int:
+    with count_queries() as statements:
+        response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    assert len(response.json()) == rows
+    return len(statements)
+
+
+def add_vault_item(db) -> VaultItem:
+    vault_item = VaultItem(id=uuid.uuid4(), title=f"Item {uuid.uuid4().hex[:8]}")
+    db.add(vault_item)
+    return vault_item
+
+
+def test_audit_logs_query_count_is_constant(client, db, make_user, auth_headers):
+    auditor = make_user(RoleEnum.AUDITOR)
+    headers = auth_headers(auditor)
+    client.get("/api/audit/logs", headers=headers)
+
+    def add_audit_logs(count: int) -> None:
+        for _ in range(count):
+            audit_writer.write(db, AuditLog(
+                id=uuid.uuid4(),
+                actor_id=make_user(RoleEnum.EMPLOYEE).id,
+                action="TEST_ACTION",
+                vault_item_id=add_vault_item(db).id,
+                target_user_id=make_user(RoleEnum.ADMIN).id,
+                timestamp=datetime.utcnow()
+            ))
+        db.commit()
+
+    add_audit_logs(1)
+    one = queries_for(client, "/api/audit/logs", headers, 1)
+    add_audit_logs(9)
+    assert queries_for(client, "/api/audit/logs", headers, 10) == one
+
+
+def test_my_requests_query_count_is_constant(client, db, make_user, auth_headers):
+    employee = make_user(RoleEnum.EMPLOYEE)
+    headers = auth_headers(employee)
+    client.get("/api/requests/my-requests", headers=headers)
+
+    def add_requests(count: int) -> None:
+        for _ in range(count):
+            db.add(AccessRequest(
+                employee_id=employee.id,
+                admin_id=make_user(RoleEnum.ADMIN).id,
+                vault_item_id=add_vault_item(db).id,
+                reason="test",
+                status=RequestStatusEnum.PENDING
+            ))
+        db.commit()
+
+    add_requests(1)
+    one = queries_for(client, "/api/requests/my-requests", headers, 1)
+    add_requests(9)
+    assert queries_for(client, "/api/requests/my-requests", headers, 10) == one
+
+
+def test_pending_requests_query_count_is_constant(client, db, make_user, auth_headers):
+    admin = make_user(RoleEnum.ADMIN)
+    headers = auth_headers(admin)
+    client.get("/api/requests/pending", headers=headers)
+
+    def add_requests(count: int) -> None:
+        for _ in range(count):
+            db.add(AccessRequest(
+                employee_id=make_user(RoleEnum.EMPLOYEE).id,
+                admin_id=admin.id,
+                vault_item_id=add_vault_item(db).id,
+                reason="test",
+                status=RequestStatusEnum.PENDING
+            ))
+        db.commit()
+
+    add_requests(1)
+    one = queries_for(client, "/api/requests/pending", headers, 1)
+    add_requests(9)
+    assert queries_for(client, "/api/requests/pending", headers, 10) == one
@@ -0,0 +1,23 @@
+from fastapi.testclient import TestClient
+from fastapi.responses import PlainTextResponse
+from rate_limit import MAX_BODY_BYTES, MemoryRateLimitBackend, RateLimitMiddleware
+
+
+def test_rejected_requests_count_against_no_key():
+    backend = MemoryRateLimitBackend(max_keys=100)
+    assert backend.hit([("ip-1", 1), ("alice", 2)], 3600) == 0
+    # ip-1 is spent, so these are refused without touching alice's counter
+    for _ in range(3):
+        assert backend.hit([("ip-1", 1), ("alice", 2)], 3600) > 0
+    assert backend.hit([("ip-2", 1), ("alice", 2)], 3600) == 0
+    assert backend.hit([("ip-3", 1), ("alice", 2)], 3600) > 0
+
+
+def test_oversized_login_body_is_refused():
+    async def app(scope, receive, send):
+        await PlainTextResponse("ok")(scope, receive, send)
+
+    client = TestClient(RateLimitMiddleware(app, backend=MemoryRateLimitBackend(max_keys=100)))
+    response = client.post("/api/auth/login", content=b"{" + b" " * MAX_BODY_BYTES + b"}")
+    assert response.status_code == 413
+    assert client.post("/api/auth/login", json={"username": "alice", "password": "x"}).status_code == 200
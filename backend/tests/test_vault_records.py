@@ -0,0 +1,100 @@
+from models import RoleEnum, VaultItem
+from record_cache import VaultRecordCache, record_cache
+from datetime import datetime, timedelta
+import json
+import pytest
+import uuid
+import vault
+
+
+@pytest.fixture
+def admin_vault_item(client, db, make_user, auth_headers, monkeypatch):
+    """An admin's headers and a vault item holding two records, with TOTP checks stubbed out"""
+    monkeypatch.setattr("main.verify_user_totp", lambda user, token: True)
+    record_cache.clear()
+    headers = auth_headers(make_user(RoleEnum.ADMIN))
+    vault_item = VaultItem(id=uuid.uuid4(), title="Portfolio")
+    db.add(vault_item)
+    db.commit()
+
+    open_vault_item(client, headers, vault_item)
+    for name in ("Bonds", "Equities"):
+        response = client.post(f"/api/vault/{vault_item.id}/records", headers=headers, json={
+            "investment_name": name,
+            "invested_amount": 100.0,
+            "investment_date": "2024-01-01",
+            "instrument_type": "fund",
+            "remarks": ""
+        })
+        assert response.status_code == 200
+    return headers, vault_item
+
+
+def open_vault_item(client, headers: dict, vault_item: VaultItem) -> dict:
+    response = client.post(
+        "/api/vault/access", json={"vault_item_id": str(vault_item.id), "totp_token": "000000"}, headers=headers
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+def count_decrypted(monkeypatch) -> list:
+    """Record every payload passed to decrypt_record_batch from here on"""
+    decrypted = []
+    decrypt_record_batch = vault.decrypt_record_batch
+    monkeypatch.setattr(
+        "vault.decrypt_record_batch",
+        lambda payloads, *args: decrypted.extend(payloads) or decrypt_record_batch(payloads, *args)
+    )
+    return decrypted
+
+
+def test_ending_a_session_evicts_its_cached_records(client, admin_vault_item, monkeypatch):
+    headers, vault_item = admin_vault_item
+    decrypted = count_decrypted(monkeypatch)
+
+    opened = open_vault_item(client, headers, vault_item)
+    assert len(decrypted) == 2
+    response = client.get(f"/api/vault/sessions/{opened['session_id']}/records", headers=headers)
+    assert response.json() == opened["records"]
+    assert len(decrypted) == 2
+
+    response = client.post("/api/vault/end-session", json={"session_id": opened["session_id"]}, headers=headers)
+    assert response.status_code == 200
+    user_id = client.get("/api/auth/me", headers=headers).json()["id"]
+    record_ids = [uuid.UUID(record["id"]) for record in opened["records"]]
+    assert record_cache.get_many(uuid.UUID(user_id), vault_item.id, record_ids) == {}
+
+    reopened = open_vault_item(client, headers, vault_item)
+    assert reopened["records"] == opened["records"]
+    assert len(decrypted) == 4
+
+
+def test_streamed_records_are_not_cached(client, admin_vault_item, monkeypatch):
+    headers, vault_item = admin_vault_item
+    session_id = open_vault_item(client, headers, vault_item)["session_id"]
+    record_cache.clear()
+    decrypted = count_decrypted(monkeypatch)
+
+    response = client.get(f"/api/vault/sessions/{session_id}/records/stream", headers=headers)
+    assert response.status_code == 200
+    assert [json.loads(line)["investment_name"] for line in response.text.splitlines()] == ["Bonds", "Equities"]
+    assert len(decrypted) == 2
+
+    response = client.get(f"/api/vault/sessions/{session_id}/records", headers=headers)
+    assert response.status_code == 200
+    assert len(decrypted) == 4
+
+
+def test_later_sessions_do_not_extend_a_cache_entry(monkeypatch):
+    cache = VaultRecordCache(max_bytes=1024 * 1024)
+    user_id, vault_item_id, record_id = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    now = datetime.utcnow()
+    cache.put_many(user_id, vault_item_id, now + timedelta(minutes=1), {record_id: b'{"remarks": ""}'})
+    cache.put_many(user_id, vault_item_id, now + timedelta(minutes=10), {uuid.uuid4(): b'{"remarks": ""}'})
+    assert cache.get_many(user_id, vault_item_id, [record_id]) == {record_id: {"remarks": ""}}
+
+    monkeypatch.setattr("record_cache.datetime", type("FrozenDatetime", (), {
+        "utcnow": staticmethod(lambda: now + timedelta(minutes=2))
+    }))
+    assert cache.get_many(user_id, vault_item_id, [record_id]) == {}
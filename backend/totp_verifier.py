@@ -0,0 +1,136 @@
+"""
+TOTP verification with a verifier cache and replay protection.
+
+Verifiers: the decrypted pyotp.TOTP for a user is cached for
+TOTP_VERIFIER_CACHE_TTL_SECONDS (at most TOTP_VERIFIER_CACHE_MAX_ENTRIES, LRU),
+keyed by user id and checked against the stored ciphertext, so a new or
+re-encrypted secret is picked up on the next verification.
+
+Replays: a code is accepted once. The time step it matched is claimed in a
+used-code store keyed by (user, time step); a second claim of the same step is
+rejected. Claims expire once the step has left the accepted window. Backends
+(TOTP_REPLAY_BACKEND):
+- memory: a dict in this process. Suitable for a single worker.
+- postgres: the used_totp_codes table, shared by every worker. Claims commit
+  in their own transaction, so a code stays used even if the request fails later.
+"""
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from database import engine
+from models import User, UsedTotpCode
+from security import decrypt_totp_secret
+from config import get_settings
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional, Tuple, Type
+from uuid import UUID
+import pyotp
+import threading
+import time
+
+settings = get_settings()
+
+# Steps either side of the current one that are accepted, for clock drift
+TOTP_VALID_WINDOW = 1
+
+# Seconds between purges of expired rows in the postgres backend
+USED_CODE_PURGE_INTERVAL_SECONDS = 60
+
+
+class TotpVerifierCache:
+    """Thread-safe bounded TTL cache of pyotp.TOTP objects keyed by user id"""
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[UUID, Tuple[float, str, pyotp.TOTP]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: UUID, encrypted_secret: str) -> pyotp.TOTP:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now and entry[1] == encrypted_secret:
+                self._entries.move_to_end(user_id)
+                return entry[2]
+        totp = pyotp.TOTP(decrypt_totp_secret(encrypted_secret))
+        with self._lock:
+            self._entries[user_id] = (now + self.ttl_seconds, encrypted_secret, totp)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return totp
+
+
+class UsedCodeStore(ABC):
+    """Records accepted (user, time step) pairs; implementations must make claim atomic"""
+
+    @abstractmethod
+    def claim(self, user_id: UUID, time_step: int, expires_at: float) -> bool:
+        """Record the pair until expires_at (epoch seconds); False if it is already recorded"""
+
+
+class MemoryUsedCodeStore(UsedCodeStore):
+    def __init__(self):
+        self._used: "OrderedDict[Tuple[UUID, int], float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def claim(self, user_id: UUID, time_step: int, expires_at: float) -> bool:
+        now = time.time()
+        with self._lock:
+            # Claims arrive in roughly expiry order, so expired ones collect at the front
+            while self._used and next(iter(self._used.values())) <= now:
+                self._used.popitem(last=False)
+            key = (user_id, time_step)
+            if self._used.get(key, 0) > now:
+                return False
+            self._used[key] = expires_at
+            return True
+
+
+class PostgresUsedCodeStore(UsedCodeStore):
+    def __init__(self):
+        self._next_purge = 0.0
+
+    def claim(self, user_id: UUID, time_step: int, expires_at: float) -> bool:
+        now = time.monotonic()
+        with engine.begin() as conn:
+            if now >= self._next_purge:
+                self._next_purge = now + USED_CODE_PURGE_INTERVAL_SECONDS
+                conn.execute(delete(UsedTotpCode).where(UsedTotpCode.expires_at <= datetime.utcnow()))
+            stmt = pg_insert(UsedTotpCode.__table__).values(
+                user_id=user_id,
+                time_step=time_step,
+                expires_at=datetime.utcfromtimestamp(expires_at)
+            ).on_conflict_do_nothing(index_elements=["user_id", "time_step"]).returning(UsedTotpCode.user_id)
+            return conn.execute(stmt).first() is not None
+
+
+USED_CODE_STORES: Dict[str, Type[UsedCodeStore]] = {
+    "memory": MemoryUsedCodeStore,
+    "postgres": PostgresUsedCodeStore,
+}
+
+totp_verifiers = TotpVerifierCache(settings.TOTP_VERIFIER_CACHE_TTL_SECONDS, settings.TOTP_VERIFIER_CACHE_MAX_ENTRIES)
+used_codes: UsedCodeStore = USED_CODE_STORES[settings.TOTP_REPLAY_BACKEND]()
+
+
+def matching_time_step(totp: pyotp.TOTP, token: str, now: float) -> Optional[int]:
+    """The time step within the accepted window whose code equals token, if any"""
+    current = int(now) // totp.interval
+    for time_step in range(current - TOTP_VALID_WINDOW, current + TOTP_VALID_WINDOW + 1):
+        if pyotp.utils.strings_equal(str(token), totp.generate_otp(time_step)):
+            return time_step
+    return None
+
+
+def verify_user_totp(user: User, token: str) -> bool:
+    """Verify a user's TOTP code and consume it; a code that was already used fails"""
+    totp = totp_verifiers.get(user.id, user.totp_secret)
+    time_step = matching_time_step(totp, token, time.time())
+    if time_step is None:
+        return False
+    # The code stays valid until the window has moved past its step
+    expires_at = (time_step + TOTP_VALID_WINDOW + 1) * totp.interval
+    return used_codes.claim(user.id, time_step, expires_at)
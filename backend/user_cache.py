@@ -0,0 +1,170 @@
+"""
+Per-process cache of authenticated user identity, so get_current_user and the
+role checks built on it do not query users on every request.
+
+Only identity and role are cached (id, username, role, created_at); password hashes
+and TOTP secrets never are. Entries live for USER_CACHE_TTL_SECONDS, with at most
+USER_CACHE_MAX_ENTRIES kept (LRU).
+
+Invalidation: a trigger on users (migration 015) issues pg_notify on every change to
+role, password_hash, totp_secret or username, and on delete, whoever makes the change. Each
+process runs one LISTEN connection that drops the named entry. While that connection
+is down the whole cache is bypassed, and it is cleared on reconnect, since
+notifications may have been missed.
+"""
+from sqlalchemy.orm import Session
+from database import engine
+from models import User
+from config import get_settings
+from collections import OrderedDict
+from typing import Optional
+from uuid import UUID
+import logging
+import select
+import threading
+import time
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+USER_CHANGED_CHANNEL = "user_changed"
+
+
+def identity_user(user_id: UUID, username: str, role, created_at) -> User:
+    """
+    A new transient User carrying only identity columns. Callers that need the
+    password hash or TOTP secret must load the row (see get_current_user_record).
+    """
+    return User(id=user_id, username=username, role=role, created_at=created_at)
+
+
+class UserCache:
+    """Thread-safe bounded TTL cache of user identity keyed by user id"""
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.enabled = False
+        self._entries: "OrderedDict[UUID, tuple]" = OrderedDict()
+        self._version = 0
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> int:
+        """Changes on every invalidation; read it before loading a user to pass to put()"""
+        return self._version
+
+    def get(self, user_id: UUID) -> Optional[User]:
+        """The cached identity as a detached User (see identity_user), or None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires, username, role, created_at = entry
+            if time.monotonic() >= expires:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+        return identity_user(user_id, username, role, created_at)
+
+    def put(self, user: User, version: int) -> None:
+        """Cache a user loaded from the database, unless an invalidation happened since `version` was read"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if version != self._version:
+                return
+            self._entries[user.id] = (time.monotonic() + self.ttl_seconds, user.username, user.role, user.created_at)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: UUID) -> None:
+        with self._lock:
+            self._version += 1
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+
+
+class UserChangeListener:
+    """One LISTEN connection per process applying user change notifications to the cache"""
+
+    def __init__(self, cache: UserCache):
+        self.cache = cache
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="user-cache-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                self._listen()
+            except Exception:
+                logger.exception("User cache LISTEN connection failed; reconnecting")
+                time.sleep(1)
+
+    def _listen(self) -> None:
+        raw = engine.raw_connection()
+        try:
+            conn = raw.driver_connection
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {USER_CHANGED_CHANNEL}")
+            # Anything cached before LISTEN took effect may have missed its notification
+            self.cache.clear()
+            self.cache.enabled = True
+            while not self._stopping.is_set():
+                if select.select([conn], [], [], 1.0) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    self.cache.invalidate(UUID(conn.notifies.pop(0).payload))
+        finally:
+            self.cache.enabled = False
+            raw.invalidate()
+
+
+user_cache = UserCache(settings.USER_CACHE_TTL_SECONDS, settings.USER_CACHE_MAX_ENTRIES)
+_listener: Optional[UserChangeListener] = None
+
+
+def load_user_identity(db: Session, user_id: UUID) -> Optional[User]:
+    """
+    Identity of a user as a detached User, from the cache when possible.
+    Hits and misses return the same shape, so callers cannot come to depend on
+    columns that are only present on a miss.
+    """
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+    version = user_cache.version
+    user = db.query(User).filter(User.id == user_id).first()
+    if user is None:
+        return None
+    user_cache.put(user, version)
+    return identity_user(user.id, user.username, user.role, user.created_at)
+
+
+def start_user_cache() -> None:
+    global _listener
+    _listener = UserChangeListener(user_cache)
+    _listener.start()
+
+
+def stop_user_cache() -> None:
+    if _listener:
+        _listener.stop()
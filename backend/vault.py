@@ -0,0 +1,122 @@
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import Session, Query
+from models import VaultItem, VaultRecord, PrivilegeSession
+from schemas import VaultRecordCreate, VaultRecordDecrypted
+from security import decrypt_record_batch, generate_wrapped_data_key
+from record_cache import record_cache
+from typing import Optional, Tuple, Iterator, List
+from datetime import datetime
+import base64
+import json
+from uuid import UUID
+
+
+def get_vault_data_key(db: Session, vault_item: VaultItem) -> bytes:
+    """Return the vault item's wrapped data key, creating it on first write"""
+    if vault_item.wrapped_data_key is None:
+        # Lock the row so concurrent first writes agree on a single key
+        db.refresh(vault_item, with_for_update=True)
+        if vault_item.wrapped_data_key is None:
+            vault_item.wrapped_data_key = generate_wrapped_data_key(vault_item.id)
+    return vault_item.wrapped_data_key
+
+
+def record_document(record_data: VaultRecordCreate) -> dict:
+    """The JSON document that is encrypted and stored for a record"""
+    return {
+        "investment_name": record_data.investment_name,
+        "invested_amount": record_data.invested_amount,
+        "investment_date": record_data.investment_date,
+        "instrument_type": record_data.instrument_type,
+        "remarks": record_data.remarks
+    }
+
+
+def decrypt_vault_records(
+    vault_item: VaultItem,
+    records: List[VaultRecord],
+    session: Optional[PrivilegeSession] = None
+) -> List[VaultRecordDecrypted]:
+    """
+    Decrypt one vault item's records in a single batch, preserving order.
+    With a privilege session, records the user already decrypted for this vault item
+    come from the record cache and newly decrypted ones are added to it.
+    """
+    plaintexts = record_cache.get_many(
+        session.user_id, vault_item.id, [record.id for record in records]
+    ) if session else {}
+    missing = [record for record in records if record.id not in plaintexts]
+    if missing:
+        decrypted_payloads = decrypt_record_batch(
+            [record.encrypted_payload for record in missing],
+            vault_item.id,
+            vault_item.wrapped_data_key
+        )
+        if session:
+            record_cache.put_many(
+                session.user_id,
+                vault_item.id,
+                session.expires_at,
+                {record.id: payload for record, payload in zip(missing, decrypted_payloads)}
+            )
+        plaintexts.update(
+            (record.id, json.loads(payload)) for record, payload in zip(missing, decrypted_payloads)
+        )
+    return [VaultRecordDecrypted(id=record.id, **plaintexts[record.id]) for record in records]
+
+
+# Keyset pagination cursors: opaque token over (created_at, id) of the last record served
+def encode_record_cursor(created_at: datetime, record_id: UUID) -> str:
+    """Encode the (created_at, id) position of a vault record as an opaque cursor"""
+    raw = f"{created_at.isoformat()}|{record_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_record_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    """Decode a cursor produced by encode_record_cursor. Raises ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at_str, record_id_str = raw.split("|", 1)
+        return datetime.fromisoformat(created_at_str), UUID(record_id_str)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def vault_records_query(db: Session, vault_item_id: UUID) -> Query:
+    """A vault item's records oldest-first on (created_at, id)"""
+    return db.query(VaultRecord).filter(
+        VaultRecord.vault_item_id == vault_item_id
+    ).order_by(VaultRecord.created_at, VaultRecord.id)
+
+
+def paginate_vault_records(query: Query, cursor: Optional[str], limit: int) -> Query:
+    """Seek past the cursor on the (vault_item_id, created_at, id) index instead of using OFFSET"""
+    if cursor:
+        cursor_created_at, cursor_id = decode_record_cursor(cursor)
+        query = query.filter(
+            tuple_(VaultRecord.created_at, VaultRecord.id) > tuple_(cursor_created_at, cursor_id)
+        )
+    return query.limit(limit)
+
+
+def stream_vault_records(
+    db: Session,
+    vault_item: VaultItem,
+    session: PrivilegeSession,
+    chunk_size: int
+) -> Iterator[str]:
+    """
+    Yield a vault item's decrypted records as NDJSON lines.
+    Records are read chunk_size at a time from a server-side cursor and each chunk is
+    decrypted as a batch, so only one chunk of plaintext is held at a time; streamed
+    records are not put in the record cache.
+    The stream stops once the privilege session it was opened under has expired.
+    """
+    stmt = select(VaultRecord).filter(
+        VaultRecord.vault_item_id == vault_item.id
+    ).order_by(VaultRecord.created_at, VaultRecord.id).execution_options(yield_per=chunk_size)
+    for chunk in db.scalars(stmt).partitions():
+        if datetime.utcnow() >= session.expires_at:
+            return
+        for record in decrypt_vault_records(vault_item, chunk):
+            yield record.model_dump_json() + "\n"
@@ -0,0 +1,253 @@
+"""
+Streaming bulk import of vault records from CSV or NDJSON.
+
+The file is read row by row and each row is validated against VaultRecordCreate.
+Rows are grouped into chunks; chunks are encrypted (and blind-indexed) in a process
+pool while earlier chunks are loaded, with at most two chunks per worker in flight,
+so memory stays bounded regardless of file size.
+
+Each chunk is loaded with COPY and committed in one transaction together with its
+audit entry, the vault summary update and the import checkpoint. The checkpoint is
+keyed by the vault item and the file's digest: re-running the same file resumes
+after the last committed chunk, and a completed import is not applied twice.
+An invalid row stops the import after the chunks before it have been committed;
+to resume with a corrected file, pass the import id printed by the failed run.
+
+CLI:
+    python vault_import.py <vault_item_id> <file> --actor <admin username>
+        [--format csv|ndjson] [--chunk-size N] [--workers N] [--import-id ID]
+"""
+from sqlalchemy.orm import Session
+from pydantic import ValidationError
+from models import User, VaultItem, VaultImportCheckpoint, RoleEnum
+from schemas import VaultRecordCreate
+from security import encrypt_record
+from vault import get_vault_data_key, record_document
+from blind_index import BLIND_INDEXED_FIELDS, record_blind_indexes
+from vault_summary import record_vault_summary
+from audit import create_audit_log
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Iterator, List, Optional, Tuple
+from uuid import UUID
+import csv
+import hashlib
+import io
+import json
+import os
+import uuid
+
+IMPORT_FORMATS = ("csv", "ndjson")
+
+COPY_COLUMNS = ["id", "vault_item_id", "encrypted_payload", "created_at"] + [
+    f"{field}_index" for field in BLIND_INDEXED_FIELDS
+]
+
+
+class VaultImportError(Exception):
+    pass
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def iter_import_rows(path: str, fmt: str) -> Iterator[Tuple[int, dict]]:
+    """Yield (line number, raw row) from a CSV file with a header row or an NDJSON file"""
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_number, line in enumerate(f, start=1):
+                if line.strip():
+                    try:
+                        yield line_number, json.loads(line)
+                    except ValueError as e:
+                        raise VaultImportError(f"line {line_number}: invalid JSON ({e})")
+
+
+def iter_import_documents(path: str, fmt: str, skip: int) -> Iterator[dict]:
+    """Validated record documents in file order, after the first `skip` rows"""
+    for index, (line_number, row) in enumerate(iter_import_rows(path, fmt)):
+        if index < skip:
+            continue
+        try:
+            yield record_document(VaultRecordCreate(**row))
+        except (TypeError, ValidationError) as e:
+            raise VaultImportError(f"line {line_number}: {e}")
+
+
+def _encrypt_chunk(documents: List[dict], vault_item_id: UUID, wrapped_key: bytes) -> List[Tuple[bytes, dict]]:
+    """Process pool task: ciphertext and blind indexes for each document"""
+    return [
+        (
+            encrypt_record(json.dumps(document).encode(), vault_item_id, wrapped_key),
+            record_blind_indexes(document, vault_item_id, wrapped_key)
+        )
+        for document in documents
+    ]
+
+
+def _copy_records(db: Session, vault_item_id: UUID, encrypted: List[Tuple[bytes, dict]]) -> List[str]:
+    """Load one chunk with COPY in the session's transaction and return the new record ids"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    record_ids = []
+    # Consecutive created_at values keep the file order in keyset pagination
+    now = datetime.utcnow()
+    for i, (encrypted_payload, blind_indexes) in enumerate(encrypted):
+        record_id = str(uuid.uuid4())
+        record_ids.append(record_id)
+        writer.writerow(
+            [record_id, str(vault_item_id), "\\x" + encrypted_payload.hex(), (now + timedelta(microseconds=i)).isoformat()]
+            + [blind_indexes[f"{field}_index"] for field in BLIND_INDEXED_FIELDS]
+        )
+    buffer.seek(0)
+
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY vault_records ({', '.join(COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+    return record_ids
+
+
+def _load_chunk(
+    db: Session,
+    actor: User,
+    vault_item: VaultItem,
+    checkpoint: VaultImportCheckpoint,
+    documents: List[dict],
+    encrypted: Future
+) -> None:
+    record_ids = _copy_records(db, vault_item.id, encrypted.result())
+    record_vault_summary(db, vault_item, documents)
+
+    checkpoint.chunks_imported += 1
+    checkpoint.rows_imported += len(documents)
+    checkpoint.updated_at = datetime.utcnow()
+    create_audit_log(
+        db,
+        actor,
+        "IMPORT_RECORDS",
+        vault_item_id=vault_item.id,
+        metadata={
+            "import_id": checkpoint.import_id,
+            "source": checkpoint.source,
+            "chunk": checkpoint.chunks_imported,
+            "record_ids": record_ids,
+            "record_count": len(record_ids)
+        }
+    )
+    db.commit()
+    print(f"Chunk {checkpoint.chunks_imported}: {checkpoint.rows_imported} rows imported")
+
+
+def import_vault_records(
+    db: Session,
+    vault_item_id: UUID,
+    path: str,
+    actor_username: str,
+    fmt: Optional[str] = None,
+    chunk_size: int = 1000,
+    workers: Optional[int] = None,
+    import_id: Optional[str] = None
+) -> VaultImportCheckpoint:
+    """Import (or resume importing) a file into a vault item; returns the final checkpoint"""
+    fmt = fmt or ("ndjson" if path.endswith((".ndjson", ".jsonl")) else "csv")
+    if fmt not in IMPORT_FORMATS:
+        raise VaultImportError(f"Invalid format. Must be one of {list(IMPORT_FORMATS)}")
+    workers = workers or os.cpu_count() or 1
+
+    actor = db.query(User).filter(User.username == actor_username).first()
+    if not actor or actor.role != RoleEnum.ADMIN:
+        raise VaultImportError("Imports must be run on behalf of an admin user")
+    vault_item = db.query(VaultItem).filter(VaultItem.id == vault_item_id).first()
+    if not vault_item:
+        raise VaultImportError("Vault item not found")
+
+    if import_id is None:
+        import_id = hashlib.sha256(f"{vault_item.id}|{file_digest(path)}".encode()).hexdigest()
+    checkpoint = db.get(VaultImportCheckpoint, import_id)
+    if checkpoint is not None and checkpoint.vault_item_id != vault_item.id:
+        raise VaultImportError(f"Import {import_id} belongs to another vault item")
+    if checkpoint is None:
+        checkpoint = VaultImportCheckpoint(
+            import_id=import_id,
+            vault_item_id=vault_item.id,
+            source=os.path.basename(path),
+            rows_imported=0,
+            chunks_imported=0
+        )
+        db.add(checkpoint)
+    if checkpoint.completed_at is not None:
+        print(f"Import {import_id} already completed ({checkpoint.rows_imported} rows)")
+        return checkpoint
+    if checkpoint.rows_imported:
+        print(f"Resuming import {import_id} after {checkpoint.rows_imported} rows")
+    else:
+        print(f"Starting import {import_id}")
+    wrapped_key = get_vault_data_key(db, vault_item)
+    db.commit()
+
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        try:
+            documents = []
+            for document in iter_import_documents(path, fmt, checkpoint.rows_imported):
+                documents.append(document)
+                if len(documents) < chunk_size:
+                    continue
+                pending.append((documents, pool.submit(_encrypt_chunk, documents, vault_item.id, wrapped_key)))
+                documents = []
+                if len(pending) >= workers * 2:
+                    _load_chunk(db, actor, vault_item, checkpoint, *pending.popleft())
+            if documents:
+                pending.append((documents, pool.submit(_encrypt_chunk, documents, vault_item.id, wrapped_key)))
+        except VaultImportError:
+            # Chunks read before an invalid row are still committed, so a corrected file can resume
+            while pending:
+                _load_chunk(db, actor, vault_item, checkpoint, *pending.popleft())
+            raise
+        while pending:
+            _load_chunk(db, actor, vault_item, checkpoint, *pending.popleft())
+
+    checkpoint.completed_at = datetime.utcnow()
+    db.commit()
+    return checkpoint
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Bulk import vault records from CSV or NDJSON")
+    parser.add_argument("vault_item_id", type=UUID)
+    parser.add_argument("file")
+    parser.add_argument("--actor", required=True, help="Admin username the import is audited under")
+    parser.add_argument("--format", choices=IMPORT_FORMATS, default=None, help="Defaults from the file extension")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Rows per COPY, audit entry and checkpoint")
+    parser.add_argument("--workers", type=int, default=None, help="Encryption processes (default: CPU count)")
+    parser.add_argument("--import-id", default=None, help="Resume this import (default: derived from the file contents)")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        outcome = import_vault_records(
+            db, args.vault_item_id, args.file, args.actor,
+            fmt=args.format, chunk_size=args.chunk_size, workers=args.workers, import_id=args.import_id
+        )
+        print(f"Imported {outcome.rows_imported} rows in {outcome.chunks_imported} chunks")
+    except VaultImportError as e:
+        print(f"Import failed: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        db.close()
@@ -0,0 +1,133 @@
+"""
+Encrypted per-vault aggregates.
+
+vault_summaries holds one row per vault item: the record count and total invested,
+overall and per instrument type, encrypted with the vault's data key. Record writes
+update it in their own transaction, so a portfolio summary costs one decryption
+instead of one per record. Totals are kept as decimal strings so the incremental
+sums match a recomputation exactly.
+
+CLI:
+    python vault_summary.py check [--repair]
+"""
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from models import VaultItem, VaultRecord, VaultSummary
+from security import encrypt_record, decrypt_record, decrypt_record_batch
+from vault import get_vault_data_key
+from datetime import datetime
+from decimal import Decimal
+from typing import Iterable, List, Optional
+import json
+
+SUMMARY_CHUNK_SIZE = 1000
+
+
+def empty_summary() -> dict:
+    return {"record_count": 0, "total_invested": "0", "by_instrument_type": {}}
+
+
+def add_to_summary(summary: dict, documents: Iterable[dict]) -> dict:
+    """Fold record documents (as stored in vault_records) into a summary"""
+    for document in documents:
+        amount = Decimal(str(document["invested_amount"]))
+        summary["record_count"] += 1
+        summary["total_invested"] = str(Decimal(summary["total_invested"]) + amount)
+        bucket = summary["by_instrument_type"].setdefault(
+            document["instrument_type"], {"record_count": 0, "total_invested": "0"}
+        )
+        bucket["record_count"] += 1
+        bucket["total_invested"] = str(Decimal(bucket["total_invested"]) + amount)
+    return summary
+
+
+def compute_vault_summary(db: Session, vault_item: VaultItem) -> dict:
+    """Recompute a vault's summary by decrypting its records one chunk at a time"""
+    summary = empty_summary()
+    stmt = select(VaultRecord.encrypted_payload).filter(
+        VaultRecord.vault_item_id == vault_item.id
+    ).execution_options(yield_per=SUMMARY_CHUNK_SIZE)
+    for chunk in db.scalars(stmt).partitions():
+        payloads = decrypt_record_batch(list(chunk), vault_item.id, vault_item.wrapped_data_key)
+        add_to_summary(summary, (json.loads(payload) for payload in payloads))
+    return summary
+
+
+def _decrypt_summary(vault_item: VaultItem, row: VaultSummary) -> dict:
+    return json.loads(decrypt_record(row.encrypted_summary, vault_item.id, vault_item.wrapped_data_key))
+
+
+def _store_summary(db: Session, vault_item: VaultItem, row: Optional[VaultSummary], summary: dict) -> VaultSummary:
+    encrypted_summary = encrypt_record(json.dumps(summary).encode(), vault_item.id, get_vault_data_key(db, vault_item))
+    if row is None:
+        row = VaultSummary(vault_item_id=vault_item.id)
+        db.add(row)
+    row.encrypted_summary = encrypted_summary
+    row.updated_at = datetime.utcnow()
+    return row
+
+
+def record_vault_summary(db: Session, vault_item: VaultItem, documents: List[dict]) -> dict:
+    """
+    Account for records just added to a vault, in the caller's transaction.
+    The vault item row is locked so concurrent writers to the same vault apply their
+    deltas one after another. A vault without a summary row yet gets one computed from
+    all of its records, which already include the new ones.
+    """
+    db.execute(select(VaultItem.id).filter(VaultItem.id == vault_item.id).with_for_update())
+    row = db.get(VaultSummary, vault_item.id)
+    if row is None:
+        db.flush()
+        summary = compute_vault_summary(db, vault_item)
+    else:
+        summary = add_to_summary(_decrypt_summary(vault_item, row), documents)
+    _store_summary(db, vault_item, row, summary)
+    return summary
+
+
+def read_vault_summary(db: Session, vault_item: VaultItem) -> dict:
+    """Decrypt a vault's summary row, building it first if the vault has none yet"""
+    row = db.get(VaultSummary, vault_item.id)
+    if row is None:
+        return record_vault_summary(db, vault_item, [])
+    return _decrypt_summary(vault_item, row)
+
+
+def check_vault_summaries(db: Session, repair: bool = False) -> List[dict]:
+    """Recompute every vault's aggregates from its records and report (optionally fix) mismatches"""
+    mismatches = []
+    for vault_item in db.query(VaultItem).order_by(VaultItem.id).all():
+        db.execute(select(VaultItem.id).filter(VaultItem.id == vault_item.id).with_for_update())
+        row = db.get(VaultSummary, vault_item.id)
+        stored = _decrypt_summary(vault_item, row) if row else None
+        expected = compute_vault_summary(db, vault_item)
+        if stored != expected:
+            # Report which aggregates differ, not their plaintext values
+            differing = sorted(key for key in expected if stored is None or stored.get(key) != expected[key])
+            mismatches.append({"vault_item_id": str(vault_item.id), "missing": stored is None, "differing": differing})
+            if repair:
+                _store_summary(db, vault_item, row, expected)
+        # Commit per vault so each row lock is held only while that vault is checked
+        db.commit()
+    return mismatches
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Vault summary maintenance")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    check_parser = subcommands.add_parser("check", help="Recompute aggregates from records and compare")
+    check_parser.add_argument("--repair", action="store_true", help="Overwrite summaries that do not match")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        outcome = check_vault_summaries(db, repair=args.repair)
+    finally:
+        db.close()
+
+    print(json.dumps(outcome, indent=2))
+    sys.exit(0 if not outcome or args.repair else 1)